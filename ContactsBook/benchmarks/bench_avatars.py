@@ -0,0 +1,64 @@
+"""
+Avatar processing throughput in images per second: decoding, EXIF stripping and resizing into ``avatar_sizes``.
+
+Compares decoding the full image and resizing every size from it with ``resize_variants``
+(reduced-scale JPEG decoding, each size resized from the previous one), in one thread and in a thread pool.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_avatars``
+"""
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from services.config import settings
+from services.images import resize_variants
+
+
+N = 40
+WIDTH, HEIGHT = 4000, 3000     # a 12 megapixel phone photo
+
+
+def make_photo(path: Path) -> None:
+    noise = Image.effect_noise((WIDTH // 8, HEIGHT // 8), 64).resize((WIDTH, HEIGHT))
+    gradient = Image.linear_gradient("L").resize((WIDTH, HEIGHT))
+    Image.merge("RGB", (noise, gradient, ImageOps.invert(gradient))).save(path, "JPEG", quality=90)
+
+
+def full_decode(path: Path, sizes: list[int]) -> dict[int, bytes]:
+    variants = {}
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        for size in sizes:
+            buf = io.BytesIO()
+            ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS).save(buf, "WEBP", quality=settings.avatar_quality)
+            variants[size] = buf.getvalue()
+    return variants
+
+
+def measure(process, path: Path, threads: int = 1) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda _: process(path, settings.avatar_sizes), range(N)))
+    return N / (time.perf_counter() - start)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "photo.jpg"
+        make_photo(path)
+        print(f"{WIDTH}x{HEIGHT} JPEG of {path.stat().st_size / 1024:.0f} KiB, sizes {settings.avatar_sizes}")
+        cases = [("full decode", full_decode, 1), ("resize_variants", resize_variants, 1)]
+        threads = min(4, os.cpu_count() or 1)
+        if threads > 1:
+            cases.append((f"resize_variants x{threads}", resize_variants, threads))
+        for name, process, n in cases:
+            print(f"{name:20s}: {measure(process, path, n):7.1f} images/s")
+
+
+if __name__ == "__main__":
+    main()
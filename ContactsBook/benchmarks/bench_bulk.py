@@ -0,0 +1,57 @@
+"""
+Bulk update and delete of contacts: the per-row repository loop vs one set-based statement.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_bulk``
+"""
+import asyncio
+import time
+
+from benchmarks.common import make_database, drop_database
+from repository import contacts as repository_contacts
+from schemas import ContactBase, ContactPatch, ContactSelection
+
+
+CONTACTS = 20_000
+SELECTED = 5_000
+
+
+async def per_row(DBSession, user, ids):
+    body = ContactBase(first_name="Updated", last_name="Last", phone="+380001234567",
+                       birthday="1990-01-01", inform="Updated", email="updated@example.com")
+    async with DBSession() as db:
+        start = time.perf_counter()
+        for contact_id in ids:
+            await repository_contacts.update_contact(contact_id, body, user, db)
+        updated = time.perf_counter() - start
+        start = time.perf_counter()
+        for contact_id in ids:
+            await repository_contacts.remove_contact(contact_id, user, db)
+        removed = time.perf_counter() - start
+    return updated, removed
+
+
+async def set_based(DBSession, user, ids):
+    selection = ContactSelection(ids=ids)
+    async with DBSession() as db:
+        start = time.perf_counter()
+        await repository_contacts.bulk_update_contacts(selection, ContactPatch(inform="Updated"), user, db)
+        updated = time.perf_counter() - start
+        start = time.perf_counter()
+        await repository_contacts.bulk_remove_contacts(selection, user, db)
+        removed = time.perf_counter() - start
+    return updated, removed
+
+
+async def main():
+    for name, run in (("per-row", per_row), ("set-based", set_based)):
+        engine, DBSession, user = await make_database(CONTACTS)
+        try:
+            ids = list(range(1, CONTACTS + 1, CONTACTS // SELECTED))
+            updated, removed = await run(DBSession, user, ids)
+            print(f"{name:9s}: update {len(ids)} in {updated:7.3f} s, delete {len(ids)} in {removed:7.3f} s")
+        finally:
+            await drop_database(engine)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+"""
+Verification email rendering throughput in messages per second.
+
+Compares loading the template for every message (what ``FastMail.send_message`` did), rendering a template
+compiled once, and ``VerificationTemplate`` pre-rendered per host; then the full message of the email worker
+(new token, HTML, MIME) with the pre-rendered template.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_email_template``
+"""
+import asyncio
+import timeit
+
+from database.models import EmailJob
+from services.email import Mailer, VerificationTemplate, conf
+
+
+N = 20000
+HOST = "http://localhost:8000/"
+TEMPLATE = "email_template.html"
+
+
+def main():
+    token = "eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOiJiZW5jaEBleGFtcGxlLmNvbSJ9.signature"
+    compiled = conf.template_engine().get_template(TEMPLATE)
+    template = VerificationTemplate(conf)
+    cases = {
+        "load per message": lambda: conf.template_engine().get_template(TEMPLATE).render(host=HOST, username="bench", token=token),
+        "compiled once": lambda: compiled.render(host=HOST, username="bench", token=token),
+        "pre-rendered per host": lambda: template.render(HOST, "bench", token),
+    }
+    for name, render in cases.items():
+        number = N // 20 if name == "load per message" else N
+        seconds = timeit.timeit(render, number=number)
+        print(f"{name:22s}: {number / seconds:10.0f} messages/s")
+
+    mailer = Mailer(conf)
+    job = EmailJob(email="bench@example.com", username="bench", host=HOST)
+
+    async def messages():
+        for _ in range(N // 10):
+            await mailer.message(job)
+
+    seconds = timeit.timeit(lambda: asyncio.run(messages()), number=1)
+    print(f"{'full message':22s}: {N // 10 / seconds:10.0f} messages/s (token + HTML + MIME)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Bandwidth and latency of polling an unchanged contact list: full 200 responses vs ETag revalidation with 304.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_etag``
+"""
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import make_database, drop_database
+from database.db import get_read_db
+from main import app
+from services.auth import auth_service
+from services.cache import response_cache
+
+
+CONTACTS = 1_000
+POLLS = 200
+
+
+async def poll(client, etag: str | None):
+    headers = {"If-None-Match": etag} if etag else {}
+    size = 0
+    start = time.perf_counter()
+    for _ in range(POLLS):
+        response = await client.get("/contacts/", params={"limit": CONTACTS}, headers=headers)
+        size += len(response.content)
+    seconds = time.perf_counter() - start
+    return response.status_code, size, seconds
+
+
+async def main():
+    engine, DBSession, user = await make_database(CONTACTS)
+
+    async def get_bench_db():
+        async with DBSession() as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = get_bench_db
+    app.dependency_overrides[auth_service.get_current_user] = lambda: user
+    response_cache.bind(None)     # measure the database path, not the response cache
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            etag = (await client.get("/contacts/", params={"limit": CONTACTS})).headers["ETag"]
+            for name, tag in (("full", None), ("etag", etag)):
+                status, size, seconds = await poll(client, tag)
+                print(f"{name:4s}: status {status}, {size / POLLS / 1024:7.1f} KiB and {seconds / POLLS * 1000:6.2f} ms per poll")
+    finally:
+        app.dependency_overrides.clear()
+        await drop_database(engine)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
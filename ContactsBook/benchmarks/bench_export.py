@@ -0,0 +1,57 @@
+"""
+Peak memory of exporting all contacts: the streaming export vs loading every contact as an ORM object.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_export``
+"""
+import asyncio
+import json
+import time
+import tracemalloc
+
+from sqlalchemy import select
+
+from benchmarks.common import make_database, drop_database
+from database.models import Contact
+from repository import contacts as repository_contacts
+from schemas import ContactResponse
+from services import contacts_io
+
+
+CONTACTS = 100_000
+
+
+async def export_loaded(user, db) -> int:
+    contacts = (await db.execute(select(Contact).filter(Contact.user_id == user.id))).scalars().all()
+    body = json.dumps([ContactResponse.model_validate(c).model_dump(mode="json") for c in contacts]).encode()
+    return len(body)
+
+
+async def export_streamed(user, db) -> int:
+    size = 0
+    async for chunk in contacts_io.export_chunks(repository_contacts.stream_contacts(user, db), "jsonl"):
+        size += len(chunk)
+    return size
+
+
+async def measure(name, export, DBSession, user):
+    async with DBSession() as db:
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = await export(user, db)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"{name:8s}: {size / 2**20:6.1f} MiB body in {seconds:5.2f} s, peak memory {peak / 2**20:7.1f} MiB")
+
+
+async def main():
+    engine, DBSession, user = await make_database(CONTACTS)
+    try:
+        await measure("loaded", export_loaded, DBSession, user)
+        await measure("streamed", export_streamed, DBSession, user)
+    finally:
+        await drop_database(engine)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
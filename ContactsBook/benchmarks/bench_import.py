@@ -0,0 +1,44 @@
+"""
+Throughput of the bulk contacts import (parse, validate, batched insert) in rows per second.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_import``
+"""
+import asyncio
+import io
+import time
+
+from fastapi import UploadFile
+
+from benchmarks.common import make_database, drop_database
+from repository import contacts as repository_contacts
+from services import contacts_io
+
+
+ROWS = 20_000
+
+
+def make_csv(rows: int) -> bytes:
+    lines = ["first_name,last_name,phone,birthday,inform,email"]
+    lines += [f"First{i},Last{i},+380{i:09d},1990-{i % 12 + 1:02d}-{i % 28 + 1:02d},Imported {i},c{i}@example.com" for i in range(rows)]
+    return "\n".join(lines).encode()
+
+
+async def main():
+    data = make_csv(ROWS)
+    for batch_size in (1, 100, 1000, 5000):
+        engine, DBSession, user = await make_database(0)
+        try:
+            async with DBSession() as db:
+                report = {"failed": 0, "errors": []}
+                file = UploadFile(io.BytesIO(data), filename="contacts.csv")
+                start = time.perf_counter()
+                batches = contacts_io.validated_batches(file, "csv", batch_size, report, 1000)
+                imported = await repository_contacts.import_contacts(batches, user, db)
+                seconds = time.perf_counter() - start
+            print(f"batch {batch_size:5d}: {imported} rows in {seconds:6.2f} s  {imported / seconds:9.0f} rows/s")
+        finally:
+            await drop_database(engine)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""
+Serialization throughput of 1000-contact list pages in rows per second, reading included.
+
+Compares the ORM objects validated by ``ContactResponse`` and encoded by FastAPI's default JSONResponse
+(what a route returning the objects does), the same objects with pydantic's ``dump_json``
+(the response cache path), and the ``json_fast_path``: plain rows encoded with ``services.fastjson.dumps``.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_json``
+"""
+import asyncio
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks.common import make_database, drop_database
+from repository import contacts as repository_contacts
+from routes.contacts import contacts_adapter, contacts_json
+from services import fastjson
+
+
+CONTACTS = 1000
+ROUNDS = 30
+
+
+def default_response(contacts: list) -> bytes:
+    return JSONResponse(jsonable_encoder(contacts_adapter.validate_python(contacts, from_attributes=True))).body
+
+
+async def measure(DBSession, user, encode, columns=None) -> float:
+    async with DBSession() as db:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            contacts = await repository_contacts.get_contacts(0, CONTACTS, user, db, columns=columns)
+            encode(contacts)
+            db.expunge_all()
+        return CONTACTS * ROUNDS / (time.perf_counter() - start)
+
+
+async def main():
+    engine, DBSession, user = await make_database(CONTACTS)
+    try:
+        cases = [
+            ("response model", default_response, None),
+            ("dump_json", contacts_json, None),
+            ("fast path", contacts_json, repository_contacts.RESPONSE_COLUMNS),
+        ]
+        print(f"pages of {CONTACTS} contacts, encoder: {'orjson' if fastjson.orjson else 'json'}")
+        baseline = None
+        for name, encode, columns in cases:
+            await measure(DBSession, user, encode, columns)
+            rate = await measure(DBSession, user, encode, columns)
+            baseline = baseline or rate
+            print(f"{name:15s}: {rate:9.0f} rows/s  ({rate / baseline:.1f}x)")
+    finally:
+        await drop_database(engine)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
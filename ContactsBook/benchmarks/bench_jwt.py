@@ -0,0 +1,30 @@
+"""
+Per-request cost of resolving a bearer token with and without the verified payload cache.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_jwt``
+"""
+import asyncio
+import timeit
+
+from services.auth import auth_service
+from services.cache import PayloadCache
+
+
+N = 20000
+
+
+def main():
+    token = asyncio.run(auth_service.create_access_token(data={"sub": "bench@example.com"}))
+
+    auth_service.payload_cache = PayloadCache(0)
+    cold = timeit.timeit(lambda: auth_service.decode_token(token), number=N)
+
+    auth_service.payload_cache = PayloadCache(4096)
+    warm = timeit.timeit(lambda: auth_service.decode_token(token), number=N)
+
+    print(f"jwt.decode every request: {cold / N * 1e6:8.2f} us/request")
+    print(f"verified payload cache:   {warm / N * 1e6:8.2f} us/request  ({cold / warm:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
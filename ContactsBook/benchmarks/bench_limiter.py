@@ -0,0 +1,59 @@
+"""
+Per-request overhead of the rate limiter dependency with the in-memory and the Redis backends.
+
+The Redis backend is measured against ``settings.redis_host`` if it is up, and against fakeredis
+(the Lua script without the network round trip) otherwise.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_limiter``
+"""
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+import redis.asyncio as redis
+from fakeredis import FakeAsyncRedis
+
+from services.config import settings
+from services.limiter import limiter, MemoryBackend, RedisBackend, RateLimiter
+
+
+REQUESTS = 10_000
+CLIENTS = 100
+
+
+async def redis_client():
+    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, socket_connect_timeout=1)
+    try:
+        await r.ping()
+        return "redis", r
+    except (redis.RedisError, OSError):
+        return "fakeredis", FakeAsyncRedis()
+
+
+async def measure(rate_limiter: RateLimiter) -> float:
+    requests = []
+    for i in range(CLIENTS):
+        request = MagicMock(headers={}, scope={"path": "/contacts/1"})
+        request.client.host = f"10.0.0.{i}"
+        requests.append(request)
+    response = MagicMock()
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        await rate_limiter(requests[i % CLIENTS], response)
+    return time.perf_counter() - start
+
+
+async def main():
+    name, r = await redis_client()
+    # a limit no client reaches, every request is checked and allowed
+    rate_limiter = RateLimiter(times=REQUESTS, seconds=60)
+    for backend_name, backend in (("memory", MemoryBackend()), (name, RedisBackend(r))):
+        limiter.init(backend)
+        await rate_limiter(MagicMock(headers={}, scope={"path": "/warmup"}), MagicMock())
+        seconds = await measure(rate_limiter)
+        print(f"{backend_name:9s}: {seconds / REQUESTS * 1e6:8.1f} us per request, {REQUESTS / seconds:9.0f} requests/s")
+    await r.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+"""
+Latency of reading page 1000 of a user's contacts with OFFSET/LIMIT and with a keyset cursor.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_pagination``
+"""
+import asyncio
+import time
+
+from benchmarks.common import make_database, drop_database
+from repository import contacts as repository_contacts
+from repository.pagination import encode_cursor
+
+
+CONTACTS = 200_000
+LIMIT = 100
+PAGE = 1000
+ROUNDS = 20
+
+
+async def measure(DBSession, user, **kwargs) -> float:
+    async with DBSession() as db:
+        await repository_contacts.get_contacts(limit=LIMIT, user=user, db=db, **kwargs)
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            await repository_contacts.get_contacts(limit=LIMIT, user=user, db=db, **kwargs)
+        return (time.perf_counter() - start) / ROUNDS
+
+
+async def main():
+    engine, DBSession, user = await make_database(CONTACTS)
+    try:
+        skip = (PAGE - 1) * LIMIT
+        async with DBSession() as db:
+            previous = await repository_contacts.get_contacts(skip=skip - LIMIT, limit=LIMIT, user=user, db=db)
+        offset = await measure(DBSession, user, skip=skip)
+        keyset = await measure(DBSession, user, skip=0, cursor=encode_cursor(previous[-1].id))
+        print(f"page {PAGE} of {CONTACTS} contacts, {LIMIT} per page")
+        print(f"offset: {offset * 1000:8.2f} ms")
+        print(f"cursor: {keyset * 1000:8.2f} ms  ({offset / keyset:.1f}x)")
+    finally:
+        await drop_database(engine)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
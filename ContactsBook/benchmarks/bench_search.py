@@ -0,0 +1,52 @@
+"""
+Latency of the SQLite contact search for a hit, a typo and a query without hits,
+as a user's contacts grow while other users' contacts stay in the index.
+
+Run from the ContactsBook folder: ``python -m benchmarks.bench_search``
+"""
+import asyncio
+import time
+
+from sqlalchemy import insert
+
+from benchmarks.common import make_database, make_row, drop_database
+from database.models import Contact, User
+from repository import contacts as repository_contacts
+
+
+SIZES = (5_000, 20_000)
+OTHER_USERS = 20_000
+LIMIT = 10
+ROUNDS = 5
+QUERIES = ("First123", "Frist123", "Contact number 4567", "Jonathan")
+
+
+async def measure(DBSession, user, query: str) -> tuple[float, int]:
+    async with DBSession() as db:
+        found = await repository_contacts.search_contacts(query, skip=0, limit=LIMIT, db=db, user=user)
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            await repository_contacts.search_contacts(query, skip=0, limit=LIMIT, db=db, user=user)
+        return (time.perf_counter() - start) / ROUNDS, len(found)
+
+
+async def main():
+    for size in SIZES:
+        engine, DBSession, user = await make_database(size)
+        try:
+            async with DBSession() as db:
+                other = User(email="other@example.com", password="passw", username="other")
+                db.add(other)
+                await db.commit()
+                await db.execute(insert(Contact), [make_row(i, other.id) for i in range(OTHER_USERS)])
+                await db.commit()
+            print(f"{size} contacts, {OTHER_USERS} of another user")
+            for query in QUERIES:
+                latency, found = await measure(DBSession, user, query)
+                print(f"{query!r:24} {latency * 1000:9.2f} ms  {found} found")
+        finally:
+            await drop_database(engine)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
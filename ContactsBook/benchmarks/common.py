@@ -0,0 +1,65 @@
+"""
+Helpers shared by the benchmarks: a throw-away SQLite database filled with contacts of one user.
+"""
+import os
+import tempfile
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from database.db import make_engine
+from database.models import Base, Contact, User, birthday_key
+
+
+def temp_sqlite_url() -> str:
+    fd, path = tempfile.mkstemp(suffix=".db", prefix="bench_")
+    os.close(fd)
+    return f"sqlite:///{path}"
+
+
+async def make_database(contacts: int, url: str | None = None):
+    """
+    Creates a database with one user owning the given number of contacts.
+
+    :return: The async engine, a session factory and the user.
+    """
+    # no pragmas, the benchmarks compare the queries on SQLite defaults
+    engine = make_engine(url or temp_sqlite_url(), pragmas={}, poolclass=NullPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    DBSession = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with DBSession() as db:
+        user = User(email="bench@example.com", password="passw", username="bench")
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+        for start in range(0, contacts, 10000):
+            rows = [make_row(i, user.id) for i in range(start, min(start + 10000, contacts))]
+            await db.execute(insert(Contact), rows)
+        await db.commit()
+    return engine, DBSession, user
+
+
+def make_row(i: int, user_id: int) -> dict:
+    birthday = date(1980, 1, 1) + timedelta(days=i % 9000)
+    return {
+        "first_name": f"First{i}",
+        "last_name": f"Last{i % 997}",
+        "email": f"contact{i}@example.com",
+        "phone": f"+380{i:09d}",
+        "birthday": birthday,
+        "birthday_md": birthday_key(birthday),
+        "inform": f"Contact number {i}",
+        "user_id": user_id,
+    }
+
+
+async def drop_database(engine) -> None:
+    url = engine.url
+    await engine.dispose()
+    for path in (url.database, f"{url.database}-wal", f"{url.database}-shm"):
+        if url.database and os.path.exists(path):
+            os.remove(path)
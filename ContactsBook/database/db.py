@@ -1,18 +1,169 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import logging
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from database.models import word_similarity
 from services.config import settings
 
 
-# DATABASE_URL = settings.POSTGRESQL_URL
+logger = logging.getLogger(__name__)
 
-DATABASE_URL = settings.SQLITE_URL
-engine = create_engine(DATABASE_URL, echo=False) 
-DBSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
 
-def get_db():
-    db = DBSession()
-    try:
+
+def async_url(url: str) -> str:
+    """
+    Converts a plain database URL from the settings to its async driver form.
+
+    :param url: The database URL, e.g. ``sqlite:///./hw14sql.db``.
+    :type url: str
+    :return: The URL with an async driver, e.g. ``sqlite+aiosqlite:///./hw14sql.db``.
+    :rtype: str
+    """
+    u = make_url(url)
+    if u.drivername in ASYNC_DRIVERS:
+        u = u.set(drivername=ASYNC_DRIVERS[u.drivername])
+    return u.render_as_string(hide_password=False)
+
+
+def pool_options(url: str) -> dict:
+    """
+    Returns the connection pool settings for an engine.
+
+    In-memory SQLite databases use a single static connection, so they get no pool settings.
+
+    :param url: The database URL.
+    :type url: str
+    :return: Keyword arguments for ``create_async_engine``.
+    :rtype: dict
+    """
+    u = make_url(url)
+    if u.get_backend_name() == "sqlite" and u.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+def sqlite_pragmas() -> dict:
+    """
+    Returns the pragmas applied to every new SQLite connection.
+
+    WAL lets readers run alongside a writer, ``synchronous=NORMAL`` is safe in WAL mode,
+    and the busy timeout makes concurrent writers wait for the lock instead of failing.
+
+    :return: The pragma names and values.
+    :rtype: dict
+    """
+    return {
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout,
+        "cache_size": -settings.sqlite_cache_size,     # negative value is in KiB
+    }
+
+
+def make_engine(url: str, pragmas: dict | None = None, **options) -> AsyncEngine:
+    """
+    Creates an async engine with the pool settings; SQLite connections get the pragmas
+    and the ``word_similarity`` search function on connect.
+
+    :param url: The database URL, plain or with an async driver.
+    :type url: str
+    :param pragmas: The SQLite pragmas, ``sqlite_pragmas()`` if omitted.
+    :type pragmas: dict | None
+    :param options: Extra ``create_async_engine`` arguments, override the pool settings.
+        A ``poolclass`` replaces the pool settings, e.g. ``NullPool`` takes no pool size.
+    :return: The async engine.
+    :rtype: AsyncEngine
+    """
+    url = async_url(url)
+    pool = pool_options(url) if "poolclass" not in options else {}
+    engine = create_async_engine(url, **(pool | options))
+    if engine.dialect.name == "sqlite":
+        pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+            # PostgreSQL ranks search results with pg_trgm, SQLite gets the same measure as a Python function
+            dbapi_connection.create_function("word_similarity", 2, word_similarity, deterministic=True)
+
+    return engine
+
+
+# DATABASE_URL = async_url(settings.POSTGRESQL_URL)
+
+DATABASE_URL = async_url(settings.SQLITE_URL)
+engine = make_engine(DATABASE_URL, echo=False)
+DBSession = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+class ReadReplica:
+    """
+    Session factory of the read replica used by the read-only endpoints.
+
+    If no replica is configured or it cannot be connected to, ``session`` returns None
+    and the caller falls back to the primary database.
+    """
+    retry_after = 30
+
+    def __init__(self, url: str | None):
+        self.engine = None
+        self.sessionmaker = None
+        self._down_until = 0.0
+        if url:
+            # the journal mode belongs to the writer, a read-only connection cannot change it
+            pragmas = {k: v for k, v in sqlite_pragmas().items() if k != "journal_mode"}
+            self.engine = make_engine(url, pragmas=pragmas)
+            self.sessionmaker = async_sessionmaker(bind=self.engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+    async def session(self) -> AsyncSession | None:
+        """
+        Opens a session on the replica and checks out its connection.
+
+        :return: The replica session, or None if the replica is not configured or unavailable.
+        :rtype: AsyncSession | None
+        """
+        if self.sessionmaker is None or self._down_until > time.monotonic():
+            return None
+        db = self.sessionmaker()
+        try:
+            await db.connection()
+        except (DBAPIError, OSError) as e:
+            await db.close()
+            # do not retry the replica on every request while it is down
+            self._down_until = time.monotonic() + self.retry_after
+            logger.warning("Read replica is unavailable, using the primary database: %s", e)
+            return None
+        return db
+
+
+read_replica = ReadReplica(settings.READ_REPLICA_URL)
+
+
+async def get_db():
+    async with DBSession() as db:
+        yield db
+
+
+async def get_read_db():
+    """
+    Yields a session for read-only endpoints: on the read replica, or on the primary database as a fallback.
+    """
+    db = await read_replica.session()
+    if db is None:
+        db = DBSession()
+    async with db:
         yield db
-    finally:
-        db.close()
@@ -1,6 +1,7 @@
+import re
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Date, Boolean
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Date, Boolean, Index, JSON, DDL, event, false, func, literal_column
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy.sql.sqltypes import DateTime
@@ -9,6 +10,20 @@ class Base(DeclarativeBase):
     pass
 
 
+def birthday_key(birthday) -> int | None:
+    """
+    Returns the month/day key of a birthday used for the indexed upcoming-birthdays lookup.
+
+    :param birthday: The birth date.
+    :type birthday: date | None
+    :return: ``month * 100 + day``, e.g. 1225 for December 25, or None.
+    :rtype: int | None
+    """
+    if birthday is None:
+        return None
+    return birthday.month * 100 + birthday.day
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -18,8 +33,11 @@ class User(Base):
     roles = Column(String, default="user", nullable=False)
     refresh  = Column(String, default="refr", nullable=False)
     avatar = Column(String, nullable=True)
+    avatar_status = Column(String(10), nullable=True)    # "pending" while an upload runs, "failed" if the last one failed
+    avatar_variants = Column(JSON, nullable=True)    # the avatar URL of every size, {"64": url, ...}
     created = Column(DateTime, default=datetime.now()) 
     verified = Column(Boolean, default=False, nullable=False)
+    contacts_rev = Column(Integer, default=0, server_default="0", nullable=False)    # bumped on every change of the user's contacts
 
 
 class Contact(Base):
@@ -30,9 +48,145 @@ class Contact(Base):
     email = Column(String(50), nullable=True)
     phone = Column(String(13), nullable=True)
     birthday = Column(Date, nullable=True)
+    birthday_md = Column(Integer, nullable=True)    # month * 100 + day, kept in sync with birthday
     inform = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    rev = Column(Integer, default=0, server_default="0", nullable=False)    # the owner's contacts_rev of the last change
     user_id = Column('user_id', ForeignKey('users.id', ondelete='CASCADE'), default=None) 
     user = relationship('User', backref="contacts")
 
+    # every lookup is scoped to the owner, so all indexes lead with user_id
+    __table_args__ = (
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        Index('ix_contacts_user_id_first_name', 'user_id', 'first_name'),
+        Index('ix_contacts_user_id_last_name', 'user_id', 'last_name'),
+        Index('ix_contacts_user_id_email', 'user_id', 'email'),
+        Index('ix_contacts_user_id_birthday_md', 'user_id', 'birthday_md'),
+        Index('ix_contacts_user_id_rev', 'user_id', 'rev'),
+    )
+
+    @validates('birthday')
+    def _sync_birthday_md(self, key, birthday):
+        self.birthday_md = birthday_key(birthday)
+        return birthday
+
     def __repr__(self) -> str:
         return f"Contact(id={self.id!r}, name={self.first_name!r}, last_name={self.last_name!r})"
+
+
+class ContactTombstone(Base):
+    """
+    A deleted contact, kept for the delta sync of the owner's clients.
+    """
+    __tablename__ = 'contact_tombstones'
+    id = Column(Integer, primary_key=True)
+    contact_id = Column(Integer, nullable=False)
+    user_id = Column(ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    rev = Column(Integer, nullable=False)    # the owner's contacts_rev of the deletion
+    deleted_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_contact_tombstones_user_id_rev', 'user_id', 'rev'),
+    )
+
+
+class EmailJob(Base):
+    """
+    A queued verification email, sent by the email worker (``python -m worker``).
+    """
+    __tablename__ = 'email_jobs'
+    id = Column(Integer, primary_key=True)
+    email = Column(String, nullable=False)
+    username = Column(String, nullable=True)
+    host = Column(String, nullable=False)
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    run_at = Column(DateTime, default=datetime.now, nullable=False)    # the next attempt, or the end of the lease while sending
+    failed = Column(Boolean, default=False, server_default=false(), nullable=False)    # gave up after email_max_attempts
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_email_jobs_failed_run_at', 'failed', 'run_at'),
+    )
+
+
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'inform')
+
+
+def search_document():
+    """
+    Returns the lower-cased text of all searchable contact fields, used by the PostgreSQL trigram search.
+
+    :return: SQL expression ``lower(first_name || ' ' || last_name || ...)``.
+    :rtype: ColumnElement
+    """
+    # inline literals, so the expression in queries matches the indexed one
+    empty, space = literal_column("''"), literal_column("' '")
+    doc = None
+    for field in SEARCH_FIELDS:
+        part = func.coalesce(getattr(Contact, field), empty)
+        doc = part if doc is None else doc.op('||')(space).op('||')(part)
+    return func.lower(doc)
+
+
+def _trigrams(word: str) -> set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def word_similarity(query: str | None, document: str | None) -> float:
+    """
+    Scores how well a search query matches a document, close to ``pg_trgm.word_similarity``.
+
+    Each query word is compared with the best matching document word by trigram similarity
+    (a document word starting with the query word is a full match); the score is the mean over query words.
+
+    :param query: The search query.
+    :type query: str | None
+    :param document: The searchable text of a contact.
+    :type document: str | None
+    :return: The score from 0 to 1.
+    :rtype: float
+    """
+    words = re.split(r"\W+", (document or "").lower())
+    scores = []
+    for q in re.split(r"\W+", (query or "").lower()):
+        if not q:
+            continue
+        tq = _trigrams(q)
+        best = 0.0
+        for w in words:
+            if w.startswith(q):
+                best = 1.0
+                break
+            if w:
+                tw = _trigrams(w)
+                best = max(best, len(tq & tw) / len(tq | tw))
+        scores.append(best)
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+# PostgreSQL: trigram GIN index over all searchable fields (prefix, substring and typo-tolerant matching)
+Contact.__table__.append_constraint(
+    Index('ix_contacts_search_trgm', search_document().label('search_document'),
+          postgresql_using='gin', postgresql_ops={'search_document': 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+)
+event.listen(Base.metadata, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
+# SQLite: FTS5 trigram index over the contacts table, kept in sync by triggers on every insert/update/delete
+_fields = ', '.join(SEARCH_FIELDS)
+_new = ', '.join(f'new.{f}' for f in SEARCH_FIELDS)
+_old = ', '.join(f'old.{f}' for f in SEARCH_FIELDS)
+SQLITE_SEARCH_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5({_fields}, content='contacts', content_rowid='id', tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    f"INSERT INTO contacts_fts(rowid, {_fields}) VALUES (new.id, {_new}); END",
+    f"CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    f"INSERT INTO contacts_fts(contacts_fts, rowid, {_fields}) VALUES ('delete', old.id, {_old}); END",
+    f"CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE OF {_fields} ON contacts BEGIN "
+    f"INSERT INTO contacts_fts(contacts_fts, rowid, {_fields}) VALUES ('delete', old.id, {_old}); "
+    f"INSERT INTO contacts_fts(rowid, {_fields}) VALUES (new.id, {_new}); END",
+)
+for _ddl in SQLITE_SEARCH_DDL:
+    event.listen(Contact.__table__, 'after_create', DDL(_ddl).execute_if(dialect='sqlite'))
+event.listen(Contact.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS contacts_fts').execute_if(dialect='sqlite'))
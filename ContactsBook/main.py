@@ -1,18 +1,24 @@
 from fastapi import FastAPI, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
-import redis.asyncio as redis
+from fastapi.staticfiles import StaticFiles
 import uvicorn
 from contextlib import asynccontextmanager
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
 from services.config import settings 
 from routes import auth, contacts, users
+from database.db import get_db
+from repository.email_jobs import email_queue_depth
+from services.auth import auth_service
+from services.cache import user_cache, response_cache, email_dedup
+from services.limiter import limiter, RateLimiter, RedisBackend
+from services.upload_limit import UploadSizeLimitMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):   
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(r)
+    if settings.rate_limiter_backend == "redis":
+        # without Redis the limits are checked in memory, the app starts anyway
+        limiter.init(RedisBackend(auth_service.r))
     yield
 
 app = FastAPI(lifespan=lifespan)
@@ -26,11 +32,16 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"]
 )
+# the multipart overhead of the form is small next to the image
+app.add_middleware(UploadSizeLimitMiddleware, limits={"/users/avatar": settings.avatar_max_bytes + 64 * 1024})
 
 app.include_router(auth.router, prefix='/auth')
 app.include_router(users.router, prefix='/users')
 app.include_router(contacts.router, prefix='/contacts')
 
+if settings.avatar_storage == "local":
+    app.mount(settings.avatar_local_url.rstrip("/"), StaticFiles(directory=settings.avatar_local_dir, check_dir=False), name="avatars")
+
 
 @app.get("/", dependencies=[Depends(RateLimiter(times=1, seconds=7))])
 def read_root():
@@ -43,6 +54,31 @@ def read_root():
     return {"(hw14) root message": "FastAPI started!"}
 
 
+@app.get("/metrics/cache")
+def cache_metrics():
+    """
+    Returns the hit/miss counters of the caches of this worker process.
+
+    :return: The counters of the user, JWT payload and response caches.
+    :rtype: dict
+    """
+    return {"users": user_cache.stats(), "tokens": auth_service.payload_cache.stats(), "responses": response_cache.stats()}
+
+
+@app.get("/metrics/email")
+async def email_metrics(db: AsyncSession = Depends(get_db)):
+    """
+    Returns the depth of the verification email queue and the deduplication counters of this worker process.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The queued, due, retrying and failed job counts, the age of the oldest queued job in seconds
+             and the sent and suppressed email counters.
+    :rtype: dict
+    """
+    return await email_queue_depth(db) | {"dedup": email_dedup.stats()}
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=8000)
 
@@ -0,0 +1,30 @@
+"""users contacts_rev
+
+Revision ID: 345dc6567861
+Revises: 49c813fb483c
+Create Date: 2026-10-18 19:03:46.301936
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '345dc6567861'
+down_revision: Union[str, Sequence[str], None] = '49c813fb483c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('contacts_rev', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('contacts_rev')
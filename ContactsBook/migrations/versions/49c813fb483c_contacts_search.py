@@ -0,0 +1,54 @@
+"""contacts search
+
+Revision ID: 49c813fb483c
+Revises: 7b0d9df6711a
+Create Date: 2026-10-18 18:46:46.659284
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+FIELDS = ('first_name', 'last_name', 'email', 'phone', 'inform')
+
+
+# revision identifiers, used by Alembic.
+revision: str = '49c813fb483c'
+down_revision: Union[str, Sequence[str], None] = '7b0d9df6711a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        fields = ', '.join(FIELDS)
+        new = ', '.join(f'new.{f}' for f in FIELDS)
+        old = ', '.join(f'old.{f}' for f in FIELDS)
+        op.execute(f"CREATE VIRTUAL TABLE contacts_fts USING fts5({fields}, content='contacts', content_rowid='id', tokenize='trigram')")
+        op.execute(f"CREATE TRIGGER contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+                   f"INSERT INTO contacts_fts(rowid, {fields}) VALUES (new.id, {new}); END")
+        op.execute(f"CREATE TRIGGER contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+                   f"INSERT INTO contacts_fts(contacts_fts, rowid, {fields}) VALUES ('delete', old.id, {old}); END")
+        op.execute(f"CREATE TRIGGER contacts_fts_au AFTER UPDATE OF {fields} ON contacts BEGIN "
+                   f"INSERT INTO contacts_fts(contacts_fts, rowid, {fields}) VALUES ('delete', old.id, {old}); "
+                   f"INSERT INTO contacts_fts(rowid, {fields}) VALUES (new.id, {new}); END")
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        document = " || ' ' || ".join(f"coalesce({f}, '')" for f in FIELDS)
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute(f'CREATE INDEX ix_contacts_search_trgm ON contacts USING gin (lower({document}) gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for trigger in ('contacts_fts_ai', 'contacts_fts_ad', 'contacts_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS contacts_fts')
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_contacts_search_trgm')
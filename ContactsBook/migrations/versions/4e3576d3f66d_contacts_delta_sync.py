@@ -0,0 +1,54 @@
+"""contacts delta sync
+
+Revision ID: 4e3576d3f66d
+Revises: 345dc6567861
+Create Date: 2026-10-18 19:05:44.824873
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e3576d3f66d'
+down_revision: Union[str, Sequence[str], None] = '345dc6567861'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('rev', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_contacts_user_id_rev', ['user_id', 'rev'])
+
+    op.create_table('contact_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('contact_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('rev', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_contact_tombstones_user_id_rev', 'contact_tombstones', ['user_id', 'rev'])
+
+    # existing contacts get a new revision of their owner, so the first sync from revision 0 returns them
+    users = sa.table('users', sa.column('id', sa.Integer), sa.column('contacts_rev', sa.Integer))
+    contacts = sa.table('contacts', sa.column('user_id', sa.Integer), sa.column('rev', sa.Integer))
+    op.execute(users.update().values(contacts_rev=users.c.contacts_rev + 1))
+    owner_rev = sa.select(users.c.contacts_rev).where(users.c.id == contacts.c.user_id).scalar_subquery()
+    op.execute(contacts.update().values(rev=owner_rev))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contact_tombstones_user_id_rev', table_name='contact_tombstones')
+    op.drop_table('contact_tombstones')
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_index('ix_contacts_user_id_rev')
+        batch_op.drop_column('rev')
+        batch_op.drop_column('updated_at')
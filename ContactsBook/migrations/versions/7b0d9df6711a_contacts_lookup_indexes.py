@@ -0,0 +1,36 @@
+"""contacts lookup indexes
+
+Revision ID: 7b0d9df6711a
+Revises: cf71c099ebc4
+Create Date: 2026-10-18 18:45:02.147779
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b0d9df6711a'
+down_revision: Union[str, Sequence[str], None] = 'cf71c099ebc4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'])
+    op.create_index('ix_contacts_user_id_first_name', 'contacts', ['user_id', 'first_name'])
+    op.create_index('ix_contacts_user_id_last_name', 'contacts', ['user_id', 'last_name'])
+    op.create_index('ix_contacts_user_id_email', 'contacts', ['user_id', 'email'])
+
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_contacts_user_id_email', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_last_name', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_first_name', table_name='contacts')
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
+
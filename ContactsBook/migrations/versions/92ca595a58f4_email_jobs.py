@@ -0,0 +1,41 @@
+"""email jobs
+
+Revision ID: 92ca595a58f4
+Revises: 4e3576d3f66d
+Create Date: 2026-10-18 19:12:57.837152
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '92ca595a58f4'
+down_revision: Union[str, Sequence[str], None] = '4e3576d3f66d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('email_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('host', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('failed', sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_email_jobs_failed_run_at', 'email_jobs', ['failed', 'run_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_email_jobs_failed_run_at', table_name='email_jobs')
+    op.drop_table('email_jobs')
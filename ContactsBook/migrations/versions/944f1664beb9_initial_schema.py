@@ -0,0 +1,57 @@
+"""initial schema
+
+Revision ID: 944f1664beb9
+Revises: 
+Create Date: 2026-10-18 18:45:00.686389
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '944f1664beb9'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('password', sa.String(), nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('roles', sa.String(), nullable=False),
+        sa.Column('refresh', sa.String(), nullable=False),
+        sa.Column('avatar', sa.String(), nullable=True),
+        sa.Column('created', sa.DateTime(), nullable=True),
+        sa.Column('verified', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+    )
+    op.create_table(
+        'contacts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('first_name', sa.String(length=50), nullable=False),
+        sa.Column('last_name', sa.String(length=100), nullable=True),
+        sa.Column('email', sa.String(length=50), nullable=True),
+        sa.Column('phone', sa.String(length=13), nullable=True),
+        sa.Column('birthday', sa.Date(), nullable=True),
+        sa.Column('inform', sa.String(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('contacts')
+    op.drop_table('users')
+
@@ -0,0 +1,30 @@
+"""users avatar status
+
+Revision ID: 9c6568426a69
+Revises: 92ca595a58f4
+Create Date: 2026-10-18 19:18:27.613134
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c6568426a69'
+down_revision: Union[str, Sequence[str], None] = '92ca595a58f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('avatar_status', sa.String(length=10), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('avatar_status')
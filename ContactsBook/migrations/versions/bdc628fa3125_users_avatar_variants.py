@@ -0,0 +1,30 @@
+"""users avatar variants
+
+Revision ID: bdc628fa3125
+Revises: 9c6568426a69
+Create Date: 2026-10-18 19:20:40.643121
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bdc628fa3125'
+down_revision: Union[str, Sequence[str], None] = '9c6568426a69'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('avatar_variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('avatar_variants')
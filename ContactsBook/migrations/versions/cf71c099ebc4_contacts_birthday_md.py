@@ -0,0 +1,39 @@
+"""contacts birthday_md
+
+Revision ID: cf71c099ebc4
+Revises: 944f1664beb9
+Create Date: 2026-10-18 18:45:01.409482
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cf71c099ebc4'
+down_revision: Union[str, Sequence[str], None] = '944f1664beb9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.add_column(sa.Column('birthday_md', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_contacts_user_id_birthday_md', ['user_id', 'birthday_md'])
+
+    contacts = sa.table('contacts', sa.column('id', sa.Integer), sa.column('birthday', sa.Date), sa.column('birthday_md', sa.Integer))
+    rows = op.get_bind().execute(sa.select(contacts.c.id, contacts.c.birthday).where(contacts.c.birthday.is_not(None))).all()
+    for contact_id, birthday in rows:
+        op.execute(contacts.update().where(contacts.c.id == contact_id).values(birthday_md=birthday.month * 100 + birthday.day))
+
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('contacts') as batch_op:
+        batch_op.drop_index('ix_contacts_user_id_birthday_md')
+        batch_op.drop_column('birthday_md')
+
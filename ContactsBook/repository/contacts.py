@@ -1,49 +1,135 @@
-from datetime import date
-from sqlalchemy import and_
-from sqlalchemy.orm import Session
-from database.models import Contact, User
-from schemas import ContactBase
+from datetime import date, timedelta
+from typing import AsyncIterable, AsyncIterator
+from sqlalchemy.engine import RowMapping
+from sqlalchemy import and_, or_, select, insert, update, delete, table, column, literal, literal_column, func, case, union_all, true, false
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import Contact, ContactTombstone, User, birthday_key, search_document, SEARCH_FIELDS
+from schemas import ContactBase, ContactPatch, ContactSelection
+from repository.pagination import decode_cursor, decode_sync_cursor, encode_cursor
+from repository.projection import select_columns, fetch_all
 
 
-async def get_contacts(skip: int, limit: int, user: User, db: Session) -> list[Contact]:
+# the fields of ContactBase and ContactResponse in the schema order, for the plain rows of list responses
+BASE_COLUMNS = (Contact.first_name, Contact.last_name, Contact.phone, Contact.birthday, Contact.inform, Contact.email)
+RESPONSE_COLUMNS = BASE_COLUMNS + (Contact.id, Contact.user_id)
+
+
+def contact_columns(fields: tuple[str, ...]) -> tuple:
     """
-    Read all contacts for user from the database.
+    Returns the columns of the requested fields of a sparse fieldset.
 
+    :param fields: The validated field names, e.g. ``("first_name", "phone")``.
+    :type fields: tuple[str, ...]
+    :return: The Contact columns in the same order.
+    :rtype: tuple
+    """
+    return tuple(getattr(Contact, name) for name in fields)
+
+
+async def get_contacts_rev(user: User, db: AsyncSession) -> int:
+    """
+    Reads the revision of the user's contacts, which changes with every write of them.
+
+    :param user: The owner of the contacts.
+    :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
+    :return: The revision number.
+    :rtype: int
+    """
+    result = await db.execute(select(User.contacts_rev).filter(User.id == user.id))
+    return result.scalar_one_or_none() or 0
+
+
+async def next_rev(user: User, db: AsyncSession) -> int:
+    """
+    Bumps the revision of the user's contacts at the start of a write.
+
+    The user's row stays locked until the commit, so revisions of concurrent writes become visible in order.
+
+    :param user: The owner of the contacts being changed.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The new revision, to be stored with the changed contacts.
+    :rtype: int
+    """
+    stmt = update(User).filter(User.id == user.id).values(contacts_rev=User.contacts_rev + 1).returning(User.contacts_rev)
+    result = await db.execute(stmt)
+    return result.scalar_one()
+
+
+async def commit_changes(user: User, db: AsyncSession) -> None:
+    """
+    Commits a change of the user's contacts. The revision bumped by ``next_rev`` becomes visible with it,
+    which makes the user's cached responses and entity tags stale.
+
+    :param user: The owner of the changed contacts.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    """
+    await db.commit()
+
+
+async def get_contacts(skip: int, limit: int, user: User, db: AsyncSession, cursor: str | None = None, columns: tuple | None = None) -> list[Contact] | list[dict]:
+    """
+    Read all contacts for user from the database.
+
+    With a cursor the page is read by keyset (``id > last id``) and ``skip`` is ignored,
+    so deep pages cost the same as the first one.
+
+    :param skip: The number of contacts to skip (offset mode).
+    :type skip: int
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
     :param user: The user whose contacts are being retrieved.
     :type user: User
-    :return: A list of contacts belonging to the user.
-    :rtype: List[Contact]
+    :param db: The database session.
+    :type db: AsyncSession
+    :param cursor: The cursor returned with the previous page (keyset mode).
+    :type cursor: str | None
+    :param columns: Read only these columns as dicts instead of Contact objects.
+    :type columns: tuple | None
+    :return: A list of contacts belonging to the user ordered by ID.
+    :rtype: List[Contact] | list[dict]
+    :raises ValueError: If the cursor is malformed.
     """
-    return (db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all())
+    stmt = select_columns(Contact, columns).filter(Contact.user_id == user.id).order_by(Contact.id).limit(limit)
+    if cursor:
+        stmt = stmt.filter(Contact.id > decode_cursor(cursor))
+    else:
+        stmt = stmt.offset(skip)
+    result = await db.execute(stmt)
+    return fetch_all(result, columns)
 
 
-async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
+async def get_contact(contact_id: int, user: User, db: AsyncSession) -> Contact:
     """
     Read a specific contact by its ID for user from the database.
 
     :param contact_id: The ID of the contact to retrieve.
     :type contact_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user whose contact is being retrieved.
     :type user: User
     :return: The contact with the specified ID belonging to the user.
     :rtype: Contact
     """
-    return (db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first())
-    # return db.query(Contact).filter(Contact.id == Contact_id, Contact.user_id == user.id).first()
+    stmt = select(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id))
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
 
 
-async def create_contact(body: ContactBase, user: User, db: Session) -> Contact:
+async def create_contact(body: ContactBase, user: User, db: AsyncSession) -> Contact:
     """
     Creates a new contact for user in the database.
 
     :param body: The data for the new contact.
     :type body: ContactBase
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user for whom the contact is being created.
     :type user: User
     :return: The newly created contact.
@@ -58,13 +144,84 @@ async def create_contact(body: ContactBase, user: User, db: Session) -> Contact:
         contact.birthday = body.birthday
         contact.email = body.email
         contact.user_id = user.id
+        contact.rev = await next_rev(user, db)
         db.add(contact)
-        db.commit()
-        db.refresh(contact)
+        await commit_changes(user, db)
+        await db.refresh(contact)
     return contact
 
 
-async def update_contact(contact_id: int, body: ContactBase, user: User, db: Session) -> Contact | None:
+EXPORT_COLUMNS = (Contact.id, Contact.first_name, Contact.last_name, Contact.phone, Contact.birthday, Contact.inform, Contact.email)
+
+
+async def stream_contacts(user: User, db: AsyncSession, batch_size: int = 1000) -> AsyncIterator[RowMapping]:
+    """
+    Streams all contacts of a user with a server-side cursor.
+
+    Rows are fetched ``batch_size`` at a time as plain mappings, without ORM objects,
+    so memory use does not depend on the number of contacts.
+
+    :param user: The user whose contacts are being exported.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :param batch_size: The number of rows fetched from the cursor at once.
+    :type batch_size: int
+    :return: Async iterator of contact rows ordered by ID.
+    :rtype: AsyncIterator[RowMapping]
+    """
+    stmt = (select(*EXPORT_COLUMNS).filter(Contact.user_id == user.id).order_by(Contact.id)
+            .execution_options(yield_per=batch_size))
+    result = await db.stream(stmt)
+    async for row in result.mappings():
+        yield row
+
+
+def contact_values(body: ContactBase, user: User, rev: int) -> dict:
+    """
+    Returns the column values of a new contact for a bulk insert.
+
+    :param body: The data for the new contact.
+    :type body: ContactBase
+    :param user: The owner of the contact.
+    :type user: User
+    :param rev: The revision of the write.
+    :type rev: int
+    :return: The column values, including the derived ``birthday_md``.
+    :rtype: dict
+    """
+    values = body.model_dump()
+    values["user_id"] = user.id
+    values["birthday_md"] = birthday_key(body.birthday)
+    values["rev"] = rev
+    return values
+
+
+async def import_contacts(batches: AsyncIterable[list[ContactBase]], user: User, db: AsyncSession) -> int:
+    """
+    Creates contacts in batches inside a single transaction.
+
+    Each batch is one multi-row INSERT; the transaction is committed after the last batch.
+
+    :param batches: The batches of contacts to create.
+    :type batches: AsyncIterable[list[ContactBase]]
+    :param user: The user for whom the contacts are being created.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The number of created contacts.
+    :rtype: int
+    """
+    count = 0
+    rev = await next_rev(user, db)
+    async for batch in batches:
+        await db.execute(insert(Contact), [contact_values(body, user, rev) for body in batch])
+        count += len(batch)
+    await commit_changes(user, db)
+    return count
+
+
+async def update_contact(contact_id: int, body: ContactBase, user: User, db: AsyncSession) -> Contact | None:
     """
     Updates an existing contact in the database.
 
@@ -73,11 +230,11 @@ async def update_contact(contact_id: int, body: ContactBase, user: User, db: Ses
     :param body: The updated data for the contact.
     :type body: ContactBase
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated contact.
     :rtype: Contact
     """
-    contact = (db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first())
+    contact = await get_contact(contact_id, user, db)
     if contact:  
         contact.first_name = body.first_name
         contact.last_name = body.last_name
@@ -85,123 +242,277 @@ async def update_contact(contact_id: int, body: ContactBase, user: User, db: Ses
         contact.inform = body.inform
         contact.birthday = body.birthday
         contact.email = body.email
-        db.commit()
+        contact.rev = await next_rev(user, db)
+        await commit_changes(user, db)
     return contact
 
 
-async def remove_contact(contact_id: int, user: User, db: Session) -> Contact | None:
+async def remove_contact(contact_id: int, user: User, db: AsyncSession) -> Contact | None:
     """
-    Removes an existing contact from the database.
+    Removes an existing contact from the database, leaving a tombstone for the delta sync.
 
     :param contact: The contact to remove.
     :type contact: Contact
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     """
-    contact = (db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first())
+    contact = await get_contact(contact_id, user, db)
     if contact:
-        db.delete(contact)
-        db.commit()
+        rev = await next_rev(user, db)
+        await db.delete(contact)
+        db.add(ContactTombstone(contact_id=contact.id, user_id=user.id, rev=rev))
+        await commit_changes(user, db)
     return contact
 
 
-async def soon_birthdays(days: int, db: Session, user: User) -> list[Contact]:
+async def sync_contacts(since: int, limit: int, user: User, db: AsyncSession, cursor: str | None = None) -> dict:
+    """
+    Reads the changes of the user's contacts made after a revision, ordered by revision.
+
+    Upserts come from the contacts and deletions from their tombstones, merged and paged in one query.
+    A client starting from revision 0 gets all contacts and only the deletions made during its sync.
+
+    :param since: The revision of the client's copy.
+    :type since: int
+    :param limit: The maximum number of changes to return.
+    :type limit: int
+    :param user: The owner of the contacts.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :param cursor: The cursor returned with the previous page of the same sync.
+    :type cursor: str | None
+    :return: The ``upserts`` (contacts), ``deletions`` (contact IDs), the ``revision`` to sync from next time
+        (on the last page only) and the ``cursor`` of the next page.
+    :rtype: dict
+    :raises ValueError: If the cursor is malformed.
+    """
+    # read before the changes, so a concurrent write is returned again next time rather than missed
+    revision = await get_contacts_rev(user, db)
+    if cursor:
+        floor, after_rev, after_id = decode_sync_cursor(cursor)
+    else:
+        # a new client only needs the deletions made while it pages through the contacts
+        floor, after_rev, after_id = since if since > 0 else revision, since, None
+    upserts = select(Contact.rev, Contact.id, false().label("deleted")).filter(Contact.user_id == user.id, Contact.rev >= after_rev)
+    deletions = (select(ContactTombstone.rev, ContactTombstone.contact_id.label("id"), true().label("deleted"))
+                 .filter(ContactTombstone.user_id == user.id, ContactTombstone.rev > floor, ContactTombstone.rev >= after_rev))
+    changes = union_all(upserts, deletions).subquery()
+    if after_id is None:
+        position = changes.c.rev > after_rev
+    else:
+        # changes of one revision can be split between pages, so the position includes the ID
+        position = or_(changes.c.rev > after_rev, and_(changes.c.rev == after_rev, changes.c.id > after_id))
+    stmt = (select(changes.c.rev, changes.c.id, changes.c.deleted, Contact)
+            .outerjoin(Contact, and_(Contact.id == changes.c.id, changes.c.deleted == false()))
+            .filter(position)
+            .order_by(changes.c.rev, changes.c.id)
+            .limit(limit + 1))
+    rows = (await db.execute(stmt)).all()
+    page = rows[:limit]
+    result = {
+        "upserts": [row.Contact for row in page if not row.deleted],
+        "deletions": [row.id for row in page if row.deleted],
+        "revision": revision,
+        "cursor": None,
+    }
+    if len(rows) > limit:
+        last = page[-1]
+        result["revision"] = None
+        result["cursor"] = encode_cursor(last.id, rev=last.rev, floor=floor)
+    return result
+
+
+def selection_filter(selection: ContactSelection, user: User) -> list:
+    """
+    Returns the WHERE conditions of a bulk operation, always scoped to the user's contacts.
+
+    :param selection: The IDs and/or the filter of the contacts.
+    :type selection: ContactSelection
+    :param user: The owner of the contacts.
+    :type user: User
+    :return: The SQL conditions.
+    :rtype: list
+    """
+    conditions = [Contact.user_id == user.id]
+    if selection.ids is not None:
+        conditions.append(Contact.id.in_(selection.ids))
+    if selection.filter is not None:
+        for field, value in selection.filter.model_dump(exclude_none=True).items():
+            conditions.append(getattr(Contact, field) == value)
+    return conditions
+
+
+async def bulk_update_contacts(selection: ContactSelection, body: ContactPatch, user: User, db: AsyncSession) -> list[int]:
+    """
+    Updates the selected contacts with one ``UPDATE ... RETURNING`` statement.
+
+    :param selection: The IDs and/or the filter of the contacts to update.
+    :type selection: ContactSelection
+    :param body: The new values; only the set fields are changed.
+    :type body: ContactPatch
+    :param user: The owner of the contacts.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The IDs of the updated contacts.
+    :rtype: list[int]
+    """
+    values = body.model_dump(exclude_none=True)
+    if "birthday" in values:
+        # the statement bypasses the ORM validator, so the derived key is set explicitly
+        values["birthday_md"] = birthday_key(values["birthday"])
+    values["rev"] = await next_rev(user, db)
+    stmt = update(Contact).where(*selection_filter(selection, user)).values(**values).returning(Contact.id)
+    result = await db.execute(stmt)
+    ids = sorted(result.scalars().all())
+    if ids:
+        await commit_changes(user, db)
+    else:
+        await db.rollback()     # nothing changed, keep the revision
+    return ids
+
+
+async def bulk_remove_contacts(selection: ContactSelection, user: User, db: AsyncSession) -> list[int]:
+    """
+    Removes the selected contacts with one ``DELETE ... RETURNING`` statement and leaves their tombstones.
+
+    :param selection: The IDs and/or the filter of the contacts to remove.
+    :type selection: ContactSelection
+    :param user: The owner of the contacts.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The IDs of the removed contacts.
+    :rtype: list[int]
+    """
+    rev = await next_rev(user, db)
+    stmt = delete(Contact).where(*selection_filter(selection, user)).returning(Contact.id)
+    result = await db.execute(stmt)
+    ids = sorted(result.scalars().all())
+    if ids:
+        await db.execute(insert(ContactTombstone), [{"contact_id": i, "user_id": user.id, "rev": rev} for i in ids])
+        await commit_changes(user, db)
+    else:
+        await db.rollback()     # nothing changed, keep the revision
+    return ids
+
+
+async def soon_birthdays(days: int, db: AsyncSession, user: User, columns: tuple | None = None) -> list[Contact] | list[dict]:
     """
     Find contacts with upcoming birthdays in a given day range.
 
     :param days: Days range include birthday.
     :type days: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user whose contacts are find.
     :type user: User
+    :param columns: Read only these columns as dicts instead of Contact objects.
+    :type columns: tuple | None
     :return: A list of user's contacts with upcoming birthdays.
-    :rtype: List[Contact]
+    :rtype: List[Contact] | list[dict]
     """
+    if days < 0:
+        return []
     if days > 365:
         days = 365
-    res = []
     today = date.today()   # today = date(1986, 12, 25)
-    for i in db.query(Contact).filter(Contact.user_id == user.id).all():
-        bd = date(today.year, i.birthday.month, i.birthday.day)
-        if bd < today:
-            bd = bd.replace(year=today.year + 1)
-        day_to = (bd - today).days   
-        if (day_to <= days):
-            res.append(i)
-    return res
-
-
-async def get_contact_by_id(contact_id: str, db: Session, user: User) -> list[Contact]:
+    start = birthday_key(today)
+    end = birthday_key(today + timedelta(days=days))
+    if days == 365:
+        window = Contact.birthday_md.is_not(None)
+    elif end >= start:
+        window = Contact.birthday_md.between(start, end)
+    else:
+        # the window wraps over New Year: [start, 12.31] + [01.01, end]
+        window = or_(Contact.birthday_md >= start, Contact.birthday_md <= end)
+    result = await db.execute(select_columns(Contact, columns).filter(Contact.user_id == user.id, window))
+    return fetch_all(result, columns)
+
+
+async def get_contact_by_id(contact_id: str, db: AsyncSession, user: User, columns: tuple | None = None) -> list[Contact] | list[dict]:
     """
     Find a contact by its ID for user from the database.
 
     :param contact_id: The ID of the contact to retrieve.
     :type contact_id: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user whose contact is being retrieved.
     :type user: User
+    :param columns: Read only these columns as dicts instead of Contact objects.
+    :type columns: tuple | None
     :return: A list containing the user's contact with the specified ID.
-    :rtype: List[Contact]
+    :rtype: List[Contact] | list[dict]
     """
     contacts = []
     try:
         contact_id = int(contact_id)
     except:
         return contacts
-    return (db.query(Contact).filter(Contact.id == contact_id, Contact.user_id == user.id).all())
+    result = await db.execute(select_columns(Contact, columns).filter(Contact.id == contact_id, Contact.user_id == user.id))
+    return fetch_all(result, columns)
 
 
-async def get_contacts_by_first_name(first_name: str, db: Session, user: User) -> list[Contact]:
+async def get_contacts_by_first_name(first_name: str, db: AsyncSession, user: User, columns: tuple | None = None) -> list[Contact] | list[dict]:
     """
     Find contacts by their first name for user from the database.
 
     :param first_name: The first name of the contacts to retrieve.
     :type first_name: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user whose contacts are being retrieved.
     :type user: User
+    :param columns: Read only these columns as dicts instead of Contact objects.
+    :type columns: tuple | None
     :return: A list of user's contacts with the specified first name.
-    :rtype: List[Contact]
+    :rtype: List[Contact] | list[dict]
     """
-    return (db.query(Contact).filter(Contact.first_name == first_name, Contact.user_id == user.id).all())
+    result = await db.execute(select_columns(Contact, columns).filter(Contact.first_name == first_name, Contact.user_id == user.id))
+    return fetch_all(result, columns)
 
 
-async def get_contacts_by_last_name(last_name: str, db: Session, user: User) -> list[Contact]:
+async def get_contacts_by_last_name(last_name: str, db: AsyncSession, user: User, columns: tuple | None = None) -> list[Contact] | list[dict]:
     """
     Find contacts by their last name for user from the database.
 
     :param last_name: The last name of the contacts to retrieve.
     :type last_name: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user whose contacts are being retrieved.
     :type user: User
+    :param columns: Read only these columns as dicts instead of Contact objects.
+    :type columns: tuple | None
     :return: A list of user's contacts with the specified last name.
-    :rtype: List[Contact]
+    :rtype: List[Contact] | list[dict]
     """
-    return (db.query(Contact).filter(Contact.last_name == last_name, Contact.user_id == user.id).all())
+    result = await db.execute(select_columns(Contact, columns).filter(Contact.last_name == last_name, Contact.user_id == user.id))
+    return fetch_all(result, columns)
 
 
-async def get_contact_by_email(contact_email: str, db: Session, user: User) -> list[Contact]:
+async def get_contact_by_email(contact_email: str, db: AsyncSession, user: User, columns: tuple | None = None) -> list[Contact] | list[dict]:
     """
     Find a contact by its email address for user from the database.
 
     :param contact_email: The email address of the contact to retrieve.
     :type contact_email: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user whose contact is being retrieved.
     :type user: User
+    :param columns: Read only these columns as dicts instead of Contact objects.
+    :type columns: tuple | None
     :return: A list containing the user's contact with the specified email address.
-    :rtype: List[Contact]
+    :rtype: List[Contact] | list[dict]
     """
-    return (db.query(Contact).filter(Contact.email == contact_email, Contact.user_id == user.id).all())
+    result = await db.execute(select_columns(Contact, columns).filter(Contact.email == contact_email, Contact.user_id == user.id))
+    return fetch_all(result, columns)
 
 
-async def get_contacts_by(field: str, value: str, db: Session, user: User) -> list[Contact]:
+async def get_contacts_by(field: str, value: str, db: AsyncSession, user: User, columns: tuple | None = None) -> list[Contact] | list[dict]:
     """
     Find contacts by a specified field and value for user from the database.
 
@@ -210,11 +521,13 @@ async def get_contacts_by(field: str, value: str, db: Session, user: User) -> li
     :param value: The value to filter the contacts by.
     :type value: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param user: The user whose contacts are being retrieved.
     :type user: User
+    :param columns: Read only these columns as dicts instead of Contact objects.
+    :type columns: tuple | None
     :return: A list of user's contacts filtered by the specified field and value.
-    :rtype: List[Contact]
+    :rtype: List[Contact] | list[dict]
     """
 
     fields = {
@@ -227,8 +540,103 @@ async def get_contacts_by(field: str, value: str, db: Session, user: User) -> li
     # contacts = await fields[field](value, db, user) if field in fields.keys() else []
     contacts = []
     if field in fields.keys():
-        contacts = await fields[field](value, db, user)
+        contacts = await fields[field](value, db, user, columns)
 
     return contacts
 
 
+contacts_fts = table('contacts_fts', column('rowid'), column('rank'))
+SEARCH_THRESHOLD = 0.5
+TYPO_THRESHOLD = 0.3    # the default pg_trgm.similarity_threshold, for words sharing no trigram with the query
+FUZZY_CANDIDATES = 500  # best ranked trigram hits of a user scored by the Python word_similarity
+TYPO_CANDIDATES = 1000  # contacts of a user scored when no trigram matches
+
+
+def fts_query(query: str) -> str:
+    """
+    Builds an FTS5 trigram MATCH expression for a search query.
+
+    Every word is matched as a substring and, for typo tolerance, by each of its trigrams.
+
+    :param query: The search query.
+    :type query: str
+    :return: The MATCH expression, or an empty string if no word has at least 3 characters.
+    :rtype: str
+    """
+    terms = []
+    for word in query.lower().split():
+        if len(word) < 3:
+            continue
+        terms.append(word)
+        terms.extend(word[i:i + 3] for i in range(len(word) - 2))
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in dict.fromkeys(terms))
+
+
+async def search_contacts(query: str, skip: int, limit: int, db: AsyncSession, user: User, columns: tuple | None = None) -> list[Contact] | list[dict]:
+    """
+    Search contacts by prefix, substring or a misspelled word in name, email, phone and information fields.
+
+    SQLite uses the ``contacts_fts`` FTS5 trigram index, PostgreSQL the ``pg_trgm`` GIN index.
+    Contacts containing every query word come first, then the best ranked fuzzy matches. A typo in the middle
+    of a short word leaves no trigram in common with it, so if the index finds nothing, the user's contacts
+    with a word starting like a query word are ranked by similarity.
+
+    :param query: The search query.
+    :type query: str
+    :param skip: The number of results to skip.
+    :type skip: int
+    :param limit: The maximum number of results to return.
+    :type limit: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user: The user whose contacts are being searched.
+    :type user: User
+    :param columns: Read only these columns as dicts instead of Contact objects.
+    :type columns: tuple | None
+    :return: A list of user's contacts ordered by relevance.
+    :rtype: List[Contact] | list[dict]
+    """
+    query = query.strip().lower()
+    if not query:
+        return []
+    stmt = select_columns(Contact, columns).filter(Contact.user_id == user.id)
+    if db.get_bind().dialect.name == 'postgresql':
+        doc = search_document()
+        stmt = (stmt.filter(or_(doc.contains(query, autoescape=True), literal(query).op('<%')(doc)))
+                .order_by(func.word_similarity(query, doc).desc(), Contact.id))
+    elif match := fts_query(query):
+        # the MATCH runs once and its hits are joined to the user's contacts by primary key;
+        # starting from the contacts instead runs it once per contact of the user
+        hits = (select(contacts_fts.c.rowid.label('id'), contacts_fts.c.rank.label('rank'))
+                .filter(literal_column('contacts_fts').op('MATCH')(match))
+                .cte('hits').prefix_with('MATERIALIZED'))
+        # word_similarity is a Python function, so only the user's best ranked hits are scored by it
+        fuzzy = (select(hits.c.id).join(Contact, Contact.id == hits.c.id).filter(Contact.user_id == user.id)
+                 .order_by(hits.c.rank).limit(FUZZY_CANDIDATES)
+                 .cte('fuzzy').prefix_with('MATERIALIZED'))
+        # a contact containing every query word is a hit, word_similarity drops only weak fuzzy matches
+        doc = search_document()
+        substring = and_(*(doc.contains(word, autoescape=True) for word in query.split()))
+        similarity = func.word_similarity(query, doc)
+        stmt = (stmt.join(hits, hits.c.id == Contact.id)
+                .filter(or_(substring, and_(Contact.id.in_(select(fuzzy.c.id)), similarity >= SEARCH_THRESHOLD)))
+                .order_by(substring.desc(), case((substring, None), else_=similarity).desc(), hits.c.rank, Contact.id))
+        result = await db.execute(stmt.offset(skip).limit(limit))
+        found = fetch_all(result, columns)
+        if found or (skip and await db.scalar(stmt.with_only_columns(Contact.id).limit(1)) is not None):
+            return found
+        # a misspelled word usually keeps its first letter, so only contacts with a word starting with it are scored
+        initials = dict.fromkeys(word[0] for word in query.split() if len(word) >= 3)
+        word_start = or_(*(or_(doc.startswith(letter, autoescape=True), doc.contains(' ' + letter, autoescape=True))
+                           for letter in initials))
+        typos = (select(Contact.id).filter(Contact.user_id == user.id, word_start)
+                 .order_by(Contact.id).limit(TYPO_CANDIDATES)
+                 .cte('typos').prefix_with('MATERIALIZED'))
+        stmt = (select_columns(Contact, columns).filter(Contact.id.in_(select(typos.c.id)), similarity >= TYPO_THRESHOLD)
+                .order_by(similarity.desc(), Contact.id))
+    else:
+        # words shorter than a trigram can only be matched as a prefix
+        stmt = (stmt.filter(or_(*(getattr(Contact, f).istartswith(query, autoescape=True) for f in SEARCH_FIELDS)))
+                .order_by(Contact.id))
+    result = await db.execute(stmt.offset(skip).limit(limit))
+    return fetch_all(result, columns)
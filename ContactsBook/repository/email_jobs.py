@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import EmailJob
+from services.config import settings
+
+
+async def enqueue_email(email: str, username: str | None, host: str, db: AsyncSession) -> EmailJob:
+    """
+    Queues a verification email for the email worker.
+
+    :param email: The recipient.
+    :type email: str
+    :param username: The recipient's username.
+    :type username: str | None
+    :param host: The base URL of the confirmation link.
+    :type host: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The queued job.
+    :rtype: EmailJob
+    """
+    job = EmailJob(email=email, username=username, host=host)
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def claim_email_jobs(limit: int, lease: int, db: AsyncSession) -> list[EmailJob]:
+    """
+    Takes the due jobs for sending, oldest first.
+
+    One ``UPDATE ... RETURNING`` statement moves their ``run_at`` to the end of the lease, so other workers
+    skip them; if the worker dies, the jobs are due again when the lease ends. PostgreSQL workers skip
+    the rows locked by each other.
+
+    :param limit: The maximum number of jobs.
+    :type limit: int
+    :param lease: Seconds the jobs stay claimed.
+    :type lease: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The claimed jobs, with the attempt counted.
+    :rtype: list[EmailJob]
+    """
+    now = datetime.now()
+    due = (select(EmailJob.id).filter(EmailJob.failed == False, EmailJob.run_at <= now)
+           .order_by(EmailJob.run_at, EmailJob.id).limit(limit).with_for_update(skip_locked=True))
+    stmt = (update(EmailJob).filter(EmailJob.id.in_(due))
+            .values(run_at=now + timedelta(seconds=lease), attempts=EmailJob.attempts + 1)
+            .returning(EmailJob))
+    jobs = (await db.scalars(stmt, execution_options={"synchronize_session": False, "populate_existing": True})).all()
+    await db.commit()
+    return sorted(jobs, key=lambda job: job.id)
+
+
+async def complete_email_jobs(ids: list[int], db: AsyncSession) -> None:
+    """
+    Removes the sent jobs from the queue.
+
+    :param ids: The IDs of the sent jobs.
+    :type ids: list[int]
+    :param db: The database session.
+    :type db: AsyncSession
+    """
+    if ids:
+        await db.execute(delete(EmailJob).filter(EmailJob.id.in_(ids)))
+        await db.commit()
+
+
+def retry_delay(attempts: int) -> int:
+    """
+    Returns the exponential backoff before the next attempt.
+
+    :param attempts: The number of failed attempts.
+    :type attempts: int
+    :return: The delay in seconds.
+    :rtype: int
+    """
+    return min(settings.email_retry_delay * 2 ** (attempts - 1), settings.email_retry_max_delay)
+
+
+async def retry_email_job(job: EmailJob, error: str, db: AsyncSession) -> bool:
+    """
+    Schedules the next attempt of a job that failed, or gives up after ``email_max_attempts``.
+
+    :param job: The failed job.
+    :type job: EmailJob
+    :param error: The error of the attempt.
+    :type error: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: True if the job will be retried, False if it is failed for good.
+    :rtype: bool
+    """
+    retry = job.attempts < settings.email_max_attempts
+    values = {"error": error[:1000]}
+    if retry:
+        values["run_at"] = datetime.now() + timedelta(seconds=retry_delay(job.attempts))
+    else:
+        values["failed"] = True
+    await db.execute(update(EmailJob).filter(EmailJob.id == job.id).values(**values))
+    await db.commit()
+    return retry
+
+
+async def email_queue_depth(db: AsyncSession) -> dict:
+    """
+    Counts the jobs of the email queue.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: ``queued`` (not sent yet), ``due`` (ready to send), ``retrying`` (failed at least once),
+             ``failed`` (given up) and ``oldest_age`` (seconds since the oldest queued job, 0 if none).
+    :rtype: dict
+    """
+    now = datetime.now()
+    queued = EmailJob.failed == False
+    stmt = select(
+        func.count(case((queued, 1))),
+        func.count(case((queued & (EmailJob.run_at <= now), 1))),
+        func.count(case((queued & (EmailJob.error != None), 1))),
+        func.count(case((EmailJob.failed == True, 1))),
+        func.min(case((queued, EmailJob.created_at))),
+    )
+    queued, due, retrying, failed, oldest = (await db.execute(stmt)).one()
+    oldest_age = (now - oldest).total_seconds() if oldest else 0
+    return {"queued": queued, "due": due, "retrying": retrying, "failed": failed, "oldest_age": round(oldest_age, 1)}
@@ -0,0 +1,73 @@
+import base64
+import json
+
+
+def encode_cursor(last_id: int, **position: int) -> str:
+    """
+    Builds an opaque cursor pointing after the given row.
+
+    :param last_id: The ID of the last row of the current page.
+    :type last_id: int
+    :param position: Other sort keys of the last row, e.g. ``rev``.
+    :return: The opaque cursor.
+    :rtype: str
+    """
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id, **position}).encode()).decode().rstrip("=")
+
+
+MAX_POSITION = 2 ** 63 - 1     # IDs and revisions are 64-bit integers in the database
+
+
+def _load_cursor(cursor: str, *keys: str) -> tuple[int, ...]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        position = tuple(int(data[key]) for key in keys)
+    except (ValueError, TypeError, KeyError, OverflowError) as e:
+        # e.g. ``{"id": 1e400}`` is an infinite float
+        raise ValueError("Invalid cursor") from e
+    if not all(-MAX_POSITION <= value <= MAX_POSITION for value in position):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Reads the row ID from an opaque cursor.
+
+    :param cursor: The cursor returned with the previous page.
+    :type cursor: str
+    :return: The ID of the last row of the previous page.
+    :rtype: int
+    :raises ValueError: If the cursor is malformed.
+    """
+    return _load_cursor(cursor, "id")[0]
+
+
+def decode_sync_cursor(cursor: str) -> tuple[int, int, int]:
+    """
+    Reads the position from an opaque cursor of the delta sync.
+
+    :param cursor: The cursor returned with the previous page.
+    :type cursor: str
+    :return: The revision after which deletions are returned, the revision and the ID of the last change of the previous page.
+    :rtype: tuple[int, int, int]
+    :raises ValueError: If the cursor is malformed.
+    """
+    return _load_cursor(cursor, "floor", "rev", "id")
+
+
+def next_cursor(rows: list, limit: int) -> str | None:
+    """
+    Returns the cursor of the next page, or None if this page is the last one.
+
+    :param rows: The rows of the current page ordered by ID, objects or dicts.
+    :type rows: list
+    :param limit: The requested page size.
+    :type limit: int
+    :return: The cursor of the next page.
+    :rtype: str | None
+    """
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        return encode_cursor(last["id"] if isinstance(last, dict) else last.id)
+    return None
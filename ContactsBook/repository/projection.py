@@ -0,0 +1,32 @@
+from sqlalchemy import Select, select
+from sqlalchemy.engine import Result
+
+
+def select_columns(entity, columns: tuple | None = None) -> Select:
+    """
+    Selects ORM objects of an entity, or only the given columns as plain rows.
+
+    :param entity: The mapped class, e.g. Contact.
+    :param columns: The columns to read instead of the objects.
+    :type columns: tuple | None
+    :return: The select statement.
+    :rtype: Select
+    """
+    return select(*columns) if columns else select(entity)
+
+
+def fetch_all(result: Result, columns: tuple | None = None) -> list:
+    """
+    Reads all rows of a ``select_columns`` statement.
+
+    :param result: The result of the statement.
+    :type result: Result
+    :param columns: The columns the statement was built with.
+    :type columns: tuple | None
+    :return: The ORM objects, or dicts of column values in the order of ``columns``.
+    :rtype: list
+    """
+    if not columns:
+        return result.scalars().all()
+    keys = tuple(result.keys())
+    return [dict(zip(keys, row)) for row in result]
@@ -1,24 +1,48 @@
-from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.models import User
 from schemas import UserUpdate, UserCreate
+from services.cache import user_cache
+from services.gravatar import gravatar_url
+from repository.pagination import decode_cursor
+from repository.projection import select_columns, fetch_all
 
 
-async def get_users(skip: int, limit: int, db: Session) -> list[User]:
-    """
-    Read all contacts.
+# the fields of UserDB in the schema order, for the plain rows of list responses
+RESPONSE_COLUMNS = (User.id, User.email, User.username, User.roles, User.avatar, User.avatar_status,
+                    User.avatar_variants, User.created, User.verified)
 
-    :param db: The database session.
-    :type db: Session
-    :param current_user: The current user making the request.
-    :type current_user: User
-    :return: List of contacts.
-    :rtype: List[Contact]
+
+async def get_users(skip: int, limit: int, db: AsyncSession, cursor: str | None = None, columns: tuple | None = None) -> list[User] | list[dict]:
     """
-    return db.query(User).offset(skip).limit(limit).all()
+    Read all users.
 
+    With a cursor the page is read by keyset (``id > last id``) and ``skip`` is ignored.
 
-async def update_user(user_id: int, body: UserUpdate, db: Session) -> User | None:
+    :param skip: The number of users to skip (offset mode).
+    :type skip: int
+    :param limit: The maximum number of users to return.
+    :type limit: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param cursor: The cursor returned with the previous page (keyset mode).
+    :type cursor: str | None
+    :param columns: Read only these columns as dicts instead of User objects.
+    :type columns: tuple | None
+    :return: List of users ordered by ID.
+    :rtype: List[User] | list[dict]
+    :raises ValueError: If the cursor is malformed.
+    """
+    stmt = select_columns(User, columns).order_by(User.id).limit(limit)
+    if cursor:
+        stmt = stmt.filter(User.id > decode_cursor(cursor))
+    else:
+        stmt = stmt.offset(skip)
+    result = await db.execute(stmt)
+    return fetch_all(result, columns)
+
+
+async def update_user(user_id: int, body: UserUpdate, db: AsyncSession) -> User | None:
     """
     Endpoint for update user.
 
@@ -27,60 +51,58 @@ async def update_user(user_id: int, body: UserUpdate, db: Session) -> User | Non
     :param body: The data for creating a new user.
     :type body: UserCreate
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Updated user.
     :rtype: User
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).filter(User.id == user_id))
+    user = result.scalar_one_or_none()
     if user:   
         user.username = body.username
         user.roles = body.roles
         user.created = body.created
         user.verified = body.verified
-        db.commit()
+        await db.commit()
+        await user_cache.invalidate(user.email)
     return user
 
 
-async def get_user_by_email(email: str, db: Session) -> User | None:
+async def get_user_by_email(email: str, db: AsyncSession) -> User | None:
     """
     Read a user from the database by email.
 
     :param email: The email address of the user to retrieve.
     :type email: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The user with the specified email, or None if not found.
     :rtype: User | None
     """
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalar_one_or_none()
 
 
-async def create_user(body: UserCreate, db: Session) -> User:
+async def create_user(body: UserCreate, db: AsyncSession) -> User:
     """
     Creates a new user in the database.
 
+    The avatar is left empty and filled in later by ``fill_gravatars``, outside of the signup transaction.
+
     :param body: The data for the new user.
     :type body: UserModel
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The newly created user.
     :rtype: User
     """
-    avatar = None
-    try:
-        g = Gravatar(body.email)
-        avatar = g.get_image()
-    except Exception as e:
-        print(e)
-
-    user = User(email=body.email, password=body.password, username=body.username, avatar=avatar)
+    user = User(email=body.email, password=body.password, username=body.username)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     return user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     """
     Updates the refresh token for a user in the database.
 
@@ -89,60 +111,144 @@ async def update_token(user: User, token: str | None, db: Session) -> None:
     :param token: The new refresh token, or None.
     :type token: str | None
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     """
     user.refresh = token
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(user.email)
+
+
+async def update_password(user: User, password: str, db: AsyncSession) -> None:
+    """
+    Updates the password hash for a user in the database.
+
+    :param user: The user to update the password for.
+    :type user: User
+    :param password: The new password hash.
+    :type password: str
+    :param db: The database session.
+    :type db: AsyncSession
+    """
+    user.password = password
+    await db.commit()
+    await user_cache.invalidate(user.email)
 
 
-async def verify_email(email: str, db: Session) -> None:
+async def verify_email(email: str, db: AsyncSession) -> None:
     """
     Verify the email address of a user in the database.
 
     :param email: The email address to confirm.
     :type email: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     """
     user = await get_user_by_email(email, db)
     if user:
        user.verified = True
-    db.commit()
+    await db.commit()
+    await user_cache.invalidate(email)
 
 
-async def remove_user(user_id: int, db: Session) -> User | None:
+async def remove_user(user_id: int, db: AsyncSession) -> User | None:
     """
     Remove user.
 
     :param user_id: The user's ID.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Updated user.
     :rtype: User
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).filter(User.id == user_id))
+    user = result.scalar_one_or_none()
     if user:
-        db.delete(user)
-        db.commit()
+        await db.delete(user)
+        await db.commit()
+        await user_cache.invalidate(user.email)
     return user
 
 
-async def patch_avatar(user: User, avatar: str | None, db: Session) -> None:
+async def _update_avatar(user: User, db: AsyncSession, **values) -> User | None:
+    # only the avatar columns are written: the user may be a stale copy from the users cache,
+    # merging it would also write back its old refresh token, password and verification
+    stmt = (update(User).where(User.id == user.id).values(**values).returning(User)
+            .execution_options(populate_existing=True))
+    updated = (await db.execute(stmt)).scalar_one_or_none()
+    await db.commit()
+    await user_cache.invalidate(user.email)
+    return updated
+
+
+async def patch_avatar(user: User, avatar: str | None, db: AsyncSession, variants: dict | None = None) -> User | None:
     """
     Updates the avatar URL for a user in the database.
 
-    :param email: The email address of the user.
-    :type email: str
-    :param url: The new avatar URL.
-    :type url: str
+    :param user: The user, possibly detached, e.g. from the users cache.
+    :type user: User
+    :param avatar: The new avatar URL.
+    :type avatar: str | None
     :param db: The database session.
-    :type db: Session
-    :return: The user with the updated avatar URL.
-    :rtype: User
+    :type db: AsyncSession
+    :param variants: The avatar URLs by size.
+    :type variants: dict | None
+    :return: The user with the updated avatar URL, or None if the user no longer exists.
+    :rtype: User | None
     """
-    user.avatar = avatar
-    db.commit()
-    return user 
+    return await _update_avatar(user, db, avatar=avatar, avatar_variants=variants, avatar_status=None)
+
 
+async def set_avatar_status(user: User, status: str | None, db: AsyncSession) -> User | None:
+    """
+    Sets the state of the user's avatar upload.
 
+    :param user: The user, possibly detached, e.g. from the users cache.
+    :type user: User
+    :param status: "pending", "failed" or None.
+    :type status: str | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The updated user, or None if the user no longer exists.
+    :rtype: User | None
+    """
+    return await _update_avatar(user, db, avatar_status=status)
+
+
+async def fill_gravatars(batch_size: int, db: AsyncSession, after_id: int = 0) -> tuple[int | None, int]:
+    """
+    Sets the Gravatar image as the avatar of a batch of users without one.
+
+    Users with an upload in progress or failed are skipped, and a row changed since it was read is not overwritten.
+
+    :param batch_size: The maximum number of users to read.
+    :type batch_size: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param after_id: Only users with a greater ID are read, the last ID of the previous batch.
+    :type after_id: int
+    :return: The last read ID, None if no user was left, and the number of updated users.
+    :rtype: tuple[int | None, int]
+    """
+    stmt = (select(User.id, User.email)
+            .filter(User.id > after_id, User.avatar.is_(None), User.avatar_status.is_(None))
+            .order_by(User.id).limit(batch_size))
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        return None, 0
+    values = [{"uid": row.id, "gravatar": url} for row in rows if (url := gravatar_url(row.email))]
+    updated = 0
+    if values:
+        table = User.__table__
+        stmt = (update(table)
+                .where(table.c.id == bindparam("uid"), table.c.avatar.is_(None), table.c.avatar_status.is_(None))
+                .values(avatar=bindparam("gravatar")))
+        # one executemany for the whole batch
+        result = await db.execute(stmt, values)
+        updated = result.rowcount
+        await db.commit()
+        filled = {value["uid"] for value in values}
+        for row in rows:
+            if row.id in filled:
+                await user_cache.invalidate(row.email)
+    return rows[-1].id, updated
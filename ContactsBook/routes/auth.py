@@ -1,12 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, Depends, status, Security, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
+from services.limiter import RateLimiter
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.db import get_db
 from schemas import UserCreate, UserResponse, TokenModel, RequestEmail
 from repository import users as repository_users
+from repository import email_jobs as repository_email_jobs
 from services.auth import auth_service
-from services.email import send_email
+from services.cache import email_dedup
 
 
 router = APIRouter(tags=["auth"])
@@ -14,18 +15,18 @@ security = HTTPBearer()
 
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED, response_model=UserResponse, dependencies=[Depends(RateLimiter(times=1, seconds=40))]) 
-async def signup(body: UserCreate, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserCreate, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Endpoint for user registration.
 
+    The verification email is queued for the email worker.
+
     :param body: The data for creating a new user.
     :type body: UserCreate
-    :param background_tasks: Background tasks to execute.
-    :type background_tasks: BackgroundTasks
     :param request: The request object.
     :type request: Request
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Details about the newly created user.
     :rtype: dict
     """
@@ -33,21 +34,27 @@ async def signup(body: UserCreate, background_tasks: BackgroundTasks, request: R
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
     
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
-    background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
+    if await email_dedup.claim(new_user.email):
+        try:
+            await repository_email_jobs.enqueue_email(new_user.email, new_user.username, str(request.base_url), db)
+        except Exception:
+            # the email was not queued, later requests within the window must not reuse it
+            await email_dedup.release(new_user.email)
+            raise
     return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
 
 
 @router.post("/login", response_model=TokenModel, dependencies=[Depends(RateLimiter(times=1, seconds=300))])
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> dict:
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)) -> dict:
     """
     Endpoint for user authentication and login.
 
     :param body: The login credentials.
     :type body: OAuth2PasswordRequestForm
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Access and refresh tokens.
     :rtype: dict
     """
@@ -56,8 +63,11 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.verify_password(body.password, user.password):
+    verified, new_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+    if new_hash:
+        await repository_users.update_password(user, new_hash, db)
     access_token = await auth_service.create_access_token(data={"sub": user.email})
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
     await repository_users.update_token(user, refresh_token, db)
@@ -65,14 +75,14 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
 
 
 @router.get('/confirm_email/{token}')
-async def confirm_email(token: str, db: Session = Depends(get_db)) -> dict:
+async def confirm_email(token: str, db: AsyncSession = Depends(get_db)) -> dict:
     """
     Endpoint for confirming user email.
 
     :param token: The confirmation token sent to the user's email.
     :type token: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Confirmation message.
     :rtype: dict
     """
@@ -87,18 +97,19 @@ async def confirm_email(token: str, db: Session = Depends(get_db)) -> dict:
 
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)) -> dict:
+async def request_email(body: RequestEmail, request: Request, db: AsyncSession = Depends(get_db)) -> dict:
     """
     Endpoint for requesting email confirmation.
 
+    The verification email is queued for the email worker; repeated requests within ``email_dedup_window``
+    reuse the pending or last sent email.
+
     :param body: The email address for which confirmation is requested.
     :type body: RequestEmail
-    :param background_tasks: Background tasks to execute.
-    :type background_tasks: BackgroundTasks
     :param request: The request object.
     :type request: Request
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Confirmation message.
     :rtype: dict
     """
@@ -106,19 +117,25 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user: 
         if user.verified:
             return {"message": f"Your email '{body.email}' is already confirmed"}
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+        if await email_dedup.claim(user.email):
+            try:
+                await repository_email_jobs.enqueue_email(user.email, user.username, str(request.base_url), db)
+            except Exception:
+                # the email was not queued, later requests within the window must not reuse it
+                await email_dedup.release(user.email)
+                raise
     return {"message": "Check your email for confirmation."}
 
 
 @router.get("/refresh_token", response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)) -> dict:
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: AsyncSession = Depends(get_db)) -> dict:
     """
     Endpoint for refreshing access token.
 
     :param credentials: The authorization credentials containing the refresh token.
     :type credentials: HTTPAuthorizationCredentials
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Refreshed access and refresh tokens.
     :rtype: dict
     """
@@ -1,87 +1,278 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
-from fastapi_limiter.depends import RateLimiter
-from database.db import get_db
+import time
+from datetime import date
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Depends, status, Response, UploadFile, File, Query, Header
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from services.limiter import RateLimiter
+from database.db import get_db, get_read_db
 from database.models import User
-from schemas import ContactBase, ContactResponse
+from schemas import ContactBase, ContactResponse, ImportReport, ContactBulkUpdate, ContactSelection, BulkResult, SyncResponse, ContactFields, ContactBaseFields
 from repository import contacts as repository_contacts
+from repository.pagination import next_cursor
 from services.auth import auth_service
+from services.cache import response_cache
+from services.etag import make_etag, etag_matches
+from services.config import settings
+from services.fastjson import dumps
+from services import contacts_io
 
 
 router = APIRouter(tags=["contacts"])
+contacts_adapter = TypeAdapter(list[ContactResponse])
+birthdays_adapter = TypeAdapter(list[ContactBase])
+
+
+def list_columns(fields: tuple[str, ...] | None = None, columns: tuple = repository_contacts.RESPONSE_COLUMNS) -> tuple | None:
+    """
+    Returns the columns list endpoints read as plain rows: the requested fields,
+    or all columns of the response schema if ``json_fast_path`` is enabled.
+
+    :param fields: The sparse fieldset of the request.
+    :type fields: tuple[str, ...] | None
+    :param columns: The columns of the response schema.
+    :type columns: tuple
+    :return: The columns for the repository, None to read Contact objects.
+    :rtype: tuple | None
+    """
+    if fields:
+        return repository_contacts.contact_columns(fields)
+    return columns if settings.json_fast_path else None
+
+
+def contacts_json(contacts: list, adapter: TypeAdapter = contacts_adapter) -> bytes:
+    """
+    Serializes contacts as the JSON body of a list response.
+
+    Plain rows of the fast path are encoded directly, Contact objects are validated with the response schema first.
+
+    :param contacts: The contacts loaded from the database.
+    :type contacts: List[Contact] | list[dict]
+    :param adapter: The adapter of the response schema.
+    :type adapter: TypeAdapter
+    :return: The JSON array of ContactResponse.
+    :rtype: bytes
+    """
+    if contacts and isinstance(contacts[0], dict):
+        return dumps(contacts)
+    return adapter.dump_json(adapter.validate_python(contacts, from_attributes=True))
 
 
 @router.get("/", response_model=list[ContactResponse])
-async def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def read_contacts(skip: int = 0, limit: int = 100, cursor: str | None = None, fields: ContactFields = None, if_none_match: str | None = Header(None), db: AsyncSession = Depends(get_read_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     Endpoint for read all contacts.
 
+    The cursor of the next page is returned in the ``X-Next-Cursor`` header;
+    pass it back as ``cursor`` to read the next page by keyset instead of ``skip``.
+    Like the other read endpoints, the response is cached per user until the user's contacts change.
+    The ``ETag`` changes with the user's contacts revision; if it matches ``If-None-Match``,
+    304 is returned without reading the contacts.
+    ``fields``, e.g. ``first_name,phone``, limits the returned fields; ``id`` is always returned.
+
     :param skip: The database skip contacts.
     :type skip: int
     :param limit: The limit of read contacts.
     :type limit: int
+    :param cursor: The cursor of the page to read.
+    :type cursor: str | None
+    :param fields: The comma-separated fields to return, all if omitted.
+    :type fields: tuple[str, ...] | None
+    :param if_none_match: The entity tags of the client's copy.
+    :type if_none_match: str | None
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current user making the request.
     :type current_user: User
     :return: List of contacts.
     :rtype: List[Contact]
     """
-    contacts = await repository_contacts.get_contacts(skip, limit, current_user, db)
-    return contacts
+    # the entity tag and the cached body are keyed by the revision this session sees, on the replica or the primary;
+    # it is read before the contacts, so a body is never older than its key
+    rev = await repository_contacts.get_contacts_rev(current_user, db)
+    etag = make_etag(current_user.id, rev, "read_contacts", skip, limit, cursor, fields)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    key = response_cache.key(current_user.id, rev, "read_contacts", skip=skip, limit=limit, cursor=cursor, fields=fields)
+    response = await response_cache.get(key)
+    if response is None:
+        try:
+            contacts = await repository_contacts.get_contacts(skip, limit, current_user, db, cursor, list_columns(fields))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        cursor = next_cursor(contacts, limit)
+        headers = {"X-Next-Cursor": cursor} if cursor else None
+        response = await response_cache.set(key, contacts_json(contacts), settings.response_cache_ttl, headers)
+    response.headers["ETag"] = etag
+    return response
 
 
-@router.get("/{contact_id}", response_model=ContactResponse)
-async def read_contact(contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+@router.get("/find", response_model=list[ContactResponse], dependencies=[Depends(RateLimiter(times=3, seconds=60))])
+async def find_contacts(value: str, field: str | None = None, mode: Literal["exact", "search"] = "exact", skip: int = 0, limit: int = 20, fields: ContactFields = None, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(auth_service.get_current_user),):
     """
-    Endpoint for reading contact with a given ID.
+    Endpoint for find contacts by specified field.
 
-    :param contact_id: The contact's ID.
-    :type contact_id: int
+    In ``exact`` mode the contacts are filtered by ``field`` equal to ``value``.
+    In ``search`` mode ``value`` is matched by prefix, substring or with typos across
+    name, email, phone and information fields, and the results are ranked by relevance.
+    ``fields``, e.g. ``first_name,phone``, limits the returned fields; ``id`` is always returned.
+
+    :param value: The value to filter the contacts.
+    :type value: str
+    :param field: The field to filter the contacts (``exact`` mode).
+    :type field: str | None
+    :param mode: The find mode, ``exact`` or ``search``.
+    :type mode: str
+    :param skip: The number of results to skip (``search`` mode).
+    :type skip: int
+    :param limit: The limit of results (``search`` mode).
+    :type limit: int
+    :param fields: The comma-separated fields to return, all if omitted.
+    :type fields: tuple[str, ...] | None
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current user making the request.
     :type current_user: User
-    :return: The newly created contact.
-    :rtype: Contact
+    :return: List of contacts.
+    :rtype: List[Contact]
+    :raises HTTPException: 422 if ``field`` is missing in ``exact`` mode.
     """
-    contact = await repository_contacts.get_contact(contact_id, current_user, db)
-    if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Contact id = {contact_id} (user: '{current_user.email}') not found")
-    return contact
+    if mode == "exact" and field is None:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="field is required in exact mode")
+    rev = await repository_contacts.get_contacts_rev(current_user, db)
+    key = response_cache.key(current_user.id, rev, "find_contacts", value=value, field=field, mode=mode, skip=skip, limit=limit, fields=fields)
+    if (cached := await response_cache.get(key)) is not None:
+        return cached
+    if mode == "search":
+        contacts = await repository_contacts.search_contacts(value, skip, limit, db, current_user, list_columns(fields))
+    else:
+        contacts = await repository_contacts.get_contacts_by(field, value, db, current_user, list_columns(fields))
+    if contacts is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No contact found")    
+    return await response_cache.set(key, contacts_json(contacts), settings.response_cache_find_ttl)
 
 
-@router.get("/find", response_model=list[ContactResponse], dependencies=[Depends(RateLimiter(times=3, seconds=60))])
-async def find_contacts(field: str, value: str, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user),):
+@router.get('/birthdays', response_model=list[ContactBase])
+async def birthdays(days: int = 7, fields: ContactBaseFields = None, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(auth_service.get_current_user)):
     """
-    Endpoint for find contacts by specified field.
+    Endpoint for find contacts with upcoming birthdays in a given day range.
 
-    :param field: The field to filter the contacts.
-    :type field: str
-    :param value: The value to filter the contacts.
-    :type value: str
+    ``fields``, e.g. ``first_name,birthday``, limits the returned fields.
+
+    :param days: Days range include birthday.
+    :type days: int
+    :param fields: The comma-separated fields to return, all if omitted.
+    :type fields: tuple[str, ...] | None
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current user making the request.
     :type current_user: User
     :return: List of contacts.
     :rtype: List[Contact]
     """
-    contacts = await repository_contacts.get_contacts_by(field, value, db, current_user)
-    if contacts is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No contact found")    
-    return contacts
+    rev = await repository_contacts.get_contacts_rev(current_user, db)
+    # the window moves every day, so the date is a part of the key
+    key = response_cache.key(current_user.id, rev, "birthdays", days=days, fields=fields, today=date.today())
+    if (cached := await response_cache.get(key)) is not None:
+        return cached
+    contacts = await repository_contacts.soon_birthdays(days, db, current_user, list_columns(fields, repository_contacts.BASE_COLUMNS))
+    return await response_cache.set(key, contacts_json(contacts, birthdays_adapter), settings.response_cache_birthdays_ttl)
+
+
+@router.get("/sync", response_model=SyncResponse)
+async def sync_contacts(since: int = 0, limit: int = Query(500, ge=1, le=5000), cursor: str | None = None, db: AsyncSession = Depends(get_read_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Endpoint for the delta sync: the contacts created, updated or deleted after a revision.
+
+    A client starts with ``since=0`` and follows ``cursor`` until it is null;
+    the last page has the ``revision`` to pass as ``since`` on the next sync.
+    Deletions are to be applied before upserts.
+
+    :param since: The revision of the client's copy.
+    :type since: int
+    :param limit: The maximum number of changes in one page.
+    :type limit: int
+    :param cursor: The cursor of the next page.
+    :type cursor: str | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The current user making the request.
+    :type current_user: User
+    :return: The page of changes.
+    :rtype: dict
+    """
+    try:
+        return await repository_contacts.sync_contacts(since, limit, current_user, db, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/export", response_class=StreamingResponse, dependencies=[Depends(RateLimiter(times=1, seconds=60))])
+async def export_contacts(fmt: Literal["csv", "jsonl", "vcard"] = Query("csv", alias="format"), db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Endpoint for export all contacts as a CSV, JSON Lines or vCard file.
+
+    Contacts are read with a server-side cursor and streamed to the client,
+    so memory use does not depend on the number of contacts.
+
+    :param fmt: The file format.
+    :type fmt: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The current user making the request.
+    :type current_user: User
+    :return: The streamed contacts file.
+    :rtype: StreamingResponse
+    """
+    rows = repository_contacts.stream_contacts(current_user, db)
+    headers = {"Content-Disposition": f'attachment; filename="contacts.{contacts_io.EXTENSIONS[fmt]}"'}
+    return StreamingResponse(contacts_io.export_chunks(rows, fmt), media_type=contacts_io.MEDIA_TYPES[fmt], headers=headers)
+
+
+@router.get("/{contact_id}", response_model=ContactResponse)
+async def read_contact(contact_id: int, if_none_match: str | None = Header(None), db: AsyncSession = Depends(get_read_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Endpoint for reading contact with a given ID.
+
+    Returns 304 if ``If-None-Match`` has the current ``ETag`` of the contact.
+
+    :param contact_id: The contact's ID.
+    :type contact_id: int
+    :param if_none_match: The entity tags of the client's copy.
+    :type if_none_match: str | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The current user making the request.
+    :type current_user: User
+    :return: The newly created contact.
+    :rtype: Contact
+    """
+    rev = await repository_contacts.get_contacts_rev(current_user, db)
+    etag = make_etag(current_user.id, rev, "read_contact", contact_id)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    key = response_cache.key(current_user.id, rev, "read_contact", contact_id=contact_id)
+    response = await response_cache.get(key)
+    if response is None:
+        contact = await repository_contacts.get_contact(contact_id, current_user, db)
+        if contact is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Contact id = {contact_id} (user: '{current_user.email}') not found")
+        body = ContactResponse.model_validate(contact).model_dump_json().encode()
+        response = await response_cache.set(key, body, settings.response_cache_ttl)
+    response.headers["ETag"] = etag
+    return response
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(RateLimiter(times=3, seconds=7))])
-async def create_contact(body: ContactBase, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def create_contact(body: ContactBase, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     Endpoint for add a new contact.
 
     :param body: The data for creating a new contact.
     :type body: ContactBase
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current user making the request.
     :type current_user: User
     :return: The newly created contact.
@@ -90,8 +281,74 @@ async def create_contact(body: ContactBase, db: Session = Depends(get_db), curre
     return await repository_contacts.create_contact(body, current_user, db)
 
 
+@router.post("/import", response_model=ImportReport, dependencies=[Depends(RateLimiter(times=1, seconds=60))])
+async def import_contacts(file: UploadFile = File(), fmt: Literal["csv", "jsonl", "vcard"] | None = Query(None, alias="format"), db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Endpoint for bulk import of contacts from a CSV, JSON Lines or vCard file.
+
+    The file is read in chunks, every row is validated as ContactBase and valid rows are
+    inserted in batches of ``import_batch_size`` inside one transaction.
+
+    :param file: The contacts file.
+    :type file: UploadFile
+    :param fmt: The file format; detected by the file extension if omitted.
+    :type fmt: str | None
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The current user making the request.
+    :type current_user: User
+    :return: The import report with per-row errors.
+    :rtype: dict
+    """
+    fmt = fmt or contacts_io.detect_format(file.filename)
+    if fmt is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown file format, use format=csv|jsonl|vcard")
+    start = time.perf_counter()
+    report = {"failed": 0, "errors": []}
+    batches = contacts_io.validated_batches(file, fmt, settings.import_batch_size, report, settings.import_max_errors)
+    imported = await repository_contacts.import_contacts(batches, current_user, db)
+    seconds = time.perf_counter() - start
+    return {**report, "imported": imported, "seconds": seconds, "rows_per_second": (imported + report["failed"]) / seconds if seconds else 0.0}
+
+
+@router.post("/bulk-update", response_model=BulkResult, dependencies=[Depends(RateLimiter(times=3, seconds=7))])
+async def bulk_update_contacts(body: ContactBulkUpdate, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Endpoint for update many contacts, selected by IDs and/or a filter, with one statement.
+
+    :param body: The selection of contacts and their new values.
+    :type body: ContactBulkUpdate
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The current user making the request.
+    :type current_user: User
+    :return: The IDs of the updated contacts.
+    :rtype: dict
+    """
+    ids = await repository_contacts.bulk_update_contacts(body, body.values, current_user, db)
+    return {"count": len(ids), "ids": ids}
+
+
+@router.post("/bulk-delete", response_model=BulkResult, dependencies=[Depends(RateLimiter(times=3, seconds=7))])
+async def bulk_remove_contacts(body: ContactSelection, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Endpoint for remove many contacts, selected by IDs and/or a filter, with one statement.
+
+    :param body: The selection of contacts.
+    :type body: ContactSelection
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The current user making the request.
+    :type current_user: User
+    :return: The IDs of the removed contacts.
+    :rtype: dict
+    """
+    ids = await repository_contacts.bulk_remove_contacts(body, current_user, db)
+    return {"count": len(ids), "ids": ids}
+
+
 @router.put("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimiter(times=3, seconds=7))])
-async def update_contact(body: ContactBase, contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def update_contact(body: ContactBase, contact_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     Endpoint for update a contact.
 
@@ -100,7 +357,7 @@ async def update_contact(body: ContactBase, contact_id: int, db: Session = Depen
     :param contact_id: The ID of the contact to update.
     :type contact_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current user making the request.
     :type current_user: User
     :return: The updated contact.
@@ -113,14 +370,14 @@ async def update_contact(body: ContactBase, contact_id: int, db: Session = Depen
 
 
 @router.delete("/{contact_id}", response_model=ContactResponse, dependencies=[Depends(RateLimiter(times=3, seconds=7))])
-async def remove_contact(contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def remove_contact(contact_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     Endpoint for remove a contact.
 
     :param contact_id: The ID of the contact to remove.
     :type contact_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current user making the request.
     :type current_user: User
     :return: The removed contact.
@@ -130,21 +387,3 @@ async def remove_contact(contact_id: int, db: Session = Depends(get_db), current
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Contact id = {contact_id} (user: '{current_user.email}') not found")
     return contact
-
-
-@router.get('/birthdays', response_model=list[ContactBase])
-async def birthdays(days: int = 7, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
-    """
-    Endpoint for find contacts with upcoming birthdays in a given day range.
-
-    :param days: Days range include birthday.
-    :type days: int
-    :param db: The database session.
-    :type db: Session
-    :param current_user: The current user making the request.
-    :type current_user: User
-    :return: List of contacts.
-    :rtype: List[Contact]
-    """
-    contacts = await repository_contacts.soon_birthdays(days, db, current_user)
-    return contacts
\ No newline at end of file
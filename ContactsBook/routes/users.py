@@ -1,16 +1,17 @@
 from typing import Annotated
-from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File, Response, BackgroundTasks
 from fastapi.security import HTTPBearer
-from fastapi_limiter.depends import RateLimiter
-from sqlalchemy.orm import Session
-from database.db import get_db
+from services.limiter import RateLimiter
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.db import get_db, get_read_db
 from schemas import UserUpdate, UserDB
 from repository import users as repository_users
+from repository.pagination import next_cursor
 from services.auth import auth_service
+from services.avatars import avatar_uploader
 from services.config import settings
+from services.fastjson import FastJSONResponse
 from database.models import User
-import cloudinary
-import cloudinary.uploader
 
 
 router = APIRouter(tags=["users"])
@@ -18,20 +19,37 @@ security = HTTPBearer()
 
 
 @router.get("/", response_model=list[UserDB])
-async def read_users(skip: int = 0, limit: int = 20, db: Session = Depends(get_db)):
+async def read_users(response: Response, skip: int = 0, limit: int = 20, cursor: str | None = None, db: AsyncSession = Depends(get_read_db)):
     """
     Endpoint for read all users.
 
+    The cursor of the next page is returned in the ``X-Next-Cursor`` header;
+    pass it back as ``cursor`` to read the next page by keyset instead of ``skip``.
+    With ``json_fast_path`` the users are read as plain rows and encoded without validation by UserDB.
+
+    :param response: The response object.
+    :type response: Response
     :param skip: The database skip users.
     :type skip: int
     :param limit: The limit of read users.
     :type limit: int
+    :param cursor: The cursor of the page to read.
+    :type cursor: str | None
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: List of User.
     :rtype: List[User]
     """
-    users = await repository_users.get_users(skip, limit, db)
+    columns = repository_users.RESPONSE_COLUMNS if settings.json_fast_path else None
+    try:
+        users = await repository_users.get_users(skip, limit, db, cursor, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    cursor = next_cursor(users, limit)
+    headers = {"X-Next-Cursor": cursor} if cursor else {}
+    if columns:
+        return FastJSONResponse(users, headers=headers)
+    response.headers.update(headers)
     return users
 
 
@@ -73,7 +91,7 @@ async def config():
 
 
 @router.put("/{user_id}", response_model=UserDB)
-async def update_user(user_id: int, body: UserUpdate, db: Session = Depends(get_db)):
+async def update_user(user_id: int, body: UserUpdate, db: AsyncSession = Depends(get_db)):
     """
     Endpoint for update user.
 
@@ -82,7 +100,7 @@ async def update_user(user_id: int, body: UserUpdate, db: Session = Depends(get_
     :param body: The data for updating a new user.
     :type body: UserUpdate
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Updated user.
     :rtype: User
     """
@@ -93,14 +111,14 @@ async def update_user(user_id: int, body: UserUpdate, db: Session = Depends(get_
 
 
 @router.delete("/{user_id}", response_model=UserDB)
-async def remove_user(user_id: int, db: Session = Depends(get_db)):
+async def remove_user(user_id: int, db: AsyncSession = Depends(get_db)):
     """
     Endpoint for remove user.
 
     :param user_id: The user's ID.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: Updated user.
     :rtype: User
     """
@@ -110,27 +128,29 @@ async def remove_user(user_id: int, db: Session = Depends(get_db)):
     return user
 
 
-@router.patch("/avatar", response_model=UserDB, dependencies=[Depends(RateLimiter(times=1, seconds=120))])
-async def patch_avatar(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
+@router.patch("/avatar", response_model=UserDB, status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(RateLimiter(times=1, seconds=120))])
+async def patch_avatar(background_tasks: BackgroundTasks, file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user), db: AsyncSession = Depends(get_db)):
     """
     Update the current user's avatar.
 
+    The image is validated by its header and returned at once with ``avatar_status`` "pending";
+    it is resized and uploaded to the avatar storage in the background, and the avatar is replaced when the upload finishes.
+
+    :param background_tasks: Background tasks to execute.
+    :type background_tasks: BackgroundTasks
     :param file: The image file to upload as avatar.
     :type file: UploadFile
     :param current_user: The current user making the request.
     :type current_user: User
     :param db: The database session.
-    :type db: Session
-    :return: Updated current user's avatar.
+    :type db: AsyncSession
+    :return: The current user with the pending avatar upload.
     :rtype: User
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-    r = cloudinary.uploader.upload(file.file, public_id=f'ContactsApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'ContactsApp/{current_user.username}').build_url(width=250, height=250, crop='fill', version=r.get('version'))
-    user = await repository_users.patch_avatar(current_user, src_url, db)
+    try:
+        path = await avatar_uploader.spool(file)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    user = await repository_users.set_avatar_status(current_user, "pending", db)
+    background_tasks.add_task(avatar_uploader.upload, user.id, path)
     return user
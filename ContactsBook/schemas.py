@@ -1,5 +1,6 @@
 from datetime import datetime
-from pydantic import BaseModel, Field, EmailStr
+from typing import Annotated
+from pydantic import BaseModel, Field, EmailStr, AfterValidator, model_validator
 
 
 class UserCreate(BaseModel): 
@@ -56,6 +57,8 @@ class UserDB(BaseModel):
         username (str | None): The name of the user.
         roles (str | None): The role of the user.
         avatar (str | None): The avatar URL of the user, or None if not available.
+        avatar_status (str | None): "pending" while a new avatar is uploaded, "failed" if the last upload failed.
+        avatar_variants (dict[str, str] | None): The avatar URLs by size in pixels.
         created (datetime): The created date of the user.
         verified (bool): The verification of the user.
     """
@@ -64,6 +67,8 @@ class UserDB(BaseModel):
     username: str | None
     roles: str | None
     avatar: str | None
+    avatar_status: str | None = None
+    avatar_variants: dict[str, str] | None = None
     created: datetime
     verified: bool
     class Config:
@@ -143,6 +148,181 @@ class ContactResponse(ContactBase):
         from_attributes = True
 
 
+def fields_parser(allowed: tuple[str, ...], always: tuple[str, ...] = ()):
+    """
+    Builds the parser of a ``fields`` query parameter: a comma-separated list of the fields to return.
+
+    :param allowed: The fields of the response schema in their order.
+    :type allowed: tuple[str, ...]
+    :param always: The fields returned even if not requested, e.g. ``id`` for the next page cursor.
+    :type always: tuple[str, ...]
+    :return: The function returning the requested fields in the schema order, or None if the parameter is not given.
+    """
+    def parse(value: str | None) -> tuple[str, ...] | None:
+        if value is None:
+            return None
+        names = {name.strip() for name in value.split(",")} - {""}
+        if not names:
+            raise ValueError("At least one field is required")
+        unknown = names - set(allowed)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}; expected some of: {', '.join(allowed)}")
+        return tuple(name for name in allowed if name in names or name in always)
+    return parse
+
+
+# the sparse fieldsets of the contact list endpoints, validated while the request is parsed
+ContactFields = Annotated[str | None, AfterValidator(fields_parser(tuple(ContactResponse.model_fields), always=("id",)))]
+ContactBaseFields = Annotated[str | None, AfterValidator(fields_parser(tuple(ContactBase.model_fields)))]
+
+
+class ContactSyncItem(ContactResponse):
+    """
+    Schema representing a changed contact in the delta sync.
+
+    Inherits:
+        ContactResponse: The contact.
+
+    Attributes:
+        rev (int): The revision of the last change of the contact.
+        updated_at (datetime | None): The time of the last change of the contact.
+    """
+    rev: int
+    updated_at: datetime | None
+
+
+class SyncResponse(BaseModel):
+    """
+    Schema representing a page of the delta sync.
+
+    Attributes:
+        upserts (list[ContactSyncItem]): The created or updated contacts.
+        deletions (list[int]): The IDs of the deleted contacts.
+        revision (int | None): The revision to sync from next time, set on the last page.
+        cursor (str | None): The cursor of the next page, or None on the last page.
+    """
+    upserts: list[ContactSyncItem]
+    deletions: list[int]
+    revision: int | None
+    cursor: str | None
+
+
+class ContactPatch(BaseModel):
+    """
+    Schema representing a partial update of contacts; only the given fields are changed.
+
+    Attributes:
+        first_name (str | None): The first name of the contact.
+        last_name (str | None): The last name of the contact.
+        phone (str | None): The phone number of the contact.
+        birthday (datetime | None): The birth date of the contact.
+        inform (str | None): Additional information about the contact.
+        email (str | None): The email address of the contact.
+    """
+    first_name: str | None = Field(None, max_length=25)
+    last_name: str | None = Field(None, max_length=30)
+    phone: str | None = Field(None, max_length=13)
+    birthday: datetime | None = None
+    inform: str | None = Field(None, max_length=150)
+    email: str | None = None
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if not self.model_dump(exclude_none=True):
+            raise ValueError("At least one field must be set")
+        return self
+
+
+class ContactFilter(BaseModel):
+    """
+    Schema representing a filter of contacts; all given fields must be equal.
+
+    Attributes:
+        first_name (str | None): The first name of the contacts.
+        last_name (str | None): The last name of the contacts.
+        phone (str | None): The phone number of the contacts.
+        email (str | None): The email address of the contacts.
+    """
+    first_name: str | None = None
+    last_name: str | None = None
+    phone: str | None = None
+    email: str | None = None
+
+
+class ContactSelection(BaseModel):
+    """
+    Schema representing a set of contacts for a bulk operation, selected by IDs, by a filter or both.
+
+    Attributes:
+        ids (list[int] | None): The IDs of the contacts.
+        filter (ContactFilter | None): The filter of the contacts.
+    """
+    ids: list[int] | None = Field(None, max_length=10000)
+    filter: ContactFilter | None = None
+
+    @model_validator(mode="after")
+    def check_selection(self):
+        # an empty selection would match every contact of the user
+        if self.ids is None and not (self.filter and self.filter.model_dump(exclude_none=True)):
+            raise ValueError("Either ids or a non-empty filter is required")
+        return self
+
+
+class ContactBulkUpdate(ContactSelection):
+    """
+    Schema representing a bulk update of contacts.
+
+    Inherits:
+        ContactSelection: The contacts to update.
+
+    Attributes:
+        values (ContactPatch): The new values of the contacts.
+    """
+    values: ContactPatch
+
+
+class BulkResult(BaseModel):
+    """
+    Schema representing the result of a bulk update or delete.
+
+    Attributes:
+        count (int): The number of affected contacts.
+        ids (list[int]): The IDs of the affected contacts.
+    """
+    count: int
+    ids: list[int]
+
+
+class ImportRowError(BaseModel):
+    """
+    Schema representing a row rejected by the contacts import.
+
+    Attributes:
+        row (int): The number of the data row in the file, starting from 1.
+        errors (list[str]): The validation errors of the row.
+    """
+    row: int
+    errors: list[str]
+
+
+class ImportReport(BaseModel):
+    """
+    Schema representing the result of a bulk contacts import.
+
+    Attributes:
+        imported (int): The number of created contacts.
+        failed (int): The number of rejected rows.
+        errors (list[ImportRowError]): The reports of rejected rows.
+        seconds (float): The import duration.
+        rows_per_second (float): The import throughput.
+    """
+    imported: int
+    failed: int
+    errors: list[ImportRowError]
+    seconds: float
+    rows_per_second: float
+
+
 class RequestEmail(BaseModel):
     """
     Schema representing the structure of a request email.
@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from datetime import datetime, timedelta
 
@@ -6,27 +8,50 @@ import redis.asyncio as redis
 from fastapi import HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from database.db import get_db
 from repository import users as repository_users
+from services.cache import user_cache, response_cache, email_dedup, PayloadCache
 from services.config import settings 
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
+    hash_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="bcrypt")
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
     r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    payload_cache = PayloadCache(settings.jwt_cache_size)
 
 
-    def verify_password(self, plain_password, hashed_password):
-        return self.pwd_context.verify(plain_password, hashed_password)
+    def decode_token(self, token: str) -> dict:
+        # the same bearer token comes with every request of a client, verify its signature only once
+        payload = self.payload_cache.get(token)
+        if payload is None:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            self.payload_cache.set(token, payload)
+        return payload
+
+
+    async def _run_hasher(self, func, *args):
+        # bcrypt is CPU-bound, keep it off the event loop in a bounded pool
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.hash_executor, func, *args)
+
+
+    async def verify_password(self, plain_password, hashed_password):
+        return await self._run_hasher(self.pwd_context.verify, plain_password, hashed_password)
 
 
-    def get_password_hash(self, password: str):
-        return self.pwd_context.hash(password)
+    async def verify_and_update_password(self, plain_password, hashed_password):
+        # returns (verified, new_hash); new_hash is set when pwd_context.needs_update() flags a legacy hash
+        return await self._run_hasher(self.pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+    async def get_password_hash(self, password: str):
+        return await self._run_hasher(self.pwd_context.hash, password)
 
 
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
@@ -53,7 +78,7 @@ class Auth:
 
     async def decode_refresh_token(self, refresh_token: str):
         try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(refresh_token)
             if payload['scope'] == 'refresh_token':
                 email = payload['sub']
                 return email
@@ -62,14 +87,14 @@ class Auth:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
         
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
         exception401 = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             if payload['scope'] == 'access_token':
                 email = payload["sub"]
                 if email is None:
@@ -79,9 +104,12 @@ class Auth:
         except JWTError as e:
             raise exception401
 
-        user = await repository_users.get_user_by_email(email, db)
+        user = await user_cache.get(email)
         if user is None:
-            raise exception401
+            user = await repository_users.get_user_by_email(email, db)
+            if user is None:
+                raise exception401
+            await user_cache.set(user)
         return user
 
 
@@ -105,3 +133,6 @@ class Auth:
 
 
 auth_service = Auth()
+user_cache.bind(Auth.r)
+response_cache.bind(Auth.r)
+email_dedup.bind(Auth.r)
@@ -0,0 +1,193 @@
+import asyncio
+import io
+import logging
+import os
+import tempfile
+from pathlib import Path, PurePosixPath
+
+import cloudinary
+import cloudinary.uploader
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database.db import DBSession
+from database.models import User
+from repository import users as repository_users
+from services.config import settings
+from services.images import check_image, avatar_variants
+
+
+logger = logging.getLogger(__name__)
+
+
+class CloudinaryStorage:
+    """
+    Stores avatar images in Cloudinary as they are, without remote transformations.
+    """
+    folder = "ContactsApp"
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str):
+        cloudinary.config(cloud_name=cloud_name, api_key=api_key, api_secret=api_secret, secure=True)
+
+
+    async def save(self, name: str, data: bytes) -> str:
+        """
+        Uploads an image in a worker thread, so the transfer does not block the event loop.
+
+        :param name: The content-addressed name, e.g. ``ab/abcdef.../250.webp``.
+        :type name: str
+        :param data: The encoded image.
+        :type data: bytes
+        :return: The URL of the image.
+        :rtype: str
+        """
+        public_id = f"{self.folder}/{PurePosixPath(name).with_suffix('')}"
+        # the content of a name never changes, an existing image is kept
+        r = await asyncio.to_thread(cloudinary.uploader.upload, io.BytesIO(data), public_id=public_id, overwrite=False)
+        return r["secure_url"]
+
+
+class LocalStorage:
+    """
+    Stores avatar images as files in a local folder served at ``base_url``, for tests and offline deployments.
+    """
+
+    def __init__(self, root: str | Path, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+
+    def _write(self, target: Path, data: bytes) -> None:
+        if target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        # readers never see a partly written image
+        os.replace(tmp, target)
+
+
+    async def save(self, name: str, data: bytes) -> str:
+        """
+        Writes an image into the folder in a worker thread.
+
+        :param name: The content-addressed name, e.g. ``ab/abcdef.../250.webp``.
+        :type name: str
+        :param data: The encoded image.
+        :type data: bytes
+        :return: The URL of the image.
+        :rtype: str
+        """
+        await asyncio.to_thread(self._write, self.root / name, data)
+        return f"{self.base_url}/{name}"
+
+
+def copy_limited(src, dst, limit: int, chunk_size: int) -> int:
+    """
+    Copies a file object in chunks, stopping as soon as it is larger than the limit.
+
+    :param src: The source file object.
+    :param dst: The destination file object.
+    :param limit: The maximum number of bytes.
+    :type limit: int
+    :param chunk_size: The number of bytes read at once.
+    :type chunk_size: int
+    :return: The number of copied bytes.
+    :rtype: int
+    :raises ValueError: If the source is larger than the limit.
+    """
+    size = 0
+    while chunk := src.read(chunk_size):
+        size += len(chunk)
+        if size > limit:
+            raise ValueError(f"The image is larger than {limit} bytes")
+        dst.write(chunk)
+    return size
+
+
+def make_storage() -> CloudinaryStorage | LocalStorage:
+    """
+    Creates the avatar storage selected by ``settings.avatar_storage``.
+
+    :return: The storage backend.
+    :rtype: CloudinaryStorage | LocalStorage
+    """
+    if settings.avatar_storage == "local":
+        return LocalStorage(settings.avatar_local_dir, settings.avatar_local_url)
+    return CloudinaryStorage(settings.cloudinary_name, settings.cloudinary_api_key, settings.cloudinary_api_secret)
+
+
+class AvatarUploader:
+    """
+    Uploads avatars in the background: the endpoint spools and validates the file and responds with the "pending" state,
+    the image is resized into ``avatar_sizes`` and the user's avatar is set when the storage has all variants.
+    """
+
+    def __init__(self, storage=None, session_maker: async_sessionmaker = DBSession):
+        self._storage = storage
+        self.session_maker = session_maker
+
+
+    @property
+    def storage(self) -> CloudinaryStorage | LocalStorage:
+        if self._storage is None:
+            self._storage = make_storage()
+        return self._storage
+
+
+    @storage.setter
+    def storage(self, storage) -> None:
+        self._storage = storage
+
+
+    async def spool(self, file: UploadFile) -> Path:
+        """
+        Copies an uploaded image to a temporary file that outlives the request and validates it.
+
+        :param file: The uploaded file.
+        :type file: UploadFile
+        :return: The path of the temporary file, removed by ``upload``.
+        :rtype: Path
+        :raises ValueError: If the file is larger than ``avatar_max_bytes`` or not a supported image.
+        """
+        fd, name = tempfile.mkstemp(prefix="avatar-")
+        path = Path(name)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                await asyncio.to_thread(copy_limited, file.file, tmp, settings.avatar_max_bytes, settings.avatar_chunk_size)
+            await asyncio.to_thread(check_image, path, settings.avatar_max_pixels)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        return path
+
+
+    async def upload(self, user_id: int, path: Path) -> None:
+        """
+        Stores a spooled avatar and sets it as the user's avatar, or marks the upload as failed.
+
+        :param user_id: The ID of the user.
+        :type user_id: int
+        :param path: The spooled image file.
+        :type path: Path
+        """
+        try:
+            # decoding and resizing are CPU bound, Pillow releases the GIL for them
+            variants = await asyncio.to_thread(avatar_variants, path, settings.avatar_sizes, settings.avatar_quality)
+            urls = await asyncio.gather(*(self.storage.save(name, data) for name, data in variants.values()))
+            urls = {str(size): url for size, url in zip(variants, urls)}
+        except Exception as e:
+            logger.warning("Avatar upload of user %s failed: %s", user_id, e)
+            urls = None
+        finally:
+            path.unlink(missing_ok=True)
+        async with self.session_maker() as db:
+            user = await db.get(User, user_id)
+            if user is None:
+                return
+            if urls is None:
+                await repository_users.set_avatar_status(user, "failed", db)
+            else:
+                await repository_users.patch_avatar(user, urls[str(settings.avatar_default_size)], db, variants=urls)
+
+
+avatar_uploader = AvatarUploader()
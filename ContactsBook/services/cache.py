@@ -0,0 +1,457 @@
+import hashlib
+import json
+import pickle
+import time
+from datetime import datetime
+from collections import OrderedDict
+
+from fastapi import Response
+from redis.exceptions import RedisError
+from sqlalchemy.orm import make_transient_to_detached
+from database.models import User
+from services.config import settings
+from services.fastjson import dumps
+
+
+class RedisBacked:
+    """
+    Base of the caches with an optional Redis client.
+
+    If no client is bound or Redis is unreachable, the Redis calls are skipped for ``redis_retry_after`` seconds.
+    """
+    redis_retry_after = 30
+
+    def __init__(self):
+        self.r = None
+        self._redis_down_until = 0.0
+
+
+    def bind(self, r) -> None:
+        """
+        Sets the Redis client of the cache.
+
+        :param r: The async Redis client.
+        :type r: redis.asyncio.Redis
+        """
+        self.r = r
+        self._redis_down_until = 0.0
+
+
+    def _redis_ready(self) -> bool:
+        return self.r is not None and self._redis_down_until < time.monotonic()
+
+
+    def _redis_failed(self) -> None:
+        # do not pay the client's connect retries on every request while Redis is down
+        self._redis_down_until = time.monotonic() + self.redis_retry_after
+
+
+class UserCache(RedisBacked):
+    """
+    Two-tier cache of authenticated users keyed by email.
+
+    The first tier is an in-process LRU with a short TTL, the second one is Redis shared by all workers.
+    Redis is optional: if no client is bound or it is unreachable the cache works with the local tier only.
+    Only the columns in ``columns`` are cached, as JSON; the password hash and the refresh token never leave the database.
+    """
+    prefix = "user:"
+    columns = ("id", "email", "username", "roles", "avatar", "avatar_status", "avatar_variants", "created", "verified")
+
+    def __init__(self, maxsize: int, local_ttl: int, redis_ttl: int):
+        super().__init__()
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self._local: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._missed: set[str] = set()      # invalidations Redis has not received yet
+        self._redis_stale_until = 0.0
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+
+
+    def _local_get(self, email: str) -> bytes | None:
+        item = self._local.get(email)
+        if item is None:
+            return None
+        expire, data = item
+        if expire < time.monotonic():
+            del self._local[email]
+            return None
+        self._local.move_to_end(email)
+        return data
+
+
+    def _local_set(self, email: str, data: bytes) -> None:
+        self._local[email] = (time.monotonic() + self.local_ttl, data)
+        self._local.move_to_end(email)
+        while len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+
+    def _dumps(self, user: User) -> bytes:
+        return dumps({name: getattr(user, name) for name in self.columns})
+
+
+    def _loads(self, data: bytes) -> User:
+        values = json.loads(data)
+        if values["created"] is not None:
+            values["created"] = datetime.fromisoformat(values["created"])
+        user = User(**values)
+        # like a row of a closed session: the columns that are not cached raise instead of reading as None
+        make_transient_to_detached(user)
+        return user
+
+
+    async def _redis_usable(self) -> bool:
+        """
+        Checks if the Redis tier can be used, after delivering the invalidations it missed while it was down.
+        """
+        if not self._redis_ready() or self._redis_stale_until > time.monotonic():
+            return False
+        if self._missed:
+            emails = list(self._missed)
+            try:
+                await self.r.delete(*(self.prefix + email for email in emails))
+            except (RedisError, OSError):
+                self._redis_failed()
+                return False
+            self._missed.difference_update(emails)
+        return True
+
+
+    def _redis_missed(self, email: str) -> None:
+        if self.r is None:
+            return
+        self._missed.add(email)
+        if len(self._missed) > self.maxsize:
+            # too many to remember: the Redis tier is not read until every entry written before has expired
+            self._missed.clear()
+            self._redis_stale_until = time.monotonic() + self.redis_ttl
+
+
+    async def get(self, email: str) -> User | None:
+        """
+        Reads a user from the cache.
+
+        :param email: The email address of the user.
+        :type email: str
+        :return: A detached copy of the cached columns of the user, or None on a cache miss.
+        :rtype: User | None
+        """
+        data = self._local_get(email)
+        if data is not None:
+            self.hits_local += 1
+            return self._loads(data)
+        if await self._redis_usable():
+            try:
+                data = await self.r.get(self.prefix + email)
+            except (RedisError, OSError):
+                self._redis_failed()
+                data = None
+            if data is not None:
+                try:
+                    user = self._loads(data)
+                except (ValueError, TypeError, KeyError):
+                    # e.g. an entry written by an older version, the user is read from the database again
+                    user = None
+                if user is not None:
+                    self.hits_redis += 1
+                    self._local_set(email, data)
+                    return user
+        self.misses += 1
+        return None
+
+
+    async def set(self, user: User) -> None:
+        """
+        Puts a user into both cache tiers.
+
+        :param user: The user loaded from the database.
+        :type user: User
+        """
+        data = self._dumps(user)
+        self._local_set(user.email, data)
+        if await self._redis_usable():
+            try:
+                await self.r.set(self.prefix + user.email, data, ex=self.redis_ttl)
+            except (RedisError, OSError):
+                self._redis_failed()
+
+
+    async def invalidate(self, email: str) -> None:
+        """
+        Removes a user from both cache tiers. Must be called after every change of the user's row.
+
+        If Redis is down, the entry is deleted from it before the Redis tier is used again.
+
+        :param email: The email address of the user.
+        :type email: str
+        """
+        self._local.pop(email, None)
+        if await self._redis_usable():
+            try:
+                await self.r.delete(self.prefix + email)
+                return
+            except (RedisError, OSError):
+                self._redis_failed()
+        self._redis_missed(email)
+
+
+    def stats(self) -> dict:
+        """
+        Returns the cache hit/miss counters.
+
+        :return: Counters of local hits, Redis hits and misses.
+        :rtype: dict
+        """
+        return {"hits_local": self.hits_local, "hits_redis": self.hits_redis, "misses": self.misses, "size": len(self._local)}
+
+
+class PayloadCache:
+    """
+    Bounded LRU of verified JWT payloads keyed by the token digest.
+
+    An entry lives until the token's own ``exp``, so a cached payload is never returned for an expired token.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+
+    def get(self, token: str) -> dict | None:
+        """
+        Reads a verified payload for the token.
+
+        :param token: The encoded JWT.
+        :type token: str
+        :return: The payload, or None if the token was not verified yet or has expired.
+        :rtype: dict | None
+        """
+        key = self.key(token)
+        item = self._items.get(key)
+        if item is None or item[0] <= time.time():
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+
+    def set(self, token: str, payload: dict) -> None:
+        """
+        Stores the payload of a token that passed signature verification.
+
+        :param token: The encoded JWT.
+        :type token: str
+        :param payload: The decoded payload with an ``exp`` claim.
+        :type payload: dict
+        """
+        exp = payload.get("exp")
+        if exp is None or self.maxsize <= 0:
+            return
+        key = self.key(token)
+        self._items[key] = (float(exp), payload)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._items)}
+
+
+class ResponseCache(RedisBacked):
+    """
+    Per-user cache of serialized read responses in Redis.
+
+    Every entry key contains the revision of the user's contacts (``User.contacts_rev``) read by the request
+    on the same session as the response data, before it. Writes bump the revision, so older entries are never
+    read again and just expire by their TTL; a response read from a lagging replica is stored under the revision
+    the replica had, not under the one of the primary.
+    Without Redis every lookup is a miss and nothing is stored.
+    """
+    prefix = "resp:"
+    media_type = "application/json"
+
+    def __init__(self):
+        super().__init__()
+        self.hits = 0
+        self.misses = 0
+
+
+    def key(self, user_id: int, rev: int, endpoint: str, **params) -> str | None:
+        """
+        Builds the cache key of a response for a revision of the user's contacts.
+
+        :param user_id: The ID of the user.
+        :type user_id: int
+        :param rev: The revision of the user's contacts read by the request, see ``get_contacts_rev``.
+        :type rev: int
+        :param endpoint: The name of the endpoint.
+        :type endpoint: str
+        :param params: The request parameters the response depends on.
+        :return: The cache key, or None if Redis is not available.
+        :rtype: str | None
+        """
+        if not self._redis_ready():
+            return None
+        digest = hashlib.sha256(repr(sorted(params.items())).encode()).hexdigest()[:32]
+        return f"{self.prefix}{user_id}:{rev}:{endpoint}:{digest}"
+
+
+    async def get(self, key: str | None) -> Response | None:
+        """
+        Reads a cached response.
+
+        :param key: The cache key from ``key``.
+        :type key: str | None
+        :return: The cached response, or None on a miss.
+        :rtype: Response | None
+        """
+        data = None
+        if key is not None and self._redis_ready():
+            try:
+                data = await self.r.get(key)
+            except (RedisError, OSError):
+                self._redis_failed()
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        body, headers = pickle.loads(data)
+        return Response(body, media_type=self.media_type, headers=headers)
+
+
+    async def set(self, key: str | None, body: bytes, ttl: int, headers: dict | None = None) -> Response:
+        """
+        Stores a serialized response and returns it.
+
+        :param key: The cache key from ``key``.
+        :type key: str | None
+        :param body: The JSON response body.
+        :type body: bytes
+        :param ttl: The entry lifetime in seconds.
+        :type ttl: int
+        :param headers: The response headers to keep with the body.
+        :type headers: dict | None
+        :return: The response to send.
+        :rtype: Response
+        """
+        if key is not None and self._redis_ready():
+            try:
+                await self.r.set(key, pickle.dumps((body, headers)), ex=ttl)
+            except (RedisError, OSError):
+                self._redis_failed()
+        return Response(body, media_type=self.media_type, headers=headers)
+
+
+    def stats(self) -> dict:
+        """
+        Returns the cache hit/miss counters.
+
+        :return: Counters of hits and misses and the hit rate.
+        :rtype: dict
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+class EmailDedup(RedisBacked):
+    """
+    Per-address window coalescing repeated verification emails.
+
+    The first request for an address in ``window`` seconds sends the email, the later ones reuse it.
+    The window is kept in process, so concurrent requests to one worker are decided without awaiting,
+    and in Redis with ``SET NX``, so the first request across all workers wins.
+    """
+    prefix = "email:sent:"
+
+    def __init__(self, window: int, maxsize: int = 100_000):
+        super().__init__()
+        self.window = window
+        self.maxsize = maxsize
+        self._local: OrderedDict[str, float] = OrderedDict()
+        self.sent = 0
+        self.suppressed_local = 0
+        self.suppressed_redis = 0
+
+
+    async def claim(self, email: str) -> bool:
+        """
+        Decides if a verification email to the address is sent now.
+
+        :param email: The address.
+        :type email: str
+        :return: True for the first request in the window, False if the pending or last sent email is reused.
+        :rtype: bool
+        """
+        email = email.lower()
+        now = time.monotonic()
+        expires = self._local.get(email)
+        if expires is not None and expires > now:
+            self.suppressed_local += 1
+            return False
+        self._local[email] = now + self.window
+        self._local.move_to_end(email)
+        # every entry has the same window, so the front of the dict expires first
+        while self._local and (len(self._local) > self.maxsize or next(iter(self._local.values())) <= now):
+            self._local.popitem(last=False)
+        if self._redis_ready():
+            try:
+                if not await self.r.set(self.prefix + email, 1, nx=True, ex=self.window):
+                    self.suppressed_redis += 1
+                    return False
+            except (RedisError, OSError):
+                self._redis_failed()
+        self.sent += 1
+        return True
+
+
+    async def release(self, email: str) -> None:
+        """
+        Withdraws a claim whose email could not be queued, so the next request sends it.
+
+        :param email: The address.
+        :type email: str
+        """
+        email = email.lower()
+        self._local.pop(email, None)
+        self.sent -= 1
+        if self._redis_ready():
+            try:
+                await self.r.delete(self.prefix + email)
+            except (RedisError, OSError):
+                self._redis_failed()
+
+
+    def clear(self) -> None:
+        """
+        Forgets the in-process window of all addresses.
+        """
+        self._local.clear()
+
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of sent and suppressed emails.
+
+        :return: Counters of sent emails and of requests coalesced in process and by Redis.
+        :rtype: dict
+        """
+        return {"sent": self.sent, "suppressed_local": self.suppressed_local, "suppressed_redis": self.suppressed_redis}
+
+
+user_cache = UserCache(settings.user_cache_size, settings.user_cache_local_ttl, settings.user_cache_ttl)
+response_cache = ResponseCache()
+email_dedup = EmailDedup(settings.email_dedup_window)
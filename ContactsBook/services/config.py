@@ -10,6 +10,7 @@ class Settings(BaseSettings):
 
     POSTGRESQL_URL: str
     SQLITE_URL: str
+    READ_REPLICA_URL: str | None = None     # e.g. sqlite:///file:./replica.db?mode=ro&uri=true
     mail_username: str
     mail_password: str
     mail_from: str
@@ -17,6 +18,54 @@ class Settings(BaseSettings):
     mail_server: str
     redis_host: str = 'localhost'
     redis_port: int = 6379
+    rate_limiter_backend: str = "redis"    # "redis" shared by all workers or "memory" for a single node
+
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout: int = 5000     # milliseconds
+    sqlite_cache_size: int = 16384      # KiB per connection
+
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+
+    user_cache_size: int = 1024
+    user_cache_local_ttl: int = 30
+    user_cache_ttl: int = 900
+    jwt_cache_size: int = 4096
+    response_cache_ttl: int = 300
+    response_cache_find_ttl: int = 60
+    response_cache_birthdays_ttl: int = 3600
+    json_fast_path: bool = False      # list endpoints read plain rows and encode them without the response models
+
+    import_batch_size: int = 1000
+    import_max_errors: int = 1000
+
+    email_batch_size: int = 50
+    email_poll_interval: float = 1.0    # seconds between polls of an empty queue
+    email_lease: int = 300              # seconds a claimed job is hidden from other workers
+    email_max_attempts: int = 5
+    email_retry_delay: int = 30         # seconds, doubled after every failed attempt
+    email_retry_max_delay: int = 3600
+    email_metrics_interval: int = 60
+    email_dedup_window: int = 600       # seconds a verification email is reused for repeated requests
+
+    avatar_storage: str = "cloudinary"     # "cloudinary" or "local"
+    avatar_local_dir: str = "media/avatars"
+    avatar_local_url: str = "/media/avatars"
+    avatar_chunk_size: int = 1024 * 1024
+    avatar_max_bytes: int = 5 * 1024 * 1024
+    avatar_max_pixels: int = 40_000_000
+    avatar_sizes: list[int] = [64, 128, 250, 512]
+    avatar_default_size: int = 250     # the size of User.avatar
+    avatar_quality: int = 85
+    gravatar_cache_size: int = 4096
+    gravatar_batch_size: int = 500
+    gravatar_interval: float = 60     # seconds between reconciliations of users without an avatar
 
     cloudinary_name: str
     cloudinary_api_key: str
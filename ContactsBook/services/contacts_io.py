@@ -0,0 +1,253 @@
+import codecs
+import csv
+import io
+import json
+import re
+from typing import AsyncIterable, AsyncIterator, Mapping
+
+from fastapi import UploadFile
+from pydantic import ValidationError
+
+from schemas import ContactBase
+
+
+CHUNK_SIZE = 64 * 1024
+CONTACT_FIELDS = ("first_name", "last_name", "phone", "birthday", "inform", "email")
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".vcf": "vcard", ".vcard": "vcard"}
+MEDIA_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson", "vcard": "text/vcard"}
+EXTENSIONS = {"csv": "csv", "jsonl": "jsonl", "vcard": "vcf"}
+
+
+def detect_format(filename: str | None) -> str | None:
+    """
+    Detects the contacts file format by its extension.
+
+    :param filename: The uploaded file name.
+    :type filename: str | None
+    :return: ``csv``, ``jsonl``, ``vcard`` or None if unknown.
+    :rtype: str | None
+    """
+    name = (filename or "").lower()
+    for ext, fmt in FORMATS.items():
+        if name.endswith(ext):
+            return fmt
+    return None
+
+
+async def read_lines(file: UploadFile) -> AsyncIterator[str]:
+    """
+    Reads an uploaded file line by line in fixed-size chunks, without loading it into memory.
+
+    :param file: The uploaded file.
+    :type file: UploadFile
+    :return: Async iterator of text lines without line endings.
+    :rtype: AsyncIterator[str]
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    tail = ""
+    while chunk := await file.read(CHUNK_SIZE):
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail.rstrip("\r")
+
+
+async def parse_csv(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict]]:
+    header = None
+    record = ""
+    row = 0
+    async for line in lines:
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue    # quoted field continues on the next line
+        values, record = next(csv.reader([record])), ""
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if not any(values):
+            continue
+        row += 1
+        yield row, dict(zip(header, values))
+
+
+async def parse_jsonl(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict]]:
+    row = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            record = {"__error__": f"Invalid JSON: {e.msg}"}
+        if not isinstance(record, dict):
+            record = {"__error__": "Invalid JSON: an object is expected"}
+        yield row, record
+
+
+def _vcard_unescape(value: str) -> str:
+    return value.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+
+def _vcard_date(value: str) -> str:
+    value = value.strip()
+    if len(value) == 8 and value.isdigit():
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value
+
+
+def _vcard_record(props: list[tuple[str, str]]) -> dict:
+    record = {"inform": ""}
+    for name, value in props:
+        if name == "N":
+            parts = re.split(r"(?<!\\);", value) + ["", ""]
+            record["last_name"] = _vcard_unescape(parts[0])
+            record["first_name"] = _vcard_unescape(parts[1])
+        elif name == "FN" and "first_name" not in record:
+            first, _, last = _vcard_unescape(value).partition(" ")
+            record["first_name"], record["last_name"] = first, last
+        elif name == "EMAIL" and "email" not in record:
+            record["email"] = value.strip()
+        elif name == "TEL" and "phone" not in record:
+            record["phone"] = value.strip()
+        elif name == "BDAY":
+            record["birthday"] = _vcard_date(value)
+        elif name == "NOTE":
+            record["inform"] = _vcard_unescape(value)
+    return record
+
+
+async def parse_vcard(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict]]:
+    props = None
+    prop = None
+    row = 0
+    async for line in lines:
+        if line[:1] in (" ", "\t") and prop is not None:
+            prop += line[1:]     # folded line
+            continue
+        if prop is not None and props is not None:
+            name, _, value = prop.partition(":")
+            props.append((name.split(";")[0].upper(), value))
+        prop = None
+        upper = line.strip().upper()
+        if upper == "BEGIN:VCARD":
+            props = []
+        elif upper == "END:VCARD" and props is not None:
+            row += 1
+            yield row, _vcard_record(props)
+            props = None
+        elif props is not None and line.strip():
+            prop = line
+
+
+PARSERS = {"csv": parse_csv, "jsonl": parse_jsonl, "vcard": parse_vcard}
+
+
+async def validated_batches(file: UploadFile, fmt: str, batch_size: int, report: dict, max_errors: int) -> AsyncIterator[list[ContactBase]]:
+    """
+    Parses an uploaded contacts file and validates every row with ContactBase.
+
+    Valid rows are yielded in batches, invalid ones are counted in ``report["failed"]``
+    and described in ``report["errors"]`` (at most ``max_errors`` of them).
+
+    :param file: The uploaded file.
+    :type file: UploadFile
+    :param fmt: The file format: ``csv``, ``jsonl`` or ``vcard``.
+    :type fmt: str
+    :param batch_size: The number of contacts in one batch.
+    :type batch_size: int
+    :param report: The import report with ``failed`` counter and ``errors`` list.
+    :type report: dict
+    :param max_errors: The maximum number of row errors kept in the report.
+    :type max_errors: int
+    :return: Async iterator of validated contact batches.
+    :rtype: AsyncIterator[list[ContactBase]]
+    """
+    batch = []
+    async for row, record in PARSERS[fmt](read_lines(file)):
+        try:
+            if "__error__" in record:
+                raise ValueError(record["__error__"])
+            batch.append(ContactBase.model_validate({f: record.get(f) for f in CONTACT_FIELDS}))
+        except (ValidationError, ValueError) as e:
+            report["failed"] += 1
+            if len(report["errors"]) < max_errors:
+                if isinstance(e, ValidationError):
+                    messages = [f"{'.'.join(str(i) for i in err['loc'])}: {err['msg']}" for err in e.errors()]
+                else:
+                    messages = [str(e)]
+                report["errors"].append({"row": row, "errors": messages})
+            continue
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv_row(values: list) -> str:
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow(values)
+    return buf.getvalue()
+
+
+def format_csv(row: Mapping) -> str:
+    return _csv_row(["" if row[f] is None else row[f] for f in CONTACT_FIELDS])
+
+
+def format_jsonl(row: Mapping) -> str:
+    record = {f: row[f] for f in ("id",) + CONTACT_FIELDS}
+    if record["birthday"] is not None:
+        record["birthday"] = record["birthday"].isoformat()
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def _vcard_escape(value) -> str:
+    return str(value or "").replace("\\", "\\\\").replace("\n", "\\n").replace(",", "\\,").replace(";", "\\;")
+
+
+def format_vcard(row: Mapping) -> str:
+    first, last = _vcard_escape(row["first_name"]), _vcard_escape(row["last_name"])
+    lines = ["BEGIN:VCARD", "VERSION:3.0", f"N:{last};{first};;;", f"FN:{first} {last}".rstrip()]
+    if row["email"]:
+        lines.append(f"EMAIL;TYPE=INTERNET:{row['email']}")
+    if row["phone"]:
+        lines.append(f"TEL;TYPE=CELL:{row['phone']}")
+    if row["birthday"]:
+        lines.append(f"BDAY:{row['birthday'].isoformat()}")
+    if row["inform"]:
+        lines.append(f"NOTE:{_vcard_escape(row['inform'])}")
+    lines.append("END:VCARD")
+    return "\r\n".join(lines) + "\r\n"
+
+
+FORMATTERS = {"csv": format_csv, "jsonl": format_jsonl, "vcard": format_vcard}
+
+
+async def export_chunks(rows: AsyncIterable[Mapping], fmt: str) -> AsyncIterator[bytes]:
+    """
+    Encodes streamed contact rows into a CSV, JSON Lines or vCard file.
+
+    Rows are grouped into chunks of about ``CHUNK_SIZE`` bytes, so only one chunk is held in memory.
+
+    :param rows: The contact rows.
+    :type rows: AsyncIterable[Mapping]
+    :param fmt: The file format: ``csv``, ``jsonl`` or ``vcard``.
+    :type fmt: str
+    :return: Async iterator of encoded file chunks.
+    :rtype: AsyncIterator[bytes]
+    """
+    formatter = FORMATTERS[fmt]
+    parts = [_csv_row(CONTACT_FIELDS)] if fmt == "csv" else []
+    size = 0
+    async for row in rows:
+        part = formatter(row)
+        parts.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield "".join(parts).encode()
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts).encode()
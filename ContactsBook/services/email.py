@@ -1,40 +1,189 @@
-from pathlib import Path
-
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
-from pydantic import EmailStr
-from services.config import settings
-from services.auth import auth_service
-
-
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="ContactsBook",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent /'templates',
-)
-
-
-async def send_email(email: EmailStr, username: str, host: str):
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
-
-    return {"message": "email has been sent"}
+import logging
+import re
+from email.mime.text import MIMEText
+from email.utils import formataddr
+from pathlib import Path
+
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
+from markupsafe import Markup, escape
+from database.models import EmailJob
+from services.config import settings
+from services.auth import auth_service
+
+
+logger = logging.getLogger(__name__)
+
+
+conf = ConnectionConfig(
+    MAIL_USERNAME=settings.mail_username,
+    MAIL_PASSWORD=settings.mail_password,
+    MAIL_FROM=settings.mail_from,
+    MAIL_PORT=settings.mail_port,
+    MAIL_SERVER=settings.mail_server,
+    MAIL_FROM_NAME="ContactsBook",
+    MAIL_STARTTLS=False,
+    MAIL_SSL_TLS=True,
+    USE_CREDENTIALS=True,
+    VALIDATE_CERTS=True,
+    TEMPLATE_FOLDER=Path(__file__).parent /'templates',
+)
+
+# the connection to the SMTP server is broken or cannot be made: no message of the batch can be sent
+CONNECTION_ERRORS = (aiosmtplib.SMTPConnectError, aiosmtplib.SMTPTimeoutError, aiosmtplib.SMTPServerDisconnected,
+                     aiosmtplib.SMTPAuthenticationError, aiosmtplib.SMTPHeloError, OSError)
+
+
+class VerificationTemplate:
+    """
+    The verification email template, compiled once and pre-rendered per host.
+
+    For each host the template is rendered once with placeholders for the username and the token,
+    and split around them; a message is then the join of these pieces with the escaped values.
+    """
+    FIELDS = ("username", "token")
+    max_hosts = 64
+
+    def __init__(self, config: ConnectionConfig = conf, name: str = "email_template.html"):
+        self.template = config.template_engine().get_template(name)
+        self._pieces: dict[str, list[str]] = {}
+        self._placeholders = {field: Markup(f"\x00{field}\x00") for field in self.FIELDS}
+        self._split = re.compile("\x00(" + "|".join(self.FIELDS) + ")\x00")
+
+
+    def pieces(self, host: str) -> list[str]:
+        """
+        Returns the template pre-rendered for a host, split around the fields.
+
+        :param host: The base URL of the confirmation link.
+        :type host: str
+        :return: Literal text at even positions, field names at odd ones.
+        :rtype: list[str]
+        """
+        pieces = self._pieces.get(host)
+        if pieces is None:
+            if len(self._pieces) >= self.max_hosts:
+                self._pieces.clear()
+            pieces = self._pieces[host] = self._split.split(self.template.render(host=host, **self._placeholders))
+        return pieces
+
+
+    def render(self, host: str, username: str | None, token: str) -> str:
+        """
+        Renders the verification email, the same HTML as the Jinja template.
+
+        :param host: The base URL of the confirmation link.
+        :type host: str
+        :param username: The recipient's username.
+        :type username: str | None
+        :param token: The email confirmation token.
+        :type token: str
+        :return: The HTML body.
+        :rtype: str
+        """
+        values = {"username": escape(username), "token": escape(token)}
+        pieces = self.pieces(host)
+        return "".join(piece if i % 2 == 0 else values[piece] for i, piece in enumerate(pieces))
+
+
+class Mailer:
+    """
+    Sends verification emails over one SMTP connection, kept open between batches and reopened when it drops.
+    """
+
+    def __init__(self, config: ConnectionConfig = conf):
+        self.conf = config
+        self.template = VerificationTemplate(config)
+        self.sender = formataddr((self.conf.MAIL_FROM_NAME, self.conf.MAIL_FROM))
+        self.smtp: aiosmtplib.SMTP | None = None
+
+
+    async def connect(self) -> aiosmtplib.SMTP:
+        """
+        Returns the open SMTP connection, connecting and logging in if needed.
+
+        :return: The SMTP client.
+        :rtype: aiosmtplib.SMTP
+        """
+        if self.smtp is None or not self.smtp.is_connected:
+            smtp = aiosmtplib.SMTP(hostname=self.conf.MAIL_SERVER, port=self.conf.MAIL_PORT,
+                                   use_tls=self.conf.MAIL_SSL_TLS, start_tls=self.conf.MAIL_STARTTLS,
+                                   validate_certs=self.conf.VALIDATE_CERTS, timeout=self.conf.TIMEOUT,
+                                   local_hostname=self.conf.LOCAL_HOSTNAME, cert_bundle=self.conf.CERT_BUNDLE)
+            await smtp.connect()
+            if self.conf.USE_CREDENTIALS:
+                await smtp.login(self.conf.MAIL_USERNAME, self.conf.MAIL_PASSWORD.get_secret_value())
+            self.smtp = smtp
+        return self.smtp
+
+
+    async def close(self) -> None:
+        """
+        Closes the SMTP connection.
+        """
+        smtp, self.smtp = self.smtp, None
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                smtp.close()
+
+
+    async def message(self, job: EmailJob) -> MIMEText:
+        """
+        Builds the verification email of a job with a new confirmation token.
+
+        :param job: The queued job.
+        :type job: EmailJob
+        :return: The message.
+        :rtype: MIMEText
+        """
+        token_verification = await auth_service.create_email_token({"sub": job.email})
+        # the compat32 MIME classes, as in fastapi_mail: the header parsing of ``EmailMessage`` costs more than the rendering
+        message = MIMEText(self.template.render(job.host, job.username, token_verification), "html", "utf-8")
+        message["From"] = self.sender
+        message["To"] = job.email
+        message["Subject"] = "Confirm your email "
+        return message
+
+
+    async def send(self, message: MIMEText) -> None:
+        """
+        Sends a message, reconnecting once if the server has closed the idle connection.
+
+        :param message: The message.
+        :type message: MIMEText
+        """
+        smtp = await self.connect()
+        try:
+            await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            self.smtp = None
+            smtp = await self.connect()
+            await smtp.send_message(message)
+
+
+    async def send_batch(self, jobs: list[EmailJob]) -> dict[int, str]:
+        """
+        Sends the verification emails of the jobs over the pooled connection.
+
+        A message refused by the server fails alone; when the connection fails,
+        the rest of the batch fails with it and the connection is reopened by the next batch.
+
+        :param jobs: The claimed jobs.
+        :type jobs: list[EmailJob]
+        :return: The errors of the failed jobs by job ID, empty if all were sent.
+        :rtype: dict[int, str]
+        """
+        errors = {}
+        for i, job in enumerate(jobs):
+            try:
+                await self.send(await self.message(job))
+            except CONNECTION_ERRORS as e:
+                logger.warning("SMTP connection failed: %s", e)
+                await self.close()
+                errors.update((j.id, f"{type(e).__name__}: {e}") for j in jobs[i:])
+                break
+            except aiosmtplib.SMTPException as e:
+                errors[job.id] = f"{type(e).__name__}: {e}"
+        return errors
@@ -0,0 +1,31 @@
+import hashlib
+
+
+def make_etag(*parts) -> str:
+    """
+    Builds a strong entity tag from the values a response depends on.
+
+    :param parts: The values identifying the representation, e.g. user ID, contacts revision and query parameters.
+    :return: The quoted entity tag.
+    :rtype: str
+    """
+    return '"' + hashlib.sha256(repr(parts).encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Checks an ``If-None-Match`` header against the current entity tag.
+
+    :param if_none_match: The header value, a list of entity tags or ``*``.
+    :type if_none_match: str | None
+    :param etag: The current entity tag.
+    :type etag: str
+    :return: True if the client's copy is current and 304 can be returned.
+    :rtype: bool
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
@@ -0,0 +1,55 @@
+import logging
+from collections import OrderedDict
+
+from libgravatar import Gravatar, md5_hash, sanitize_email
+from services.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class GravatarResolver:
+    """
+    Resolves Gravatar image URLs, memoized by the email hash in a bounded LRU,
+    so addresses differing only by case or surrounding spaces share an entry.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._urls: OrderedDict[str, str] = OrderedDict()
+
+
+    def __call__(self, email: str) -> str | None:
+        """
+        Returns the Gravatar image URL of an email address.
+
+        :param email: The email address.
+        :type email: str
+        :return: The image URL, or None if it cannot be resolved.
+        :rtype: str | None
+        """
+        try:
+            key = md5_hash(sanitize_email(email))
+        except Exception as e:
+            logger.warning("Gravatar of %r failed: %s", email, e)
+            return None
+        url = self._urls.get(key)
+        if url is not None:
+            self._urls.move_to_end(key)
+            return url
+        try:
+            url = Gravatar(email).get_image()
+        except Exception as e:
+            logger.warning("Gravatar of %s failed: %s", key, e)
+            return None
+        self._urls[key] = url
+        if len(self._urls) > self.maxsize:
+            self._urls.popitem(last=False)
+        return url
+
+
+    def clear(self) -> None:
+        self._urls.clear()
+
+
+gravatar_url = GravatarResolver(settings.gravatar_cache_size)
@@ -0,0 +1,100 @@
+import hashlib
+import io
+from pathlib import Path
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+MEDIA_TYPE = "image/webp"
+EXTENSION = "webp"
+
+
+def check_image(path: Path, max_pixels: int) -> tuple[int, int]:
+    """
+    Validates an uploaded image by its header, without decoding the pixels.
+
+    :param path: The image file.
+    :type path: Path
+    :param max_pixels: The largest accepted width * height, guards against decompression bombs.
+    :type max_pixels: int
+    :return: The width and height.
+    :rtype: tuple[int, int]
+    :raises ValueError: If the file is not an image of a supported format or has too many pixels.
+    """
+    try:
+        with Image.open(path) as img:
+            fmt, (width, height) = img.format, img.size
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise ValueError("The file is not a supported image")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported image format {fmt}, expected one of {', '.join(sorted(FORMATS))}")
+    if width * height > max_pixels:
+        raise ValueError(f"The image is too large: {width}x{height} pixels")
+    return width, height
+
+
+def resize_variants(path: Path, sizes: list[int], quality: int = 85) -> dict[int, bytes]:
+    """
+    Decodes an image and encodes its square crops of the given sizes as WebP.
+
+    JPEG images are decoded at a reduced scale when the largest size allows it, every smaller size
+    is resized from the previous one. The EXIF orientation is applied, and EXIF and other metadata are dropped.
+
+    :param path: The image file, validated by ``check_image``.
+    :type path: Path
+    :param sizes: The widths of the square variants.
+    :type sizes: list[int]
+    :param quality: The WebP quality.
+    :type quality: int
+    :return: The encoded variants by size.
+    :rtype: dict[int, bytes]
+    """
+    sizes = sorted(set(sizes), reverse=True)
+    with Image.open(path) as img:
+        img.draft("RGB", (sizes[0], sizes[0]))
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    variants = {}
+    for size in sizes:
+        img = ImageOps.fit(img, (size, size), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        # method 1 encodes twice as fast as the default 4 for avatars of about the same size
+        img.save(buf, "WEBP", quality=quality, method=1)
+        variants[size] = buf.getvalue()
+    return variants
+
+
+def file_digest(path: Path) -> str:
+    """
+    Returns the SHA-256 hex digest of a file, read in chunks.
+
+    :param path: The file.
+    :type path: Path
+    :return: The digest.
+    :rtype: str
+    """
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def avatar_variants(path: Path, sizes: list[int], quality: int = 85) -> dict[int, tuple[str, bytes]]:
+    """
+    Builds the resized variants of an avatar with content-addressed names.
+
+    The names derive from the digest of the uploaded file, so the same image is stored once
+    and its URLs never change; ``ab/abcdef.../250.webp`` is the 250x250 variant.
+
+    :param path: The image file, validated by ``check_image``.
+    :type path: Path
+    :param sizes: The widths of the square variants.
+    :type sizes: list[int]
+    :param quality: The WebP quality.
+    :type quality: int
+    :return: The name and the encoded image by size.
+    :rtype: dict[int, tuple[str, bytes]]
+    """
+    digest = file_digest(path)[:32]
+    return {size: (f"{digest[:2]}/{digest}/{size}.{EXTENSION}", data)
+            for size, data in resize_variants(path, sizes, quality).items()}
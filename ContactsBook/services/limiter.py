@@ -0,0 +1,166 @@
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from math import ceil
+
+from fastapi import HTTPException, Request, Response, status
+from redis.exceptions import NoScriptError, RedisError
+
+from services.cache import RedisBacked
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """
+    In-process rate limiter backend for single-node deployments and tests.
+
+    Implements GCRA, a token bucket that keeps one timestamp per key: the theoretical arrival time (TAT)
+    of the next request. ``times`` requests can come at once, then one per ``period / times``.
+    """
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._tat: OrderedDict[str, int] = OrderedDict()
+
+
+    async def hit(self, key: str, times: int, period: int) -> int:
+        """
+        Registers a request.
+
+        :param key: The limited client and endpoint.
+        :type key: str
+        :param times: The number of requests allowed in the period.
+        :type times: int
+        :param period: The period in milliseconds.
+        :type period: int
+        :return: 0 if the request is allowed, otherwise the milliseconds until it will be.
+        :rtype: int
+        """
+        # integer milliseconds: with floats the first hit of ``times=1`` could come out a fraction of a millisecond late
+        now = time.monotonic_ns() // 1_000_000
+        interval = max(1, period // times)
+        tat = max(self._tat.get(key, now), now)
+        wait = tat + interval - period - now
+        if wait > 0:
+            return wait
+        self._tat[key] = tat + interval
+        self._tat.move_to_end(key)
+        while len(self._tat) > self.maxsize:
+            self._tat.popitem(last=False)    # the oldest key is the closest to a full bucket
+        return 0
+
+
+class RedisBackend(RedisBacked):
+    """
+    Rate limiter backend shared by all nodes, with the same GCRA as ``MemoryBackend`` in an atomic Lua script.
+
+    If Redis fails, the limits are checked in memory until it is retried.
+    """
+    prefix = "limiter:"
+    script = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local interval = math.max(1, math.floor(tonumber(ARGV[2]) / tonumber(ARGV[1])))
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local wait = tat + interval - tonumber(ARGV[2]) - now
+if wait > 0 then return wait end
+redis.call('SET', KEYS[1], string.format('%d', tat + interval), 'PX', tat + interval - now)
+return 0
+"""
+
+    def __init__(self, r=None):
+        super().__init__()
+        self.bind(r)
+        self.fallback = MemoryBackend()
+        self._sha = None
+
+
+    async def hit(self, key: str, times: int, period: int) -> int:
+        """
+        Registers a request.
+
+        :param key: The limited client and endpoint.
+        :type key: str
+        :param times: The number of requests allowed in the period.
+        :type times: int
+        :param period: The period in milliseconds.
+        :type period: int
+        :return: 0 if the request is allowed, otherwise the milliseconds until it will be.
+        :rtype: int
+        """
+        if not self._redis_ready():
+            return await self.fallback.hit(key, times, period)
+        try:
+            if self._sha is None:
+                self._sha = await self.r.script_load(self.script)
+            try:
+                return int(await self.r.evalsha(self._sha, 1, self.prefix + key, times, period))
+            except NoScriptError:
+                # the script cache was flushed, e.g. by a Redis restart
+                self._sha = await self.r.script_load(self.script)
+                return int(await self.r.evalsha(self._sha, 1, self.prefix + key, times, period))
+        except (RedisError, OSError) as e:
+            logger.warning("Rate limiter falls back to memory, Redis failed: %s", e)
+            self._redis_failed()
+            return await self.fallback.hit(key, times, period)
+
+
+class Limiter:
+    """
+    Holds the backend used by every ``RateLimiter``; the in-memory one until ``init`` is called.
+    """
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+
+
+    def init(self, backend) -> None:
+        """
+        Sets the rate limiter backend.
+
+        :param backend: ``MemoryBackend`` or ``RedisBackend``.
+        """
+        self.backend = backend
+
+
+limiter = Limiter()
+
+
+def client_identifier(request: Request) -> str:
+    """
+    Identifies the client of a request by its IP address, taking the proxy header into account.
+
+    :param request: The request.
+    :type request: Request
+    :return: The client IP address.
+    :rtype: str
+    """
+    forwarded = request.headers.get("X-Forwarded-For")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    """
+    Dependency limiting the requests of a client to an endpoint, e.g. ``Depends(RateLimiter(times=3, seconds=7))``.
+    """
+    _ids = itertools.count()
+
+    def __init__(self, times: int = 1, milliseconds: int = 0, seconds: int = 0, minutes: int = 0, hours: int = 0):
+        self.times = times
+        self.period = milliseconds + 1000 * seconds + 60_000 * minutes + 3_600_000 * hours
+        # tells apart the limiters of endpoints sharing a path, e.g. PUT and DELETE /contacts/{contact_id}
+        self.id = next(self._ids)
+
+
+    async def __call__(self, request: Request, response: Response):
+        key = f"{self.id}:{client_identifier(request)}:{request.scope['path']}"
+        wait = await limiter.backend.hit(key, self.times, self.period)
+        if wait:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers={"Retry-After": str(ceil(wait / 1000))})
@@ -2,16 +2,35 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import NullPool
 
 from main import app    # ???
 from database.models import Base
-from database.db import get_db
+from database.db import get_db, get_read_db, make_engine
+from services.cache import user_cache, response_cache, email_dedup
+from services.limiter import limiter, MemoryBackend
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient may run each request on its own event loop, so async connections are not pooled
+async_engine = make_engine(SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# no Redis server in the tests: the caches work without it, the cache tests bind fakeredis
+user_cache.bind(None)
+response_cache.bind(None)
+email_dedup.bind(None)
+
+
+@pytest.fixture(autouse=True)
+def rate_limits():
+    # every test starts with the full request budget of each endpoint
+    limiter.init(MemoryBackend())
+
 
 @pytest.fixture(scope="module")
 def session():
@@ -27,13 +46,12 @@ def session():
 
 @pytest.fixture(scope="module")
 def client(session):
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
 
     yield TestClient(app)
 
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import NullPool
+from database import db as db_module
+from database.db import make_engine, pool_options, ReadReplica, get_read_db
+from database.models import Base, User
+from services.config import settings
+
+
+class TestEngine(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.engine = make_engine(f"sqlite:///{self.path}")
+
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+
+    async def pragma(self, name: str):
+        async with self.engine.connect() as conn:
+            return (await conn.exec_driver_sql(f"PRAGMA {name}")).scalar()
+
+
+    async def test_sqlite_pragmas(self):
+        self.assertEqual(await self.pragma("journal_mode"), "wal")
+        self.assertEqual(await self.pragma("synchronous"), 1)    # NORMAL
+        self.assertEqual(await self.pragma("busy_timeout"), settings.sqlite_busy_timeout)
+        self.assertEqual(await self.pragma("cache_size"), -settings.sqlite_cache_size)
+
+
+    def test_pool_options(self):
+        self.assertEqual(self.engine.pool.size(), settings.db_pool_size)
+        self.assertEqual(pool_options("sqlite+aiosqlite://"), {})
+        self.assertEqual(pool_options("postgresql+asyncpg://u:p@localhost/db")["max_overflow"], settings.db_max_overflow)
+
+
+    async def test_sqlite_functions(self):
+        async with self.engine.connect() as conn:
+            similarity = (await conn.exec_driver_sql("SELECT word_similarity('jonatan', 'Jonathan Smith')")).scalar()
+        self.assertGreater(similarity, 0.3)
+
+
+    async def test_poolclass(self):
+        engine = make_engine(f"sqlite:///{self.path}", poolclass=NullPool)
+        self.assertIsInstance(engine.pool, NullPool)
+        async with engine.connect() as conn:
+            self.assertEqual((await conn.exec_driver_sql("SELECT word_similarity('smith', 'Smith')")).scalar(), 1.0)
+        await engine.dispose()
+
+
+class TestReadReplica(unittest.IsolatedAsyncioTestCase):
+    """
+    Emulates the replica with a read-only copy of the primary SQLite file.
+    """
+
+    async def asyncSetUp(self) -> None:
+        self.paths = []
+        primary = self.temp_path()
+        self.replica_path = self.temp_path()
+        self.primary = make_engine(f"sqlite:///{primary}")
+        async with self.primary.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(User), [{"email": "replicated@example.com"}])
+        await self.primary.dispose()
+        shutil.copy(primary, self.replica_path)
+        async with self.primary.begin() as conn:
+            await conn.execute(insert(User), [{"email": "not_replicated_yet@example.com"}])
+
+
+    async def asyncTearDown(self) -> None:
+        await self.primary.dispose()
+        for path in self.paths:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+
+    def temp_path(self) -> str:
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.paths.append(path)
+        return path
+
+
+    async def users(self, db) -> int:
+        return len((await db.execute(select(User))).scalars().all())
+
+
+    async def test_replica_session(self):
+        replica = ReadReplica(f"sqlite:///file:{self.replica_path}?mode=ro&uri=true")
+        db = await replica.session()
+        async with db:
+            self.assertEqual(await self.users(db), 1)
+        await replica.engine.dispose()
+
+
+    async def test_replica_unavailable(self):
+        os.remove(self.replica_path)
+        replica = ReadReplica(f"sqlite:///file:{self.replica_path}?mode=ro&uri=true")
+        self.assertIsNone(await replica.session())
+        with patch.object(replica, "sessionmaker") as sessionmaker:
+            self.assertIsNone(await replica.session())
+            sessionmaker.assert_not_called()    # backs off instead of reconnecting
+        await replica.engine.dispose()
+
+
+    async def test_get_read_db_fallback(self):
+        primary_session = async_sessionmaker(bind=self.primary)
+        with patch.object(db_module, "read_replica", ReadReplica(None)), patch.object(db_module, "DBSession", primary_session):
+            async for db in get_read_db():
+                self.assertEqual(await self.users(db), 2)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,35 +1,61 @@
+import base64
 import unittest
 from unittest.mock import MagicMock
 from datetime import date, timedelta
-from sqlalchemy.orm import Session
-from schemas import ContactBase
-from database.models import Contact, User
-from repository.contacts import (get_contacts, get_contact, create_contact, remove_contact, update_contact, soon_birthdays, get_contacts_by_first_name)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.pool import StaticPool
+from schemas import ContactBase, ContactPatch, ContactSelection, ContactFilter
+from database.db import make_engine
+from database.models import Base, Contact, User
+from repository.pagination import encode_cursor, decode_cursor, next_cursor
+from repository.contacts import (get_contacts, get_contact, create_contact, remove_contact, update_contact, soon_birthdays, get_contacts_by_first_name, search_contacts, import_contacts,
+                                 bulk_update_contacts, bulk_remove_contacts, sync_contacts)
 
 
 class TestContactsRepository(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.result = self.session.execute.return_value = MagicMock()
         self.user = User(id=1)
 
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().offset().limit().all.return_value = contacts
+        self.result.scalars().all.return_value = contacts
         result = await get_contacts(skip=0, limit=10, user=self.user, db=self.session)
         self.assertEqual(result, contacts)
 
 
+    async def test_get_contacts_cursor(self):
+        contacts = [Contact(id=11), Contact(id=12)]
+        self.result.scalars().all.return_value = contacts
+        result = await get_contacts(skip=0, limit=2, user=self.user, db=self.session, cursor=encode_cursor(10))
+        self.assertEqual(result, contacts)
+        self.assertEqual(decode_cursor(next_cursor(result, 2)), 12)
+
+
+    async def test_get_contacts_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            await get_contacts(skip=0, limit=10, user=self.user, db=self.session, cursor="not-a-cursor")
+
+
+    def test_decode_forged_cursor(self):
+        for data in (b'{"id": 1e400}', b'{"id": 1e30}', b'{"id": 9223372036854775808}', b'{"id": null}', b'[1]'):
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                decode_cursor(base64.urlsafe_b64encode(data).decode())
+        self.assertEqual(decode_cursor(encode_cursor(2 ** 63 - 1)), 2 ** 63 - 1)
+
+
     async def test_get_contact_found(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.result.scalar_one_or_none.return_value = contact
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result, contact)
         
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.result.scalar_one_or_none.return_value = None
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
@@ -54,13 +80,13 @@ class TestContactsRepository(unittest.IsolatedAsyncioTestCase):
 
     async def test_remove_contact(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.result.scalar_one_or_none.return_value = contact
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result, contact)
         
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.result.scalar_one_or_none.return_value = None
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
@@ -74,7 +100,7 @@ class TestContactsRepository(unittest.IsolatedAsyncioTestCase):
             inform='Some inform',
             email="first.last@example.com")
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.result.scalar_one_or_none.return_value = contact
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
         self.assertEqual(result, contact)
 
@@ -87,7 +113,7 @@ class TestContactsRepository(unittest.IsolatedAsyncioTestCase):
             birthday=date(year=1999, month=12, day=12),
             inform='Some inform',
             email="first.last@example.com")
-        self.session.query().filter().first.return_value = None
+        self.result.scalar_one_or_none.return_value = None
         self.session.commit.return_value = None
         result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
         self.assertIsNone(result)
@@ -95,42 +121,306 @@ class TestContactsRepository(unittest.IsolatedAsyncioTestCase):
 
     async def test_get_contacts_by_first_name(self):
         contacts = [Contact(), Contact(), Contact()]
-        db_query_mock = MagicMock()
-        db_query_mock.filter.return_value.all.return_value = contacts
-        self.session.query.return_value = db_query_mock
+        self.result.scalars.return_value.all.return_value = contacts
         result = await get_contacts_by_first_name(first_name="First", db=self.session, user=self.user)
         self.assertEqual(result, contacts)
 
 
     async def test_get_contacts_by_first_name_not_found(self):
-        db_query_mock = MagicMock()
-        db_query_mock.filter().all.return_value = None
-        self.session.query.return_value = db_query_mock
+        self.result.scalars().all.return_value = None
         result = await get_contacts_by_first_name(first_name="First", db=self.session, user=self.user)
         self.assertIsNone(result)
 
 
+
+
+
+class TestSoonBirthdays(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = make_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.user = User(id=1, email="test_mail@example.com")
+        self.session.add(self.user)
+        await self.session.commit()
+
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+
+    async def add_contacts(self, birthdays: list) -> list[Contact]:
+        contacts = [Contact(first_name="First", birthday=b, user_id=self.user.id) for b in birthdays]
+        self.session.add_all(contacts)
+        await self.session.commit()
+        return contacts
+
+
     async def test_soon_birthdays(self):
-        contacts = [Contact(birthday=date.today() + timedelta(days=3)), 
-                    Contact(birthday=date.today() + timedelta(days=5)), 
-                    Contact(birthday=date.today() + timedelta(days=7))]
-        db_query_mock = MagicMock()
-        db_query_mock.filter().all.return_value = contacts
-        self.session.query.return_value = db_query_mock
+        contacts = await self.add_contacts([date.today() + timedelta(days=3), 
+                                            date.today() + timedelta(days=5), 
+                                            date.today() + timedelta(days=7)])
         result = await soon_birthdays(days=12, db=self.session, user=self.user)
-        self.assertEqual(result, contacts)
+        self.assertEqual(sorted(c.id for c in result), [c.id for c in contacts])
+
 
     async def test_soon_birthdays_not_found(self):
-        contacts = [Contact(birthday=date.today() - timedelta(days=3)), 
-                    Contact(birthday=date.today() - timedelta(days=5)), 
-                    Contact(birthday=date.today() - timedelta(days=7))]
-        db_query_mock = MagicMock()
-        db_query_mock.filter().all.return_value = contacts
-        self.session.query.return_value = db_query_mock
+        await self.add_contacts([date.today() - timedelta(days=3), 
+                                 date.today() - timedelta(days=5), 
+                                 date.today() - timedelta(days=7)])
         result = await soon_birthdays(days=12, db=self.session, user=self.user)
         self.assertEqual(result, [])
 
 
+    async def test_soon_birthdays_new_year_wrap(self):
+        today = date.today()
+        contacts = await self.add_contacts([date(1990, 12, 31), date(1990, 1, 1)])
+        days = (date(today.year + 1, 1, 1) - today).days
+        result = await soon_birthdays(days=days, db=self.session, user=self.user)
+        self.assertEqual(sorted(c.id for c in result), [c.id for c in contacts])
+
+
+    async def test_soon_birthdays_null_and_leap_day(self):
+        contacts = await self.add_contacts([date(2000, 2, 29), None])
+        result = await soon_birthdays(days=365, db=self.session, user=self.user)
+        self.assertEqual([c.id for c in result], [contacts[0].id])
+        self.assertEqual(contacts[0].birthday_md, 229)
+
+
+
+class TestSearchContacts(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = make_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.user = User(id=1, email="test_mail@example.com")
+        self.session.add(self.user)
+        await self.session.commit()
+        self.jonathan = await create_contact(self.body("Jonathan", "Smith", "Met at the conference"), self.user, self.session)
+        self.natalie = await create_contact(self.body("Natalie", "Jonas", "Neighbour"), self.user, self.session)
+
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+
+    def body(self, first_name: str, last_name: str, inform: str) -> ContactBase:
+        return ContactBase(
+            first_name=first_name,
+            last_name=last_name,
+            phone="+380001234567",
+            birthday=date(year=1999, month=12, day=12),
+            inform=inform,
+            email=f"{first_name}.{last_name}@example.com".lower())
+
+
+    async def search(self, query: str) -> list[int]:
+        result = await search_contacts(query, skip=0, limit=10, db=self.session, user=self.user)
+        return [c.id for c in result]
+
+
+    async def test_search_prefix(self):
+        self.assertEqual(sorted(await self.search("Jon")), [self.jonathan.id, self.natalie.id])
+        self.assertEqual(await self.search("Jonath"), [self.jonathan.id])
+
+
+    async def test_search_substring(self):
+        self.assertEqual(await self.search("conference"), [self.jonathan.id])
+        self.assertEqual(await self.search("athan"), [self.jonathan.id])
+        self.assertEqual(await self.search("onfer"), [self.jonathan.id])
+        self.assertEqual(await self.search("mit"), [self.jonathan.id])
+
+
+    async def test_search_phone_fragment(self):
+        self.assertEqual(sorted(await self.search("1234")), [self.jonathan.id, self.natalie.id])
+
+
+    async def test_search_typo(self):
+        self.assertEqual((await self.search("Jonatan"))[0], self.jonathan.id)
+        self.assertEqual(await self.search("Smyth"), [self.jonathan.id])
+
+
+    async def test_search_short_prefix(self):
+        self.assertEqual(await self.search("na"), [self.natalie.id])
+
+
+    async def test_search_other_user(self):
+        result = await search_contacts("Jonathan", skip=0, limit=10, db=self.session, user=User(id=2))
+        self.assertEqual(result, [])
+
+
+    async def test_import_contacts(self):
+        async def batches():
+            yield [self.body("Imported", "One", "First batch")]
+            yield [self.body("Imported", "Two", "Second batch"), self.body("Imported", "Three", "Second batch")]
+        count = await import_contacts(batches(), self.user, self.session)
+        self.assertEqual(count, 3)
+        self.assertEqual(len(await self.search("second")), 2)
+        result = await soon_birthdays(days=365, db=self.session, user=self.user)
+        self.assertEqual(len(result), 5)
+
+
+    async def test_search_in_sync(self):
+        await update_contact(self.jonathan.id, self.body("Jonathan", "Doe", "Colleague"), self.user, self.session)
+        self.assertEqual(await self.search("colleague"), [self.jonathan.id])
+        self.assertEqual(await self.search("conference"), [])
+        await remove_contact(self.jonathan.id, self.user, self.session)
+        self.assertEqual(await self.search("colleague"), [])
+
+
+class TestBulkContacts(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = make_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.user = User(id=1, email="test_mail@example.com")
+        self.other = User(id=2, email="other_mail@example.com")
+        self.session.add_all([self.user, self.other])
+        await self.session.commit()
+        self.ids = [(await create_contact(self.body(f"First{i}", "Stale" if i % 2 else "Fresh"), self.user, self.session)).id
+                    for i in range(4)]
+        self.foreign = await create_contact(self.body("Foreign", "Stale"), self.other, self.session)
+
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+
+    def body(self, first_name: str, last_name: str) -> ContactBase:
+        return ContactBase(
+            first_name=first_name,
+            last_name=last_name,
+            phone="+380001234567",
+            birthday=date(year=1999, month=12, day=12),
+            inform="",
+            email=f"{first_name}@example.com".lower())
+
+
+    async def test_bulk_update_by_ids(self):
+        selection = ContactSelection(ids=self.ids[:2] + [self.foreign.id])
+        ids = await bulk_update_contacts(selection, ContactPatch(inform="Updated", birthday=date(2000, 1, 2)), self.user, self.session)
+        self.assertEqual(ids, self.ids[:2])
+        contact = await get_contact(self.ids[0], self.user, self.session)
+        await self.session.refresh(contact)
+        self.assertEqual((contact.inform, contact.birthday_md), ("Updated", 102))
+        self.assertEqual(contact.first_name, "First0")
+
+
+    async def test_bulk_update_by_filter(self):
+        selection = ContactSelection(filter=ContactFilter(last_name="Stale"))
+        ids = await bulk_update_contacts(selection, ContactPatch(last_name="Archived"), self.user, self.session)
+        self.assertEqual(ids, [self.ids[1], self.ids[3]])
+        self.assertEqual(len(await search_contacts("archived", skip=0, limit=10, db=self.session, user=self.user)), 2)
+        self.assertEqual(await search_contacts("stale", skip=0, limit=10, db=self.session, user=self.user), [])
+
+
+    async def test_bulk_remove(self):
+        selection = ContactSelection(ids=self.ids, filter=ContactFilter(last_name="Fresh"))
+        ids = await bulk_remove_contacts(selection, self.user, self.session)
+        self.assertEqual(ids, [self.ids[0], self.ids[2]])
+        result = await get_contacts(skip=0, limit=10, user=self.user, db=self.session)
+        self.assertEqual([c.id for c in result], [self.ids[1], self.ids[3]])
+        self.assertIsNotNone(await get_contact(self.foreign.id, self.other, self.session))
+
+
+    def test_empty_selection(self):
+        with self.assertRaises(ValueError):
+            ContactSelection(filter=ContactFilter())
+        with self.assertRaises(ValueError):
+            ContactPatch()
+
+
+
+class TestSyncContacts(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = make_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        self.user = User(id=1, email="test_mail@example.com")
+        self.session.add(self.user)
+        await self.session.commit()
+        self.ids = [(await create_contact(self.body(f"First{i}"), self.user, self.session)).id for i in range(3)]
+
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+
+    def body(self, first_name: str) -> ContactBase:
+        return ContactBase(
+            first_name=first_name,
+            last_name="Last",
+            phone="+380001234567",
+            birthday=date(year=1999, month=12, day=12),
+            inform="",
+            email=f"{first_name}@example.com".lower())
+
+
+    async def sync(self, since: int, limit: int = 10) -> tuple[list[int], list[int], int]:
+        upserts, deletions, cursor = [], [], None
+        while True:
+            page = await sync_contacts(since, limit, self.user, self.session, cursor)
+            upserts += [c.id for c in page["upserts"]]
+            deletions += page["deletions"]
+            cursor = page["cursor"]
+            if cursor is None:
+                return upserts, deletions, page["revision"]
+
+
+    async def test_initial_sync(self):
+        upserts, deletions, revision = await self.sync(0)
+        self.assertEqual(upserts, self.ids)
+        self.assertEqual(deletions, [])
+        self.assertEqual(revision, 3)
+
+
+    async def test_changes_since(self):
+        _, _, revision = await self.sync(0)
+        await update_contact(self.ids[0], self.body("Updated"), self.user, self.session)
+        await remove_contact(self.ids[1], self.user, self.session)
+        await bulk_remove_contacts(ContactSelection(ids=[self.ids[2]]), self.user, self.session)
+        upserts, deletions, revision = await self.sync(revision)
+        self.assertEqual(upserts, [self.ids[0]])
+        self.assertEqual(deletions, [self.ids[1], self.ids[2]])
+        self.assertEqual(await self.sync(revision), ([], [], revision))
+        self.assertEqual(await self.sync(revision - 1), ([], [self.ids[2]], revision))
+
+
+    async def test_paging(self):
+        await bulk_update_contacts(ContactSelection(ids=self.ids), ContactPatch(inform="Same revision"), self.user, self.session)
+        page = await sync_contacts(3, 2, self.user, self.session)
+        self.assertEqual([c.id for c in page["upserts"]], self.ids[:2])
+        self.assertIsNone(page["revision"])
+        # a deletion made while the client pages is returned on a later page
+        await remove_contact(self.ids[0], self.user, self.session)
+        page = await sync_contacts(3, 2, self.user, self.session, page["cursor"])
+        self.assertEqual([c.id for c in page["upserts"]], [self.ids[2]])
+        self.assertEqual(page["deletions"], [self.ids[0]])
+        self.assertEqual(page["revision"], 5)
+
+
+    async def test_updated_at(self):
+        contact = await get_contact(self.ids[0], self.user, self.session)
+        created = contact.updated_at
+        await bulk_update_contacts(ContactSelection(ids=[self.ids[0]]), ContactPatch(inform="Changed"), self.user, self.session)
+        await self.session.refresh(contact)
+        self.assertIsNotNone(created)
+        self.assertGreater(contact.updated_at, created)
+        self.assertEqual(contact.rev, 4)
+
+
 
 if __name__ == '__main__':
     unittest.main()
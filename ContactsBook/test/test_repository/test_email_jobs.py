@@ -0,0 +1,81 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+from database.models import Base, EmailJob
+from repository.email_jobs import (enqueue_email, claim_email_jobs, complete_email_jobs, retry_email_job, retry_delay,
+                                   email_queue_depth)
+
+
+class TestEmailJobs(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine, expire_on_commit=False)
+        for i in range(3):
+            await enqueue_email(f"user{i}@example.com", f"user{i}", "http://testserver/", self.session)
+
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+
+    async def test_claim(self):
+        jobs = await claim_email_jobs(2, 300, self.session)
+        self.assertEqual([job.email for job in jobs], ["user0@example.com", "user1@example.com"])
+        self.assertEqual([job.attempts for job in jobs], [1, 1])
+        self.assertGreater(jobs[0].run_at, datetime.now() + timedelta(seconds=290))
+        # the leased jobs are skipped by the next claim
+        jobs = await claim_email_jobs(2, 300, self.session)
+        self.assertEqual([job.email for job in jobs], ["user2@example.com"])
+        self.assertEqual(await claim_email_jobs(2, 300, self.session), [])
+
+
+    async def test_lease_expired(self):
+        await claim_email_jobs(3, 0, self.session)
+        jobs = await claim_email_jobs(3, 300, self.session)
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(jobs[0].attempts, 2)
+
+
+    async def test_complete(self):
+        jobs = await claim_email_jobs(3, 300, self.session)
+        await complete_email_jobs([jobs[0].id, jobs[1].id], self.session)
+        depth = await email_queue_depth(self.session)
+        self.assertEqual((depth["queued"], depth["due"]), (1, 0))
+
+
+    @patch("repository.email_jobs.settings.email_max_attempts", 2)
+    async def test_retry(self):
+        job = (await claim_email_jobs(1, 300, self.session))[0]
+        self.assertTrue(await retry_email_job(job, "SMTPDataError: refused", self.session))
+        await self.session.execute(update(EmailJob).values(run_at=datetime.now()))
+        job = (await claim_email_jobs(1, 300, self.session))[0]
+        self.assertEqual(job.attempts, 2)
+        self.assertFalse(await retry_email_job(job, "SMTPDataError: refused", self.session))
+        depth = await email_queue_depth(self.session)
+        self.assertEqual((depth["queued"], depth["retrying"], depth["failed"]), (2, 0, 1))
+        self.assertNotIn(job.id, [j.id for j in await claim_email_jobs(3, 300, self.session)])
+
+
+    @patch("repository.email_jobs.settings.email_retry_max_delay", 100)
+    def test_retry_delay(self):
+        with patch("repository.email_jobs.settings.email_retry_delay", 30):
+            self.assertEqual([retry_delay(n) for n in range(1, 5)], [30, 60, 100, 100])
+
+
+    async def test_depth(self):
+        depth = await email_queue_depth(self.session)
+        self.assertEqual({k: depth[k] for k in ("queued", "due", "retrying", "failed")},
+                         {"queued": 3, "due": 3, "retrying": 0, "failed": 0})
+        self.assertGreaterEqual(depth["oldest_age"], 0)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.pool import StaticPool
+from database.db import make_engine
+from database.models import Base, User
+from repository.contacts import get_contacts, get_contacts_by, search_contacts, soon_birthdays, sync_contacts
+
+
+class TestContactsQueryPlans(unittest.IsolatedAsyncioTestCase):
+    """
+    Checks with SQLite ``EXPLAIN QUERY PLAN`` that contact lookups are answered by an index, not a table scan.
+    """
+
+    async def asyncSetUp(self) -> None:
+        self.engine = make_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session = AsyncSession(self.engine)
+        self.user = User(id=1, email="test_mail@example.com")
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self.capture)
+
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.engine.dispose()
+
+
+    def capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            self.statements.append((statement, parameters))
+
+
+    async def query_plan(self, number: int = -1) -> str:
+        statement, parameters = self.statements[number]
+        async with self.engine.connect() as conn:
+            rows = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+            return "\n".join(row[-1] for row in rows)
+
+
+    async def assert_uses_index(self, index: str | None = None):
+        plan = await self.query_plan()
+        self.assertNotIn("SCAN contacts", plan)
+        if index:
+            self.assertIn(index, plan)
+
+
+    async def test_get_contacts_by_id(self):
+        await get_contacts_by("id", "1", self.session, self.user)
+        await self.assert_uses_index("INTEGER PRIMARY KEY")
+
+
+    async def test_get_contacts_by_first_name(self):
+        await get_contacts_by("first_name", "First", self.session, self.user)
+        await self.assert_uses_index("ix_contacts_user_id_first_name")
+
+
+    async def test_get_contacts_by_last_name(self):
+        await get_contacts_by("last_name", "Last", self.session, self.user)
+        await self.assert_uses_index("ix_contacts_user_id_last_name")
+
+
+    async def test_get_contacts_by_email(self):
+        await get_contacts_by("email", "first.last@example.com", self.session, self.user)
+        await self.assert_uses_index("ix_contacts_user_id_email")
+
+
+    async def test_get_contacts(self):
+        await get_contacts(skip=0, limit=10, user=self.user, db=self.session)
+        await self.assert_uses_index()
+        self.assertNotIn("TEMP B-TREE", await self.query_plan())
+
+
+    async def test_soon_birthdays(self):
+        await soon_birthdays(days=7, db=self.session, user=self.user)
+        await self.assert_uses_index("ix_contacts_user_id_birthday_md")
+
+
+    async def test_search_contacts(self):
+        # nothing is found, so the typo fallback runs after the trigram search
+        await search_contacts("Smyth", skip=0, limit=10, db=self.session, user=self.user)
+        plan = await self.query_plan(-2)
+        # the MATCH runs once in its own CTE, not once per contact of the user
+        self.assertIn("MATERIALIZE hits\nSCAN contacts_fts VIRTUAL TABLE", plan)
+        self.assertEqual(plan.count("contacts_fts"), 1)
+        self.assertIn("SEARCH contacts USING INTEGER PRIMARY KEY", plan)
+        self.assertNotIn("SCAN contacts\n", plan + "\n")
+        plan = await self.query_plan()
+        self.assertIn("MATERIALIZE typos", plan)
+        await self.assert_uses_index("ix_contacts_user_id")
+
+
+    async def test_sync_contacts(self):
+        await sync_contacts(since=5, limit=100, user=self.user, db=self.session)
+        plan = await self.query_plan()
+        self.assertIn("ix_contacts_user_id_rev", plan)
+        self.assertIn("ix_contact_tombstones_user_id_rev", plan)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,26 +1,29 @@
 import unittest
 from unittest.mock import MagicMock
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
 from schemas import UserCreate
-from database.models import User
-from repository.users import (get_user_by_email, create_user, remove_user, update_token, verify_email, patch_avatar)
+from database.models import Base, User
+from repository.users import (get_user_by_email, create_user, remove_user, update_token, update_password, verify_email, patch_avatar,
+                              set_avatar_status)
 
 
 class TestUsersRepository(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self) -> None:
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.result = self.session.execute.return_value = MagicMock()
 
 
     async def test_get_user_by_email(self):
         user = User()
-        self.session.query().filter().first.return_value = user
+        self.result.scalar_one_or_none.return_value = user
         result = await get_user_by_email(email="test_mail@example.com", db=self.session)
         self.assertEqual(result, user)
 
 
     async def test_get_user_by_email_none(self):
-        self.session.query().filter().first.return_value = None
+        self.result.scalar_one_or_none.return_value = None
         result = await get_user_by_email(email="non_existent_mail@example.com", db=self.session)
         self.assertIsNone(result)
 
@@ -29,11 +32,12 @@ class TestUsersRepository(unittest.IsolatedAsyncioTestCase):
         body = UserCreate(username="fake_user", email="test@example.com", password="password123")
         result = await create_user(body=body, db=self.session)
         self.assertEqual(result.email, body.email)
+        self.assertIsNone(result.avatar)
     
     
     async def test_remove_user(self):
         user = User(id=1, email="test_mail@example.com")
-        self.session.query().filter().first.return_value = user
+        self.result.scalar_one_or_none.return_value = user
         result = await remove_user(user_id=user.id, db=self.session)
         self.assertEqual(result, user)
 
@@ -41,14 +45,22 @@ class TestUsersRepository(unittest.IsolatedAsyncioTestCase):
     async def test_update_token(self):
         reftoken = "new_refresh_token"
         user = User(id=1, email="test_mail@example.com")
-        self.session.query().filter().first.return_value = user
+        self.result.scalar_one_or_none.return_value = user
         await update_token(user=user, token=reftoken, db=self.session)
         self.assertEqual(user.refresh, reftoken)
 
 
+    async def test_update_password(self):
+        new_hash = "$2b$12$new_password_hash"
+        user = User(id=1, email="test_mail@example.com", password="$2b$10$old_password_hash")
+        await update_password(user=user, password=new_hash, db=self.session)
+        self.assertEqual(user.password, new_hash)
+        self.session.commit.assert_awaited_once()
+
+
     async def test_verify_email(self):
         user = User(id=1, email="test_mail@example.com", verified=True)
-        self.session.query().filter().first.return_value = user
+        self.result.scalar_one_or_none.return_value = user
         await verify_email(email="test_mail@example.com", db=self.session)
         self.assertTrue(user.verified)
 
@@ -56,11 +68,43 @@ class TestUsersRepository(unittest.IsolatedAsyncioTestCase):
     async def test_patch_avatar(self):
         avatar_url = "https://fake.com/avatar.png"
         user = User(id=1, email="test_mail@example.com", avatar=avatar_url)
-        self.session.query().filter().first.return_value = user
+        self.result.scalar_one_or_none.return_value = user
         result = await patch_avatar(user=user, avatar=avatar_url, db=self.session)
         self.assertEqual(result, user)
 
 
 
+
+class TestAvatarColumns(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.session_maker() as db:
+            # a copy of the user as the users cache keeps it
+            self.cached = User(email="cached@example.com", password="old", refresh="old", verified=False)
+            db.add(self.cached)
+            await db.commit()
+            db.expunge(self.cached)
+            await update_token(await get_user_by_email("cached@example.com", db), "new", db)
+
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+
+
+    async def test_stale_user(self):
+        async with self.session_maker() as db:
+            user = await set_avatar_status(self.cached, "pending", db)
+            self.assertEqual((user.avatar_status, user.refresh), ("pending", "new"))
+            user = await patch_avatar(self.cached, "http://cdn/avatar.webp", db, variants={"250": "http://cdn/avatar.webp"})
+        async with self.session_maker() as db:
+            user = await db.get(User, self.cached.id)
+        self.assertEqual((user.avatar, user.avatar_status, user.refresh), ("http://cdn/avatar.webp", None, "new"))
+
+
+
 if __name__ == '__main__':
     unittest.main()
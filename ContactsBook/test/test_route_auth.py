@@ -1,16 +1,23 @@
+import asyncio
 import pytest
-from unittest.mock import MagicMock
-from database.models import User
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, call, patch
+from passlib.hash import bcrypt
+from sqlalchemy.exc import OperationalError
+from database.models import User, EmailJob
+from services.cache import email_dedup, user_cache
+from services.config import settings
+from services.limiter import limiter, MemoryBackend
 
 
-def test_signup_user(client, user, monkeypatch):
-    mock_send_email = MagicMock()
-    monkeypatch.setattr("services.email.send_email", mock_send_email)
+def test_signup_user(client, user, session):
     response = client.post("/auth/signup", json=user)
     assert response.status_code == 201, response.text
     data = response.json()
     assert data["user"]["email"] == user.get("email")
     assert "id" in data["user"]
+    job = session.query(EmailJob).filter(EmailJob.email == user.get("email")).one()
+    assert job.host == "http://testserver/"
 
 
 def test_signup_user_twice(client, user):
@@ -20,6 +27,32 @@ def test_signup_user_twice(client, user):
     assert data["detail"] == "Account already exists"
 
 
+def test_request_email_coalesced(client, user, session):
+    # the window of the signup email has passed, then a retrying client sends 100 concurrent requests
+    email_dedup.clear()
+    session.query(EmailJob).delete()
+    session.commit()
+    suppressed = email_dedup.stats()["suppressed_local"]
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        responses = list(pool.map(lambda _: client.post("/auth/request_email", json={"email": user.get("email")}), range(100)))
+    assert all(response.status_code == 200 for response in responses)
+    assert session.query(EmailJob).filter(EmailJob.email == user.get("email")).count() == 1
+    assert email_dedup.stats()["suppressed_local"] - suppressed == 99
+
+
+def test_request_email_enqueue_failed(client, user, session):
+    # a failed enqueue releases the claim, so the retry queues the email instead of reusing the lost one
+    email_dedup.clear()
+    session.query(EmailJob).delete()
+    session.commit()
+    with patch("routes.auth.repository_email_jobs.enqueue_email", side_effect=OperationalError("INSERT", {}, Exception("database is locked"))):
+        with pytest.raises(OperationalError):
+            client.post("/auth/request_email", json={"email": user.get("email")})
+    response = client.post("/auth/request_email", json={"email": user.get("email")})
+    assert response.status_code == 200, response.text
+    assert session.query(EmailJob).filter(EmailJob.email == user.get("email")).count() == 1
+
+
 def test_login_user_not_confirmed(client, user, session):
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.verified = False
@@ -53,5 +86,27 @@ def test_login_wrong_email(client, user):
     assert data["detail"] == "Invalid email"
 
 
+def test_login_rehashes_legacy_password(client, user, session):
+    current_user: User = session.query(User).filter(User.email == user.get("email")).first()
+    current_user.verified = True
+    current_user.password = bcrypt.using(rounds=4).hash(user.get("password"))
+    session.commit()
+    asyncio.run(user_cache.set(current_user))
+    with patch("repository.users.user_cache.invalidate", AsyncMock(wraps=user_cache.invalidate)) as invalidate:
+        response = client.post("/auth/login", data={"username": user.get("email"), "password": user.get("password")})
+    assert response.status_code == 200, response.text
+    session.refresh(current_user)
+    assert current_user.password.startswith(f"$2b${settings.bcrypt_rounds:02d}$")
+    assert bcrypt.verify(user.get("password"), current_user.password)
+    # once for the new hash, once for the new refresh token
+    assert invalidate.await_args_list == [call(user.get("email"))] * 2
+    assert user.get("email") not in user_cache._local
+    # the upgraded hash is kept on the next login
+    limiter.init(MemoryBackend())
+    with patch("routes.auth.repository_users.update_password") as update_password:
+        assert client.post("/auth/login", data={"username": user.get("email"), "password": user.get("password")}).status_code == 200
+    update_password.assert_not_called()
+
+
 if __name__ == "__main__":
     pytest.main(["-v", "test_route_auth.py"])
@@ -0,0 +1,332 @@
+import sqlite3
+import pytest
+from unittest.mock import patch
+from fakeredis import FakeAsyncRedis
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import NullPool
+from main import app
+from database.db import get_db, get_read_db, make_engine
+from database.models import Contact, User
+from services.auth import auth_service
+from services.cache import response_cache
+from services.limiter import limiter, MemoryBackend
+
+
+CONTACT = {"first_name": "First", "last_name": "Last", "phone": "+380001234567",
+           "birthday": "1999-12-12T00:00:00", "inform": "", "email": "first.last@example.com"}
+
+
+@pytest.fixture(scope="module")
+def current_user(client, session):
+    user = User(email="contacts@example.com", password="passw", username="contacts", verified=True)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    app.dependency_overrides[auth_service.get_current_user] = lambda: user
+    yield user
+    del app.dependency_overrides[auth_service.get_current_user]
+
+
+@pytest.fixture()
+def cache():
+    response_cache.bind(FakeAsyncRedis())
+    response_cache.hits = response_cache.misses = 0
+    yield response_cache
+    response_cache.bind(None)
+
+
+def test_read_contacts_cached(client, current_user, cache):
+    response = client.post("/contacts/", json=CONTACT)
+    assert response.status_code == 201, response.text
+    first = client.get("/contacts/")
+    second = client.get("/contacts/")
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert [c["first_name"] for c in second.json()] == ["First"]
+    assert cache.stats()["hits"] == 1
+
+
+def test_write_invalidates(client, current_user, cache):
+    assert len(client.get("/contacts/").json()) == 1
+    contact_id = client.post("/contacts/", json={**CONTACT, "first_name": "Second"}).json()["id"]
+    assert len(client.get("/contacts/").json()) == 2
+    assert client.get(f"/contacts/{contact_id}").json()["first_name"] == "Second"
+    client.put(f"/contacts/{contact_id}", json={**CONTACT, "first_name": "Updated"})
+    assert client.get(f"/contacts/{contact_id}").json()["first_name"] == "Updated"
+    client.delete(f"/contacts/{contact_id}")
+    assert client.get(f"/contacts/{contact_id}").status_code == 404
+    assert cache.stats()["hits"] == 0
+
+
+def test_cache_keyed_by_revision(client, current_user, session, cache):
+    first = client.get("/contacts/")
+    # a write the cache was not told about, e.g. seen by this request before the writer's cache update
+    rev = session.execute(update(User).filter(User.id == current_user.id)
+                          .values(contacts_rev=User.contacts_rev + 1).returning(User.contacts_rev)).scalar_one()
+    session.execute(update(Contact).filter(Contact.id == first.json()[0]["id"]).values(inform="Direct", rev=rev))
+    session.commit()
+    second = client.get("/contacts/", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.json()[0]["inform"] == "Direct"
+    assert cache.stats()["hits"] == 0
+
+
+def test_cache_lagging_replica(client, current_user, cache, tmp_path):
+    replica = tmp_path / "replica.db"
+    with sqlite3.connect("test.db") as primary, sqlite3.connect(replica) as copy:
+        primary.backup(copy)
+    contact = client.get("/contacts/").json()[0]
+    client.put(f"/contacts/{contact['id']}", json={**CONTACT, "inform": "After the copy"})
+    engine = make_engine(f"sqlite:///{replica}", poolclass=NullPool)
+
+    async def replica_db():
+        async with async_sessionmaker(engine)() as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = replica_db
+    try:
+        assert client.get("/contacts/").json()[0]["inform"] == contact["inform"]
+    finally:
+        app.dependency_overrides[get_read_db] = app.dependency_overrides[get_db]
+    # the replica hit the entry of the revision it had, the primary's revision has its own
+    assert client.get("/contacts/").json()[0]["inform"] == "After the copy"
+    assert cache.stats()["hits"] == 1
+
+
+def test_find_exact_without_field(client, current_user):
+    response = client.get("/contacts/find", params={"value": "First"})
+    assert response.status_code == 422, response.text
+    assert response.json()["detail"] == "field is required in exact mode"
+    assert client.get("/contacts/find", params={"value": "First", "mode": "search"}).status_code == 200
+
+
+def test_cache_keys_by_params(client, current_user, cache):
+    assert client.get("/contacts/find", params={"field": "first_name", "value": "First"}).json()[0]["first_name"] == "First"
+    assert client.get("/contacts/find", params={"field": "first_name", "value": "Other"}).json() == []
+    assert client.get("/contacts/birthdays", params={"days": 365}).json()[0]["first_name"] == "First"
+    assert cache.stats()["misses"] == 3
+
+
+def test_read_contacts_without_redis(client, current_user):
+    misses = response_cache.misses
+    assert len(client.get("/contacts/").json()) == 1
+    assert response_cache.misses == misses + 1
+
+
+def test_read_contacts_not_modified(client, current_user):
+    response = client.get("/contacts/")
+    etag = response.headers["ETag"]
+    response = client.get("/contacts/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/contacts/", params={"limit": 1}, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_etag_changes_on_write(client, current_user):
+    contact_id = client.get("/contacts/").json()[0]["id"]
+    etag = client.get(f"/contacts/{contact_id}").headers["ETag"]
+    assert client.get(f"/contacts/{contact_id}", headers={"If-None-Match": f'W/"other", {etag}'}).status_code == 304
+    client.put(f"/contacts/{contact_id}", json={**CONTACT, "inform": "Changed"})
+    response = client.get(f"/contacts/{contact_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["inform"] == "Changed"
+    assert response.headers["ETag"] != etag
+
+
+def test_sync(client, current_user):
+    data = client.get("/contacts/sync").json()
+    assert [c["first_name"] for c in data["upserts"]] == ["First"]
+    assert data["upserts"][0]["rev"] > 0
+    contact_id = client.post("/contacts/", json={**CONTACT, "first_name": "Synced"}).json()["id"]
+    client.delete(f"/contacts/{contact_id}")
+    changes = client.get("/contacts/sync", params={"since": data["revision"]}).json()
+    assert changes["upserts"] == [] and changes["deletions"] == [contact_id]
+    assert client.get("/contacts/sync", params={"cursor": "bad"}).status_code == 400
+
+
+@pytest.mark.parametrize("cursor", ["eyJpZCI6IDFlNDAwfQ", "eyJpZCI6IDFlMzB9"])    # {"id": 1e400}, {"id": 1e30}
+def test_forged_cursor(client, current_user, cursor):
+    response = client.get("/contacts/", params={"cursor": cursor})
+    assert response.status_code == 400, response.text
+
+
+@pytest.mark.parametrize("url, params", [("/contacts/", {"limit": 1}), ("/contacts/find", {"field": "first_name", "value": "First"}),
+                                         ("/contacts/find", {"mode": "search", "value": "first"}), ("/contacts/birthdays", {"days": 365})])
+def test_json_fast_path(client, current_user, url, params):
+    expected = client.get(url, params=params)
+    with patch("routes.contacts.settings.json_fast_path", True):
+        response = client.get(url, params=params)
+    assert response.status_code == expected.status_code == 200
+    assert response.content == expected.content
+    assert response.headers.get("X-Next-Cursor") == expected.headers.get("X-Next-Cursor")
+
+
+def test_sparse_fields(client, current_user, cache):
+    contact = client.post("/contacts/", json={**CONTACT, "first_name": "Sparse"}).json()
+    contacts = client.get("/contacts/", params={"fields": "phone, first_name"}).json()
+    assert {"first_name": "Sparse", "phone": CONTACT["phone"], "id": contact["id"]} in contacts
+    assert all(c.keys() == {"first_name", "phone", "id"} for c in contacts)
+    found = client.get("/contacts/find", params={"field": "first_name", "value": "Sparse", "fields": "inform"}).json()
+    assert found == [{"inform": "", "id": contact["id"]}]
+    birthdays = client.get("/contacts/birthdays", params={"days": 365, "fields": "first_name,birthday"}).json()
+    assert {"first_name": "Sparse", "birthday": CONTACT["birthday"]} in birthdays
+    # a different fieldset is a different cache entry
+    assert client.get("/contacts/").json()[-1] == contact
+    assert cache.stats()["hits"] == 0
+    client.delete(f"/contacts/{contact['id']}")
+
+
+@pytest.mark.parametrize("url, params", [("/contacts/", {}), ("/contacts/find", {"field": "first_name", "value": "First"}), ("/contacts/birthdays", {})])
+@pytest.mark.parametrize("fields", ["password", "first_name,user", ","])
+def test_sparse_fields_invalid(client, current_user, url, params, fields):
+    response = client.get(url, params={**params, "fields": fields})
+    assert response.status_code == 422, response.text
+    assert response.json()["detail"][0]["loc"] == ["query", "fields"]
+
+
+def test_sparse_fields_birthdays_schema(client, current_user):
+    assert client.get("/contacts/birthdays", params={"fields": "id"}).status_code == 422
+
+
+IMPORT_CSV = ("first_name,last_name,phone,birthday,inform,email\n"
+              "Imported,One,+380001112233,1990-01-01,\"Met, at work\",one@example.com\n"
+              "Broken,Row,+3800011122334455,not-a-date,,broken@example.com\n"
+              "Imported,Two,+380001112244,1991-02-02,,two@example.com\n")
+
+
+def test_import_csv(client, current_user, session):
+    response = client.post("/contacts/import", files={"file": ("contacts.csv", IMPORT_CSV.encode(), "text/csv")})
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["imported"], report["failed"]) == (2, 1)
+    assert report["errors"][0]["row"] == 2
+    assert [error.split(":")[0] for error in report["errors"][0]["errors"]] == ["phone", "birthday"]
+    imported = session.query(Contact).filter(Contact.first_name == "Imported").order_by(Contact.id).all()
+    assert [(c.last_name, c.inform, c.user_id) for c in imported] == [("One", "Met, at work", current_user.id), ("Two", "", current_user.id)]
+    session.query(Contact).filter(Contact.first_name == "Imported").delete()
+    session.commit()
+
+
+def test_import_format_parameter(client, current_user, session):
+    rows = '{"first_name": "Jsonl", "last_name": "Row", "phone": "+380001112255", "birthday": "1992-03-03", "inform": "", "email": "j@example.com"}\n[]\n'
+    response = client.post("/contacts/import", params={"format": "jsonl"}, files={"file": ("upload", rows.encode(), "application/octet-stream")})
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["imported"], report["failed"], report["errors"][0]["row"]) == (1, 1, 2)
+    assert session.query(Contact).filter(Contact.first_name == "Jsonl", Contact.user_id == current_user.id).delete() == 1
+    session.commit()
+
+
+def test_import_unknown_format(client, current_user):
+    response = client.post("/contacts/import", files={"file": ("contacts.txt", IMPORT_CSV.encode(), "text/plain")})
+    assert response.status_code == 400, response.text
+
+
+@pytest.fixture(scope="module")
+def stranger(session):
+    user = User(email="stranger@example.com", password="passw", username="stranger", verified=True)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
+
+
+@pytest.fixture()
+def stranger_contact(session, stranger):
+    contact = Contact(first_name="Exported", last_name="Stranger", phone="+380009998877", email="stranger@example.com", inform="", user_id=stranger.id)
+    session.add(contact)
+    session.commit()
+    yield contact
+    session.delete(contact)
+    session.commit()
+
+
+@pytest.mark.parametrize("fmt, media_type, filename, expected", [
+    ("csv", "text/csv", "contacts.csv", "Exported,Contact,+380001234567,1999-12-12,\"Line one, two\",first.last@example.com\n"),
+    ("jsonl", "application/x-ndjson", "contacts.jsonl", '"first_name": "Exported", "last_name": "Contact", "phone": "+380001234567", "birthday": "1999-12-12"'),
+    ("vcard", "text/vcard", "contacts.vcf", "N:Contact;Exported;;;\r\nFN:Exported Contact\r\nEMAIL;TYPE=INTERNET:first.last@example.com\r\n"),
+])
+def test_export(client, current_user, stranger_contact, fmt, media_type, filename, expected):
+    contact = client.post("/contacts/", json={**CONTACT, "first_name": "Exported", "last_name": "Contact", "inform": "Line one, two"}).json()
+    response = client.get("/contacts/export", params={"format": fmt})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith(media_type)
+    assert response.headers["content-disposition"] == f'attachment; filename="{filename}"'
+    assert "content-length" not in response.headers     # streamed, the size is not known up front
+    assert expected in response.text
+    assert "Stranger" not in response.text
+    client.delete(f"/contacts/{contact['id']}")
+
+
+def test_export_chunks(client, current_user):
+    expected = client.get("/contacts/export", params={"format": "jsonl"}).content
+    limiter.init(MemoryBackend())
+    # every row is a chunk of its own
+    with patch("services.contacts_io.CHUNK_SIZE", 1):
+        response = client.get("/contacts/export", params={"format": "jsonl"})
+    assert response.content == expected
+    assert len(response.text.splitlines()) == len(client.get("/contacts/", params={"limit": 1000}).json())
+
+
+def test_export_rate_limited(client, current_user):
+    assert client.get("/contacts/export").status_code == 200
+    assert client.get("/contacts/export").status_code == 429
+
+
+@pytest.fixture()
+def bulk_contacts(client, session, stranger):
+    ids = [client.post("/contacts/", json={**CONTACT, "first_name": "Bulk", "last_name": f"Bulk{i}"}).json()["id"] for i in range(2)]
+    other = Contact(first_name="Bulk", last_name="Stranger", phone="+380009998877", email="stranger@example.com", inform="", user_id=stranger.id)
+    session.add(other)
+    session.commit()
+    limiter.init(MemoryBackend())
+    yield ids, other
+    session.query(Contact).filter(Contact.first_name.in_(["Bulk", "Renamed"])).delete()
+    session.commit()
+
+
+def test_bulk_update_ids(client, current_user, session, bulk_contacts):
+    ids, other = bulk_contacts
+    response = client.post("/contacts/bulk-update", json={"ids": ids + [other.id], "values": {"inform": "Bulk updated"}})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"count": 2, "ids": ids}
+    assert all(client.get(f"/contacts/{contact_id}").json()["inform"] == "Bulk updated" for contact_id in ids)
+    session.refresh(other)
+    assert other.inform == ""
+
+
+def test_bulk_update_filter(client, current_user, session, bulk_contacts):
+    ids, other = bulk_contacts
+    response = client.post("/contacts/bulk-update", json={"filter": {"first_name": "Bulk"}, "values": {"first_name": "Renamed"}})
+    assert response.status_code == 200, response.text
+    assert sorted(response.json()["ids"]) == ids
+    assert [c["id"] for c in client.get("/contacts/find", params={"field": "first_name", "value": "Renamed"}).json()] == ids
+    session.refresh(other)
+    assert other.first_name == "Bulk"
+
+
+def test_bulk_delete(client, current_user, session, bulk_contacts):
+    ids, other = bulk_contacts
+    response = client.post("/contacts/bulk-delete", json={"filter": {"first_name": "Bulk"}})
+    assert response.status_code == 200, response.text
+    assert sorted(response.json()["ids"]) == ids
+    assert all(client.get(f"/contacts/{contact_id}").status_code == 404 for contact_id in ids)
+    assert client.post("/contacts/bulk-delete", json={"ids": [other.id]}).json() == {"count": 0, "ids": []}
+    assert session.query(Contact).filter(Contact.id == other.id).count() == 1
+
+
+@pytest.mark.parametrize("url, body", [("/contacts/bulk-delete", {}), ("/contacts/bulk-delete", {"filter": {}}),
+                                       ("/contacts/bulk-delete", {"filter": {"first_name": None}}),
+                                       ("/contacts/bulk-update", {"values": {"inform": "All"}}),
+                                       ("/contacts/bulk-update", {"ids": [1], "values": {}})])
+def test_bulk_empty_selection(client, current_user, url, body):
+    count = len(client.get("/contacts/", params={"limit": 1000}).json())
+    response = client.post(url, json=body)
+    assert response.status_code == 422, response.text
+    assert len(client.get("/contacts/", params={"limit": 1000}).json()) == count
+
+
+if __name__ == "__main__":
+    pytest.main(["-v", "test_route_contacts.py"])
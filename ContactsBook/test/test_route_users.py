@@ -0,0 +1,64 @@
+import io
+import pytest
+from unittest.mock import patch
+from PIL import Image
+from main import app
+from database.models import User
+from services.auth import auth_service
+from services.avatars import avatar_uploader, LocalStorage
+from conftest import AsyncTestingSessionLocal
+
+
+@pytest.fixture(scope="module")
+def current_user(client, session):
+    user = User(email="avatar@example.com", password="passw", username="avatar", verified=True)
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    app.dependency_overrides[auth_service.get_current_user] = lambda: user
+    yield user
+    del app.dependency_overrides[auth_service.get_current_user]
+
+
+@pytest.fixture()
+def storage(tmp_path):
+    storage, session_maker = avatar_uploader.storage, avatar_uploader.session_maker
+    avatar_uploader.storage = LocalStorage(tmp_path, "/media/avatars")
+    avatar_uploader.session_maker = AsyncTestingSessionLocal
+    yield tmp_path
+    avatar_uploader.storage, avatar_uploader.session_maker = storage, session_maker
+
+
+def test_patch_avatar(client, current_user, session, storage):
+    image = io.BytesIO()
+    Image.new("RGB", (600, 400), "red").save(image, "JPEG")
+    response = client.patch("/users/avatar", files={"file": ("avatar.jpg", image.getvalue(), "image/jpeg")})
+    assert response.status_code == 202, response.text
+    assert response.json()["avatar_status"] == "pending"
+    # TestClient returns after the background tasks, so the upload has finished
+    session.refresh(current_user)
+    assert current_user.avatar_status is None
+    assert current_user.avatar == current_user.avatar_variants["250"]
+    assert sorted(current_user.avatar_variants, key=int) == ["64", "128", "250", "512"]
+    with Image.open(storage / current_user.avatar.removeprefix("/media/avatars/")) as img:
+        assert img.size == (250, 250)
+
+
+def test_patch_avatar_not_image(client, current_user, storage):
+    response = client.patch("/users/avatar", files={"file": ("avatar.png", b"image", "image/png")})
+    assert response.status_code == 400, response.text
+    assert response.json()["detail"] == "The file is not a supported image"
+
+
+def test_patch_avatar_too_large(client, current_user, storage):
+    response = client.patch("/users/avatar", files={"file": ("avatar.png", b"x" * (6 * 1024 * 1024), "image/png")})
+    assert response.status_code == 413, response.text
+
+
+def test_read_users_json_fast_path(client, current_user):
+    expected = client.get("/users/", params={"limit": 1})
+    with patch("routes.users.settings.json_fast_path", True):
+        response = client.get("/users/", params={"limit": 1})
+    assert response.status_code == expected.status_code == 200
+    assert response.content == expected.content
+    assert response.headers["X-Next-Cursor"] == expected.headers["X-Next-Cursor"]
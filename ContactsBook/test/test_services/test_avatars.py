@@ -0,0 +1,121 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from database.models import Base, User
+from PIL import Image
+from services.avatars import AvatarUploader, LocalStorage, CloudinaryStorage, copy_limited
+
+
+class TestLocalStorage(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.root = Path(self.dir.name)
+        self.storage = LocalStorage(self.root, "/media/avatars/")
+
+
+    async def test_save(self):
+        url = await self.storage.save("ab/abcd/64.webp", b"image")
+        self.assertEqual(url, "/media/avatars/ab/abcd/64.webp")
+        self.assertEqual((self.root / "ab" / "abcd" / "64.webp").read_bytes(), b"image")
+        self.assertEqual(await self.storage.save("ab/abcd/64.webp", b"image"), url)
+        self.assertEqual([p.name for p in (self.root / "ab" / "abcd").iterdir()], ["64.webp"])
+
+
+
+class TestCloudinaryStorage(unittest.IsolatedAsyncioTestCase):
+
+    @patch("services.avatars.cloudinary.uploader.upload", return_value={"secure_url": "https://res.cloudinary.com/64.webp"})
+    async def test_save(self, upload):
+        storage = CloudinaryStorage("cloud", "key", "secret")
+        url = await storage.save("ab/abcd/64.webp", b"image")
+        self.assertEqual(upload.call_args.kwargs, {"public_id": "ContactsApp/ab/abcd/64", "overwrite": False})
+        self.assertEqual(upload.call_args.args[0].read(), b"image")
+        self.assertEqual(url, "https://res.cloudinary.com/64.webp")
+
+
+
+class TestCopyLimited(unittest.TestCase):
+
+    def test_limit(self):
+        dst = io.BytesIO()
+        self.assertEqual(copy_limited(io.BytesIO(b"x" * 10), dst, limit=10, chunk_size=3), 10)
+        self.assertEqual(dst.getvalue(), b"x" * 10)
+        src = io.BytesIO(b"x" * 100)
+        with self.assertRaisesRegex(ValueError, "larger than 10 bytes"):
+            copy_limited(src, io.BytesIO(), limit=10, chunk_size=4)
+        self.assertEqual(src.tell(), 12)
+
+
+
+class TestAvatarUploader(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.session_maker() as db:
+            db.add(User(id=1, email="test_mail@example.com", avatar="old", avatar_status="pending"))
+            await db.commit()
+        self.storage = AsyncMock()
+        self.storage.save.side_effect = lambda name, data: f"/media/avatars/{name}"
+        self.uploader = AvatarUploader(self.storage, self.session_maker)
+        self.image = io.BytesIO()
+        Image.new("RGB", (300, 200), "red").save(self.image, "PNG")
+        self.path = await self.uploader.spool(UploadFile(io.BytesIO(self.image.getvalue())))
+
+
+    async def asyncTearDown(self) -> None:
+        self.path.unlink(missing_ok=True)
+        await self.engine.dispose()
+
+
+    async def user(self) -> User:
+        async with self.session_maker() as db:
+            return await db.get(User, 1)
+
+
+    async def test_spool(self):
+        self.assertEqual(self.path.read_bytes(), self.image.getvalue())
+
+
+    @patch("services.avatars.settings.avatar_max_bytes", 100)
+    async def test_spool_too_large(self):
+        with self.assertRaisesRegex(ValueError, "larger than 100 bytes"):
+            await self.uploader.spool(UploadFile(io.BytesIO(b"x" * 101)))
+
+
+    async def test_spool_not_image(self):
+        with self.assertRaisesRegex(ValueError, "not a supported image"):
+            await self.uploader.spool(UploadFile(io.BytesIO(b"image")))
+
+
+    @patch("services.avatars.settings.avatar_sizes", [64, 250])
+    async def test_upload(self):
+        await self.uploader.upload(1, self.path)
+        self.assertEqual(self.storage.save.await_count, 2)
+        user = await self.user()
+        self.assertRegex(user.avatar, r"^/media/avatars/[0-9a-f]{2}/[0-9a-f]{32}/250\.webp$")
+        self.assertEqual(user.avatar_variants, {"250": user.avatar, "64": user.avatar.replace("250.webp", "64.webp")})
+        self.assertIsNone(user.avatar_status)
+        self.assertFalse(self.path.exists())
+
+
+    async def test_upload_failed(self):
+        self.storage.save.side_effect = OSError("storage is down")
+        await self.uploader.upload(1, self.path)
+        user = await self.user()
+        self.assertEqual((user.avatar, user.avatar_status), ("old", "failed"))
+        self.assertFalse(self.path.exists())
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+import asyncio
+import pickle
+import time
+from datetime import datetime
+import unittest
+from unittest.mock import patch
+from fakeredis import FakeAsyncRedis
+from sqlalchemy.orm.exc import DetachedInstanceError
+from database.models import User
+from services.cache import UserCache, PayloadCache, ResponseCache, EmailDedup
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.cache = UserCache(maxsize=2, local_ttl=30, redis_ttl=900)
+        self.cache.bind(FakeAsyncRedis())
+        self.user = User(id=1, email="test_mail@example.com", username="fake_user")
+
+
+    async def test_get_miss(self):
+        result = await self.cache.get(self.user.email)
+        self.assertIsNone(result)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+
+    async def test_get_local_hit(self):
+        await self.cache.set(self.user)
+        result = await self.cache.get(self.user.email)
+        self.assertEqual(result.id, self.user.id)
+        self.assertEqual(result.username, self.user.username)
+        self.assertEqual(self.cache.stats()["hits_local"], 1)
+
+
+    async def test_get_redis_hit(self):
+        await self.cache.set(self.user)
+        self.cache._local.clear()
+        result = await self.cache.get(self.user.email)
+        self.assertEqual(result.email, self.user.email)
+        self.assertEqual(self.cache.stats()["hits_redis"], 1)
+
+
+    async def test_invalidate(self):
+        await self.cache.set(self.user)
+        await self.cache.invalidate(self.user.email)
+        result = await self.cache.get(self.user.email)
+        self.assertIsNone(result)
+
+
+    async def test_lru_eviction(self):
+        self.cache.bind(None)
+        for i in range(3):
+            await self.cache.set(User(id=i, email=f"user{i}@example.com"))
+        self.assertIsNone(await self.cache.get("user0@example.com"))
+        self.assertIsNotNone(await self.cache.get("user2@example.com"))
+
+
+    async def test_secrets_not_cached(self):
+        user = User(id=1, email="test_mail@example.com", password="$2b$12$hash", refresh="refresh-token",
+                    created=datetime(2024, 1, 2, 3, 4, 5), verified=True)
+        await self.cache.set(user)
+        data = await self.cache.r.get("user:" + user.email)
+        self.assertNotIn(b"hash", data)
+        self.assertNotIn(b"refresh-token", data)
+        self.cache._local.clear()
+        result = await self.cache.get(user.email)
+        self.assertEqual((result.created, result.verified), (user.created, True))
+        with self.assertRaises(DetachedInstanceError):
+            result.password
+
+
+    async def test_unreadable_entry(self):
+        await self.cache.r.set("user:" + self.user.email, pickle.dumps(self.user))
+        self.assertIsNone(await self.cache.get(self.user.email))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+
+    async def test_invalidate_while_redis_down(self):
+        other = UserCache(maxsize=2, local_ttl=30, redis_ttl=900)
+        other.bind(self.cache.r)
+        await self.cache.set(self.user)
+        self.cache._redis_failed()
+        await self.cache.invalidate(self.user.email)
+        # the missed delete is sent before this worker reads Redis again
+        self.cache._redis_down_until = 0.0
+        self.assertIsNone(await self.cache.get(self.user.email))
+        self.assertIsNone(await other.get(self.user.email))
+
+
+    async def test_too_many_missed_invalidations(self):
+        await self.cache.set(self.user)
+        self.cache._local.clear()
+        self.cache._redis_failed()
+        for i in range(3):
+            await self.cache.invalidate(f"user{i}@example.com")
+        self.cache._redis_down_until = 0.0
+        self.assertIsNone(await self.cache.get(self.user.email))
+        with patch("services.cache.time.monotonic", return_value=time.monotonic() + 901):
+            self.assertIsNotNone(await self.cache.get(self.user.email))
+
+
+
+class TestPayloadCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.cache = PayloadCache(maxsize=2)
+
+
+    def test_get_hit(self):
+        payload = {"sub": "test_mail@example.com", "exp": time.time() + 60}
+        self.cache.set("token", payload)
+        self.assertEqual(self.cache.get("token"), payload)
+
+
+    def test_get_expired(self):
+        self.cache.set("token", {"sub": "test_mail@example.com", "exp": time.time() - 1})
+        self.assertIsNone(self.cache.get("token"))
+
+
+    def test_lru_eviction(self):
+        for i in range(3):
+            self.cache.set(f"token{i}", {"sub": i, "exp": time.time() + 60})
+        self.assertIsNone(self.cache.get("token0"))
+        self.assertIsNotNone(self.cache.get("token2"))
+
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.cache = ResponseCache()
+        self.cache.bind(FakeAsyncRedis())
+
+
+    async def test_get_hit(self):
+        key = self.cache.key(1, 5, "read_contacts", skip=0, limit=10)
+        self.assertIsNone(await self.cache.get(key))
+        await self.cache.set(key, b"[]", ttl=60, headers={"X-Next-Cursor": "cursor"})
+        response = await self.cache.get(key)
+        self.assertEqual(response.body, b"[]")
+        self.assertEqual(response.headers["X-Next-Cursor"], "cursor")
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+
+    def test_key_params(self):
+        key = self.cache.key(1, 5, "read_contacts", skip=0, limit=10)
+        self.assertEqual(key, self.cache.key(1, 5, "read_contacts", limit=10, skip=0))
+        self.assertNotEqual(key, self.cache.key(1, 5, "read_contacts", skip=10, limit=10))
+        self.assertNotEqual(key, self.cache.key(2, 5, "read_contacts", skip=0, limit=10))
+
+
+    async def test_revision(self):
+        key = self.cache.key(1, 5, "read_contact", contact_id=1)
+        await self.cache.set(key, b"{}", ttl=60)
+        self.assertIsNone(await self.cache.get(self.cache.key(1, 6, "read_contact", contact_id=1)))
+        self.assertIsNotNone(await self.cache.get(key))
+
+
+    async def test_without_redis(self):
+        self.cache.bind(None)
+        key = self.cache.key(1, 5, "read_contacts")
+        self.assertIsNone(key)
+        response = await self.cache.set(key, b"[]", ttl=60)
+        self.assertEqual(response.body, b"[]")
+        self.assertIsNone(await self.cache.get(key))
+
+
+
+
+class TestEmailDedup(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.r = FakeAsyncRedis()
+        self.dedup = EmailDedup(window=600)
+        self.dedup.bind(self.r)
+
+
+    async def test_concurrent(self):
+        results = await asyncio.gather(*(self.dedup.claim("user@example.com") for _ in range(100)))
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(self.dedup.stats(), {"sent": 1, "suppressed_local": 99, "suppressed_redis": 0})
+
+
+    async def test_other_worker(self):
+        other = EmailDedup(window=600)
+        other.bind(self.r)
+        self.assertTrue(await self.dedup.claim("user@example.com"))
+        self.assertFalse(await other.claim("User@Example.com"))
+        self.assertEqual(other.stats()["suppressed_redis"], 1)
+        self.assertTrue(await other.claim("second@example.com"))
+
+
+    async def test_window(self):
+        self.dedup.bind(None)
+        with patch("services.cache.time.monotonic", return_value=1000.0):
+            self.assertTrue(await self.dedup.claim("user@example.com"))
+        with patch("services.cache.time.monotonic", return_value=1599.0):
+            self.assertFalse(await self.dedup.claim("user@example.com"))
+        with patch("services.cache.time.monotonic", return_value=1600.0):
+            self.assertTrue(await self.dedup.claim("second@example.com"))
+            self.assertEqual(list(self.dedup._local), ["second@example.com"])
+            self.assertTrue(await self.dedup.claim("user@example.com"))
+
+
+    async def test_release(self):
+        other = EmailDedup(window=600)
+        other.bind(self.r)
+        self.assertTrue(await self.dedup.claim("user@example.com"))
+        await self.dedup.release("User@Example.com")
+        self.assertEqual(self.dedup.stats()["sent"], 0)
+        self.assertTrue(await other.claim("user@example.com"))
+        await other.release("user@example.com")
+        self.assertTrue(await self.dedup.claim("user@example.com"))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import io
+import unittest
+from datetime import date
+from fastapi import UploadFile
+from services import contacts_io
+
+
+CSV = b"""first_name,last_name,phone,birthday,inform,email
+First,Last,+380001234567,1999-12-12,"Some, quoted
+inform",first.last@example.com
+Bad,Row,+380001234567,not-a-date,,bad@example.com
+"""
+
+JSONL = b"""{"first_name": "First", "last_name": "Last", "phone": "+380001234567", "birthday": "1999-12-12", "inform": "", "email": "first.last@example.com"}
+
+[1, 2]
+{"first_name": "Second"
+"""
+
+VCARD = b"""BEGIN:VCARD\r
+VERSION:3.0\r
+N:Last;First;;;\r
+FN:First Last\r
+EMAIL;TYPE=INTERNET:first.last@example.com\r
+TEL;TYPE=CELL:+380001234567\r
+BDAY:19991212\r
+NOTE:Met at the con\r
+ ference\r
+END:VCARD\r
+"""
+
+
+class TestContactsImport(unittest.IsolatedAsyncioTestCase):
+
+    async def batches(self, data: bytes, fmt: str, batch_size: int = 10):
+        report = {"failed": 0, "errors": []}
+        file = UploadFile(io.BytesIO(data), filename=f"contacts.{fmt}")
+        batches = [b async for b in contacts_io.validated_batches(file, fmt, batch_size, report, max_errors=10)]
+        return batches, report
+
+
+    def test_detect_format(self):
+        self.assertEqual(contacts_io.detect_format("Contacts.CSV"), "csv")
+        self.assertEqual(contacts_io.detect_format("contacts.ndjson"), "jsonl")
+        self.assertEqual(contacts_io.detect_format("contacts.vcf"), "vcard")
+        self.assertIsNone(contacts_io.detect_format("contacts.txt"))
+
+
+    async def test_csv(self):
+        batches, report = await self.batches(CSV, "csv")
+        self.assertEqual(len(batches[0]), 1)
+        self.assertEqual(batches[0][0].inform, "Some, quoted\ninform")
+        self.assertEqual(report["failed"], 1)
+        self.assertEqual(report["errors"][0]["row"], 2)
+
+
+    async def test_jsonl(self):
+        batches, report = await self.batches(JSONL, "jsonl")
+        self.assertEqual(batches[0][0].email, "first.last@example.com")
+        self.assertEqual(report["failed"], 2)
+        self.assertEqual([e["row"] for e in report["errors"]], [2, 3])
+
+
+    async def test_vcard(self):
+        batches, report = await self.batches(VCARD, "vcard")
+        contact = batches[0][0]
+        self.assertEqual((contact.first_name, contact.last_name), ("First", "Last"))
+        self.assertEqual(contact.birthday.month, 12)
+        self.assertEqual(contact.inform, "Met at the conference")
+        self.assertEqual(report["failed"], 0)
+
+
+    async def test_batch_size(self):
+        rows = b"\n".join([CSV.splitlines()[0]] + [b"First,Last,+380001234567,1999-12-12,,a@example.com"] * 5)
+        batches, report = await self.batches(rows, "csv", batch_size=2)
+        self.assertEqual([len(b) for b in batches], [2, 2, 1])
+
+
+
+class TestContactsExport(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.rows = [{"id": 1, "first_name": "First", "last_name": "Last", "phone": "+380001234567",
+                      "birthday": date(1999, 12, 12), "inform": "Some, quoted\ninform", "email": "first.last@example.com"},
+                     {"id": 2, "first_name": "Second", "last_name": "Last; Jr", "phone": "+380007654321",
+                      "birthday": date(2001, 1, 2), "inform": "", "email": "second@example.com"}]
+
+
+    async def export(self, fmt: str) -> bytes:
+        async def rows():
+            for row in self.rows:
+                yield row
+        return b"".join([chunk async for chunk in contacts_io.export_chunks(rows(), fmt)])
+
+
+    async def round_trip(self, fmt: str) -> list:
+        file = UploadFile(io.BytesIO(await self.export(fmt)), filename=f"contacts.{fmt}")
+        report = {"failed": 0, "errors": []}
+        batches = [b async for b in contacts_io.validated_batches(file, fmt, 10, report, max_errors=10)]
+        self.assertEqual(report["failed"], 0)
+        return batches[0]
+
+
+    async def test_csv(self):
+        data = await self.export("csv")
+        self.assertTrue(data.startswith(b"first_name,last_name,phone,birthday,inform,email\n"))
+        contacts = await self.round_trip("csv")
+        self.assertEqual(contacts[0].inform, "Some, quoted\ninform")
+        self.assertEqual(contacts[1].first_name, "Second")
+
+
+    async def test_jsonl(self):
+        contacts = await self.round_trip("jsonl")
+        self.assertEqual(contacts[0].birthday.date(), date(1999, 12, 12))
+        self.assertEqual(contacts[1].email, "second@example.com")
+
+
+    async def test_vcard(self):
+        contacts = await self.round_trip("vcard")
+        self.assertEqual((contacts[0].first_name, contacts[0].last_name), ("First", "Last"))
+        self.assertEqual(contacts[0].inform, "Some, quoted\ninform")
+        self.assertEqual(contacts[1].last_name, "Last; Jr")
+        self.assertEqual(contacts[1].birthday.date(), date(2001, 1, 2))
+
+
+    async def test_chunking(self):
+        self.rows = self.rows * 2000
+        async def rows():
+            for row in self.rows:
+                yield row
+        chunks = [chunk async for chunk in contacts_io.export_chunks(rows(), "jsonl")]
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(c) < 2 * contacts_io.CHUNK_SIZE for c in chunks))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
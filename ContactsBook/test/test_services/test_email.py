@@ -0,0 +1,134 @@
+import asyncio
+import importlib.util
+import unittest
+from unittest.mock import AsyncMock, patch
+import aiosmtplib
+from fastapi_mail import ConnectionConfig
+from database.models import EmailJob
+from services.email import Mailer, VerificationTemplate, conf
+
+
+def local_config(port: int = 1025) -> ConnectionConfig:
+    return ConnectionConfig(MAIL_USERNAME="", MAIL_PASSWORD="", MAIL_FROM="noreply@example.com", MAIL_PORT=port,
+                            MAIL_SERVER="127.0.0.1", MAIL_FROM_NAME="ContactsBook", MAIL_STARTTLS=False,
+                            MAIL_SSL_TLS=False, USE_CREDENTIALS=False, TEMPLATE_FOLDER=conf.TEMPLATE_FOLDER)
+
+
+class TestVerificationTemplate(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.template = VerificationTemplate(conf)
+        self.jinja = conf.template_engine().get_template("email_template.html")
+
+
+    def test_same_as_jinja(self):
+        for host, username, token in (("http://testserver/", "user", "a.b.c"),
+                                      ("https://example.com/", "<b>Tom & Jerry</b>", "x\"y"),
+                                      ("http://testserver/", None, "a.b.c")):
+            self.assertEqual(self.template.render(host, username, token),
+                             self.jinja.render(host=host, username=username, token=token))
+
+
+    def test_pieces_cached(self):
+        pieces = self.template.pieces("http://testserver/")
+        self.assertIs(self.template.pieces("http://testserver/"), pieces)
+        self.assertEqual(pieces[1::2], ["username", "token"])
+        self.assertIn('href="http://testserver/auth/confirm_email/', pieces[2])
+
+
+    def test_max_hosts(self):
+        self.template.max_hosts = 2
+        for host in ("http://a/", "http://b/", "http://c/"):
+            self.template.pieces(host)
+        self.assertEqual(list(self.template._pieces), ["http://c/"])
+
+
+
+class TestMailer(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.jobs = [EmailJob(id=i, email=f"user{i}@example.com", username=f"user{i}", host="http://testserver/")
+                     for i in range(3)]
+        patcher = patch("services.email.aiosmtplib.SMTP")
+        self.SMTP = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.smtp = self.SMTP.return_value
+        self.smtp.is_connected = True
+        self.smtp.connect = AsyncMock()
+        self.smtp.send_message = AsyncMock()
+        self.smtp.quit = AsyncMock()
+        self.mailer = Mailer(local_config())
+
+
+    async def test_message(self):
+        message = await self.mailer.message(self.jobs[0])
+        self.assertEqual(message["To"], "user0@example.com")
+        self.assertEqual(message["From"], "ContactsBook <noreply@example.com>")
+        body = message.get_payload(decode=True).decode()
+        self.assertIn("Hi user0,", body)
+        self.assertIn('href="http://testserver/auth/confirm_email/', body)
+
+
+    async def test_connection_reused(self):
+        self.assertEqual(await self.mailer.send_batch(self.jobs[:2]), {})
+        self.assertEqual(await self.mailer.send_batch(self.jobs[2:]), {})
+        self.SMTP.assert_called_once()
+        self.assertEqual(self.smtp.send_message.await_count, 3)
+
+
+    async def test_message_refused(self):
+        self.smtp.send_message.side_effect = [None, aiosmtplib.SMTPRecipientsRefused([]), None]
+        errors = await self.mailer.send_batch(self.jobs)
+        self.assertEqual(list(errors), [1])
+        self.SMTP.assert_called_once()
+
+
+    async def test_reconnect(self):
+        self.smtp.send_message.side_effect = [None, aiosmtplib.SMTPServerDisconnected("idle"), None, None]
+        self.assertEqual(await self.mailer.send_batch(self.jobs), {})
+        self.assertEqual(self.SMTP.call_count, 2)
+
+
+    async def test_connection_failed(self):
+        self.smtp.send_message.side_effect = [None, ConnectionRefusedError("refused")]
+        errors = await self.mailer.send_batch(self.jobs)
+        self.assertEqual(list(errors), [1, 2])
+        self.assertIsNone(self.mailer.smtp)
+
+
+
+@unittest.skipUnless(importlib.util.find_spec("aiosmtpd"), "aiosmtpd is not installed")
+class TestMailerSMTP(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        from aiosmtpd.controller import Controller
+
+        class Handler:
+            def __init__(self):
+                self.messages = []
+
+            async def handle_DATA(self, server, session, envelope):
+                self.messages.append(envelope)
+                return "250 OK"
+
+        self.handler = Handler()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=8025)
+        await asyncio.to_thread(self.controller.start)
+        self.mailer = Mailer(local_config(8025))
+
+
+    async def asyncTearDown(self) -> None:
+        await self.mailer.close()
+        await asyncio.to_thread(self.controller.stop)
+
+
+    async def test_send_batch(self):
+        jobs = [EmailJob(id=i, email=f"user{i}@example.com", username=f"user{i}", host="http://testserver/")
+                for i in range(3)]
+        self.assertEqual(await self.mailer.send_batch(jobs), {})
+        self.assertEqual([m.rcpt_tos for m in self.handler.messages], [[job.email] for job in jobs])
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from datetime import date, datetime
+from unittest.mock import patch
+from pydantic import TypeAdapter
+from schemas import ContactResponse
+from services import fastjson
+
+
+ROW = {"first_name": "Іван", "last_name": "Last", "phone": "+380001234567", "birthday": date(1999, 12, 12),
+       "inform": 'a "quoted" note', "email": "ivan@example.com", "id": 1, "user_id": 2}
+
+
+class TestDumps(unittest.TestCase):
+
+    def test_same_as_schema(self):
+        adapter = TypeAdapter(list[ContactResponse])
+        self.assertEqual(fastjson.dumps([ROW]), adapter.dump_json(adapter.validate_python([ROW])))
+
+
+    def test_without_orjson(self):
+        expected = fastjson.dumps([ROW, {"created": datetime(2024, 5, 1, 10, 30, 15, 250)}])
+        with patch.object(fastjson, "orjson", None):
+            self.assertEqual(fastjson.dumps([ROW, {"created": datetime(2024, 5, 1, 10, 30, 15, 250)}]), expected)
+
+
+    def test_response(self):
+        response = fastjson.FastJSONResponse([ROW])
+        self.assertEqual(response.media_type, "application/json")
+        self.assertEqual(response.body, fastjson.dumps([ROW]))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
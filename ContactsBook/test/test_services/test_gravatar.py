@@ -0,0 +1,35 @@
+import unittest
+from unittest.mock import patch
+from libgravatar import Gravatar
+from services.gravatar import GravatarResolver
+
+
+class TestGravatarResolver(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.resolve = GravatarResolver(maxsize=2)
+
+
+    def test_memoized_by_hash(self):
+        url = self.resolve("user@example.com")
+        self.assertEqual(url, Gravatar("user@example.com").get_image())
+        with patch("services.gravatar.Gravatar") as gravatar:
+            self.assertEqual(self.resolve(" User@Example.com "), url)
+            gravatar.assert_not_called()
+
+
+    def test_bounded(self):
+        for i in range(3):
+            self.resolve(f"user{i}@example.com")
+        self.assertEqual(len(self.resolve._urls), 2)
+
+
+    def test_failure(self):
+        with patch("services.gravatar.Gravatar", side_effect=ValueError("broken")):
+            self.assertIsNone(self.resolve("user@example.com"))
+        self.assertEqual(len(self.resolve._urls), 0)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
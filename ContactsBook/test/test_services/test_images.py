@@ -0,0 +1,69 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from PIL import Image
+from services.images import check_image, resize_variants, avatar_variants
+
+
+def image_file(directory: Path, name: str, size=(300, 200), mode="RGB", fmt="JPEG", color="red", **params) -> Path:
+    path = directory / name
+    Image.new(mode, size, color).save(path, fmt, **params)
+    return path
+
+
+class TestImages(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.root = Path(self.dir.name)
+
+
+    def test_check_image(self):
+        self.assertEqual(check_image(image_file(self.root, "a.jpg"), 1_000_000), (300, 200))
+        with self.assertRaisesRegex(ValueError, "too large"):
+            check_image(image_file(self.root, "b.jpg"), 50_000)
+        with self.assertRaisesRegex(ValueError, "not a supported image"):
+            (self.root / "c.jpg").write_bytes(b"not an image")
+            check_image(self.root / "c.jpg", 1_000_000)
+        with self.assertRaisesRegex(ValueError, "Unsupported image format BMP"):
+            check_image(image_file(self.root, "d.bmp", fmt="BMP"), 1_000_000)
+
+
+    def test_resize_variants(self):
+        variants = resize_variants(image_file(self.root, "a.jpg", size=(1600, 1200)), [64, 250])
+        for size, data in variants.items():
+            with Image.open(io.BytesIO(data)) as img:
+                self.assertEqual((img.format, img.size, img.mode), ("WEBP", (size, size), "RGB"))
+
+
+    def test_exif_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6      # orientation: rotated 90 degrees clockwise
+        exif[0x010F] = "Camera maker"
+        variants = resize_variants(image_file(self.root, "a.jpg", size=(200, 100), exif=exif), [64])
+        with Image.open(io.BytesIO(variants[64])) as img:
+            self.assertEqual(len(img.getexif()), 0)
+            self.assertNotIn("exif", img.info)
+
+
+    def test_transparency_kept(self):
+        variants = resize_variants(image_file(self.root, "a.png", mode="RGBA", fmt="PNG", color=(255, 0, 0, 128)), [64])
+        with Image.open(io.BytesIO(variants[64])) as img:
+            self.assertEqual(img.mode, "RGBA")
+
+
+    def test_content_addressed(self):
+        first = avatar_variants(image_file(self.root, "a.jpg"), [64, 128])
+        second = avatar_variants(image_file(self.root, "b.jpg"), [64, 128])
+        self.assertEqual({size: name for size, (name, _) in first.items()}, {size: name for size, (name, _) in second.items()})
+        name = first[64][0]
+        self.assertRegex(name, r"^([0-9a-f]{2})/\1[0-9a-f]{30}/64\.webp$")
+        other = avatar_variants(image_file(self.root, "c.jpg", size=(300, 201)), [64])
+        self.assertNotEqual(other[64][0], name)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
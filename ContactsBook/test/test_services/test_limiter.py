@@ -0,0 +1,122 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from fakeredis import FakeAsyncRedis
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError
+from services.limiter import MemoryBackend, RedisBackend, RateLimiter, limiter
+
+
+class TestMemoryBackend(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.backend = MemoryBackend(maxsize=2)
+
+
+    async def test_burst(self):
+        results = [await self.backend.hit("key", 3, 7000) for _ in range(4)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        self.assertGreater(results[3], 0)
+        self.assertLessEqual(results[3], 7000 / 3 + 1)
+
+
+    async def test_refill(self):
+        with patch("services.limiter.time.monotonic_ns", return_value=100_000_000_000):
+            self.assertEqual(await self.backend.hit("key", 1, 1000), 0)
+            self.assertEqual(await self.backend.hit("key", 1, 1000), 1000)
+        with patch("services.limiter.time.monotonic_ns", return_value=101_000_000_000):
+            self.assertEqual(await self.backend.hit("key", 1, 1000), 0)
+
+
+    async def test_first_hit(self):
+        for _ in range(3000):
+            self.assertEqual(await MemoryBackend().hit("key", 1, 300000), 0)
+
+
+    async def test_keys(self):
+        self.assertEqual(await self.backend.hit("first", 1, 1000), 0)
+        self.assertEqual(await self.backend.hit("second", 1, 1000), 0)
+        self.assertGreater(await self.backend.hit("first", 1, 1000), 0)
+
+
+    async def test_maxsize(self):
+        for key in ("first", "second", "third"):
+            await self.backend.hit(key, 1, 1000)
+        self.assertEqual(list(self.backend._tat), ["second", "third"])
+
+
+
+class TestRedisBackend(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        self.r = FakeAsyncRedis()
+        self.backend = RedisBackend(self.r)
+
+
+    async def test_burst(self):
+        results = [await self.backend.hit("key", 3, 7000) for _ in range(4)]
+        self.assertEqual(results[:3], [0, 0, 0])
+        self.assertGreater(results[3], 0)
+        self.assertGreater(await self.r.pttl("limiter:key"), 0)
+
+
+    async def test_first_hit(self):
+        for i in range(200):
+            self.assertEqual(await self.backend.hit(f"key{i}", 1, 300000), 0)
+        self.assertGreater(await self.backend.hit("key0", 1, 300000), 0)
+
+
+    async def test_shared(self):
+        other = RedisBackend(self.r)
+        self.assertEqual(await self.backend.hit("key", 1, 60000), 0)
+        self.assertGreater(await other.hit("key", 1, 60000), 0)
+
+
+    async def test_script_flushed(self):
+        await self.backend.hit("key", 2, 60000)
+        await self.r.script_flush()
+        self.assertEqual(await self.backend.hit("key", 2, 60000), 0)
+        self.assertGreater(await self.backend.hit("key", 2, 60000), 0)
+
+
+    async def test_redis_down(self):
+        r = MagicMock()
+        r.script_load.side_effect = ConnectionError("down")
+        backend = RedisBackend(r)
+        self.assertEqual(await backend.hit("key", 1, 60000), 0)
+        self.assertGreater(await backend.hit("key", 1, 60000), 0)
+        r.script_load.assert_called_once()
+
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        limiter.init(MemoryBackend())
+        self.request = MagicMock(headers={}, scope={"path": "/contacts/1"})
+        self.request.client.host = "127.0.0.1"
+
+
+    async def test_too_many_requests(self):
+        rate_limiter = RateLimiter(times=1, seconds=7)
+        await rate_limiter(self.request, MagicMock())
+        with self.assertRaises(HTTPException) as e:
+            await rate_limiter(self.request, MagicMock())
+        self.assertEqual(e.exception.status_code, 429)
+        self.assertEqual(e.exception.headers["Retry-After"], "7")
+
+
+    async def test_separate_limiters(self):
+        await RateLimiter(times=1, seconds=7)(self.request, MagicMock())
+        await RateLimiter(times=1, seconds=7)(self.request, MagicMock())
+
+
+    async def test_forwarded_client(self):
+        rate_limiter = RateLimiter(times=1, seconds=7)
+        await rate_limiter(self.request, MagicMock())
+        self.request.headers = {"X-Forwarded-For": "10.0.0.1, 10.0.0.2"}
+        await rate_limiter(self.request, MagicMock())
+
+
+
+if __name__ == '__main__':
+    unittest.main()
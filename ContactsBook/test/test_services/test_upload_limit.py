@@ -0,0 +1,44 @@
+import unittest
+import httpx
+from fastapi import FastAPI, Request
+from services.upload_limit import UploadSizeLimitMiddleware
+
+
+app = FastAPI()
+app.add_middleware(UploadSizeLimitMiddleware, limits={"/upload": 100})
+
+
+@app.post("/upload")
+@app.post("/other")
+async def upload(request: Request):
+    return {"size": len(await request.body())}
+
+
+class TestUploadSizeLimit(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+    async def asyncTearDown(self) -> None:
+        await self.client.aclose()
+
+
+    async def test_content_length(self):
+        self.assertEqual((await self.client.post("/upload", content=b"x" * 100)).json(), {"size": 100})
+        self.assertEqual((await self.client.post("/upload", content=b"x" * 101)).status_code, 413)
+        self.assertEqual((await self.client.post("/other", content=b"x" * 101)).status_code, 200)
+
+
+    async def test_chunked(self):
+        async def chunks():
+            for _ in range(10):
+                yield b"x" * 30
+
+        response = await self.client.post("/upload", content=chunks())
+        self.assertEqual(response.status_code, 413)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
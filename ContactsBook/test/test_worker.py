@@ -0,0 +1,127 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from database.models import Base, User
+from repository import email_jobs as repository_email_jobs
+from repository.email_jobs import enqueue_email
+from services.gravatar import gravatar_url
+from worker import EmailWorker, GravatarJob
+
+
+class TestEmailWorker(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.session_maker() as db:
+            for i in range(3):
+                await enqueue_email(f"user{i}@example.com", f"user{i}", "http://testserver/", db)
+        self.mailer = MagicMock(send_batch=AsyncMock(return_value={}), close=AsyncMock())
+        self.worker = EmailWorker(self.mailer, self.session_maker)
+
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+
+
+    @patch("worker.settings.email_batch_size", 2)
+    async def test_run_once(self):
+        self.assertEqual(await self.worker.run_once(), 2)
+        self.assertEqual(await self.worker.run_once(), 1)
+        self.assertEqual(await self.worker.run_once(), 0)
+        self.assertEqual(self.mailer.send_batch.await_count, 2)
+        metrics = await self.worker.report()
+        self.assertEqual((metrics["queued"], metrics["sent"]), (0, 3))
+
+
+    async def test_retry(self):
+        self.mailer.send_batch.return_value = {2: "SMTPRecipientsRefused: {}"}
+        await self.worker.run_once()
+        metrics = await self.worker.report()
+        self.assertEqual((metrics["sent"], metrics["retried"]), (2, 1))
+        self.assertEqual((metrics["queued"], metrics["due"], metrics["retrying"]), (1, 0, 1))
+
+
+    @patch("worker.settings.email_poll_interval", 0.01)
+    async def test_run(self):
+        stop = asyncio.Event()
+        task = asyncio.create_task(self.worker.run(stop))
+        while self.worker.counters["sent"] < 3:
+            await asyncio.sleep(0.01)
+        stop.set()
+        await task
+        self.mailer.close.assert_awaited_once()
+
+
+    @patch("worker.settings.email_poll_interval", 0.01)
+    @patch("worker.logger")
+    async def test_run_survives_errors(self, logger):
+        claim = repository_email_jobs.claim_email_jobs
+        errors = [OperationalError("UPDATE", {}, Exception("database is locked"))]
+
+        async def claim_or_fail(*args):
+            if errors:
+                raise errors.pop()
+            return await claim(*args)
+
+        with patch("worker.repository_email_jobs.claim_email_jobs", claim_or_fail):
+            stop = asyncio.Event()
+            task = asyncio.create_task(self.worker.run(stop))
+            await asyncio.wait_for(self._sent(3), 5)
+            stop.set()
+            await task
+        logger.exception.assert_called_once()
+        self.mailer.close.assert_awaited_once()
+
+
+    async def _sent(self, count: int) -> None:
+        while self.worker.counters["sent"] < count:
+            await asyncio.sleep(0.01)
+
+
+
+class TestGravatarJob(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_maker = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.session_maker() as db:
+            db.add_all([User(username=f"user{i}", email=f"user{i}@example.com", password="x") for i in range(5)])
+            db.add(User(username="uploader", email="uploader@example.com", password="x", avatar_status="pending"))
+            db.add(User(username="custom", email="custom@example.com", password="x", avatar="http://cdn/custom.webp"))
+            await db.commit()
+        self.job = GravatarJob(self.session_maker)
+
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+
+
+    @patch("worker.settings.gravatar_batch_size", 2)
+    async def test_run_once(self):
+        self.assertEqual(await self.job.run_once(), 5)
+        self.assertEqual(await self.job.run_once(), 0)
+        async with self.session_maker() as db:
+            avatars = dict((await db.execute(select(User.email, User.avatar))).all())
+        self.assertEqual(avatars["user3@example.com"], gravatar_url("user3@example.com"))
+        self.assertIsNone(avatars["uploader@example.com"])
+        self.assertEqual(avatars["custom@example.com"], "http://cdn/custom.webp")
+
+
+    async def test_unresolved(self):
+        with patch("repository.users.gravatar_url", return_value=None):
+            self.assertEqual(await self.job.run_once(), 0)
+        self.assertEqual(await self.job.run_once(), 5)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Background worker: sends the verification emails queued by the API and fills in missing Gravatar avatars,
+separately from the web workers.
+
+Run from the ContactsBook folder: ``python -m worker``
+"""
+import asyncio
+import logging
+import signal
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database.db import DBSession
+from repository import email_jobs as repository_email_jobs
+from repository import users as repository_users
+from services.config import settings
+from services.email import Mailer
+
+
+logger = logging.getLogger("worker")
+
+
+class EmailWorker:
+    """
+    Claims batches of due email jobs, sends them with one SMTP connection and retries the failed ones with backoff.
+    """
+
+    def __init__(self, mailer: Mailer, session_maker: async_sessionmaker = DBSession):
+        self.mailer = mailer
+        self.session_maker = session_maker
+        self.counters = {"sent": 0, "retried": 0, "failed": 0}
+
+
+    async def run_once(self) -> int:
+        """
+        Sends one batch of due jobs.
+
+        :return: The number of claimed jobs, 0 if the queue had none due.
+        :rtype: int
+        """
+        async with self.session_maker() as db:
+            jobs = await repository_email_jobs.claim_email_jobs(settings.email_batch_size, settings.email_lease, db)
+            if not jobs:
+                return 0
+            errors = await self.mailer.send_batch(jobs)
+            await repository_email_jobs.complete_email_jobs([job.id for job in jobs if job.id not in errors], db)
+            self.counters["sent"] += len(jobs) - len(errors)
+            for job in jobs:
+                if job.id in errors:
+                    retry = await repository_email_jobs.retry_email_job(job, errors[job.id], db)
+                    self.counters["retried" if retry else "failed"] += 1
+        return len(jobs)
+
+
+    async def report(self) -> dict:
+        """
+        Logs the queue depth and the counters of this worker.
+
+        :return: The queue depth merged with the counters.
+        :rtype: dict
+        """
+        async with self.session_maker() as db:
+            metrics = await repository_email_jobs.email_queue_depth(db) | self.counters
+        logger.info("email queue: %s", metrics)
+        return metrics
+
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """
+        Sends batches until stopped, polling every ``email_poll_interval`` seconds while the queue is empty.
+
+        :param stop: Set to finish after the current batch.
+        :type stop: asyncio.Event
+        """
+        reported = 0.0
+        try:
+            while not stop.is_set():
+                try:
+                    if time.monotonic() - reported >= settings.email_metrics_interval:
+                        reported = time.monotonic()
+                        await self.report()
+                    claimed = await self.run_once()
+                except Exception:
+                    # e.g. a locked SQLite database or a dropped connection, the jobs are retried after their lease
+                    logger.exception("email batch failed")
+                    claimed = 0
+                if claimed < settings.email_batch_size:
+                    try:
+                        await asyncio.wait_for(stop.wait(), settings.email_poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            await self.mailer.close()
+
+
+class GravatarJob:
+    """
+    Periodically sets the Gravatar image as the avatar of the users who signed up without one.
+    """
+
+    def __init__(self, session_maker: async_sessionmaker = DBSession):
+        self.session_maker = session_maker
+        self.filled = 0
+
+
+    async def run_once(self) -> int:
+        """
+        Goes through all users without an avatar in batches of ``gravatar_batch_size``.
+
+        :return: The number of updated users.
+        :rtype: int
+        """
+        filled, after_id = 0, 0
+        async with self.session_maker() as db:
+            while after_id is not None:
+                after_id, updated = await repository_users.fill_gravatars(settings.gravatar_batch_size, db, after_id)
+                filled += updated
+        if filled:
+            logger.info("gravatars: %s users updated", filled)
+        self.filled += filled
+        return filled
+
+
+    async def run(self, stop: asyncio.Event) -> None:
+        """
+        Reconciles every ``gravatar_interval`` seconds until stopped.
+
+        :param stop: Set to finish after the current pass.
+        :type stop: asyncio.Event
+        """
+        while not stop.is_set():
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("gravatar reconciliation failed")
+            try:
+                await asyncio.wait_for(stop.wait(), settings.gravatar_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def main():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await asyncio.gather(EmailWorker(Mailer()).run(stop), GravatarJob().run(stop))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    asyncio.run(main())